@@ -1,27 +1,32 @@
-
-
-
 from .module.module import Module
 from functools import  partial
-# set the module functions as globals
-for k,v in Module.__dict__.items():
-    globals()[k] = v
-
-# for f in :
-#     globals()[f] = getattr(Module, f)
-    
-for f in Module.class_functions() + Module.static_functions():
-    globals()[f] = getattr(Module, f)
-
-for f in Module.self_functions():
-    def wrapper_fn(f, *args, **kwargs):
-        try:
-            fn = getattr(Module(), f)
-        except:
-            fn = getattr(Module, f)
-        return fn(*args, **kwargs)
-    globals()[f] = partial(wrapper_fn, f)
-
-
+import inspect
+
+def wrapper_fn(f, *args, **kwargs):
+    try:
+        fn = getattr(Module(), f)
+    except:
+        fn = getattr(Module, f)
+    return fn(*args, **kwargs)
+
+def __getattr__(name:str):
+    # the module functions are resolved as globals on first use instead of all of them at import
+    if name.startswith('__') and name not in Module.__dict__:
+        raise AttributeError(f"module 'commune' has no attribute '{name}'")
+    try:
+        attr = getattr(Module, name)
+    except AttributeError:
+        raise AttributeError(f"module 'commune' has no attribute '{name}'")
+    if inspect.isfunction(attr) and not isinstance(inspect.getattr_static(Module, name), staticmethod):
+        attr = partial(wrapper_fn, name) # a self function
+    globals()[name] = attr
+    return attr
+
+# the subpackages imported above (commune.module) would shadow the functions of the same name
+for k in [k for k, v in list(globals().items()) if inspect.ismodule(v) and hasattr(Module, k)]:
+    globals()[k] = __getattr__(k)
+
+def __dir__():
+    return sorted(set(globals()) | set(dir(Module)))
 
 c = Block = Lego = M = Module  # alias c.Module as c.Block, c.Lego, c.M
@@ -4,6 +4,7 @@ import json
 import sys
 import time
 import threading
+import os
 
 class cli:
     """
@@ -26,9 +27,67 @@ class cli:
         self.save = save
         self.forget_fns = forget_fns
         self.base_module = c.module(module)() if isinstance(module, str) else module
-        self.base_module_attributes = list(set(self.base_module.functions()  + self.base_module.attributes()))
+        self.base_module_attributes = self.attributes(self.base_module)
         
         self.forward(args=args)
+
+    module2fns = {} # module class -> the names the cli calls on it directly
+    saved_module2fns = None # the dispatch table on disk, {module class: {version, fns}}
+
+    @staticmethod
+    def fns_path() -> str:
+        return c.cache_path + '/cli_fns.json'
+
+    @staticmethod
+    def class_version(module_class) -> list:
+        # the mtimes of the files of the class and its parents, the names only change with them
+        files = set([getattr(sys.modules.get(k.__module__, None), '__file__', None) for k in module_class.__mro__ if k != object])
+        return [[f, c.file_mtime(f)] for f in sorted(files - {None})]
+
+    @classmethod
+    def save_fns(cls, key:str, fns:dict) -> dict:
+        """
+        adds the names of the module class to the dispatch table on disk, written to a temporary file and renamed over it
+        """
+        path = cls.fns_path()
+        cls.saved_module2fns = {**cls.saved_module2fns, key: fns}
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(cls.saved_module2fns, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            c.print(f'Failed to save the cli functions to {path} ({e})', color='red')
+        return fns
+
+    @classmethod
+    def attributes(cls, module) -> set:
+        """
+        the functions and attributes of the module class, from the class dicts (functions() inspects every signature),
+        kept on disk until a file of the class or its parents changes
+        """
+        module_class = module if isinstance(module, type) else type(module)
+        if module_class not in cls.module2fns:
+            if cls.saved_module2fns == None:
+                try:
+                    with open(cls.fns_path()) as f:
+                        cls.saved_module2fns = json.load(f)
+                except Exception:
+                    cls.saved_module2fns = {}
+            key = f'{module_class.__module__}.{module_class.__qualname__}'
+            version = cls.class_version(module_class)
+            saved = cls.saved_module2fns.get(key, None)
+            if saved != None and saved['version'] == version:
+                names = set(saved['fns'])
+            else:
+                names = set(module_class.__dict__)
+                for parent in module_class.__mro__[1:]:
+                    if parent != object:
+                        names.update([k for k, v in parent.__dict__.items() if (callable(v) or isinstance(v, (classmethod, staticmethod))) and not (k.startswith('__') or k.endswith('_'))])
+                cls.save_fns(key, {'version': version, 'fns': sorted(names)})
+            cls.module2fns[module_class] = names
+        return cls.module2fns[module_class]
     
     def forward(self, args=None):
         t0 = time.time()
@@ -0,0 +1,48 @@
+import commune as c
+import numpy as np
+import asyncio
+
+class Bench(c.Module):
+    """
+    Benchmarks c.call('module/info') with a new session per request (pool=False, the old behaviour)
+    against the pooled keep-alive session of the event loop (pool=True)
+    """
+
+    def sequential(self, module:str, fn:str = 'info', n:int = 1000, pool:bool = True):
+        client = c.module('client')(module=module, pool=pool)
+        latencies = []
+        for _ in range(n):
+            t0 = c.time()
+            result = client.forward(fn=fn)
+            latencies.append(c.time() - t0)
+        assert client.check_response(result), result
+        return latencies
+
+    def concurrent(self, module:str, fn:str = 'info', n:int = 1000, pool:bool = True):
+        client = c.module('client')(module=module, pool=pool)
+        async def timed_call():
+            t0 = c.time()
+            result = await client.async_forward(fn=fn)
+            assert client.check_response(result), result
+            return c.time() - t0
+        return client.loop.run_until_complete(asyncio.gather(*[timed_call() for _ in range(n)]))
+
+    def forward(self, module:str = 'module', fn:str = 'info', n:int = 1000, modes = ['sequential', 'concurrent']):
+        if not c.server_exists(module):
+            c.serve(module)
+            c.wait_for_server(module)
+        address = c.namespace().get(module, module)
+        results = []
+        for mode in modes:
+            for pool in [False, True]:
+                t0 = c.time()
+                latencies = getattr(self, mode)(module=address, fn=fn, n=n, pool=pool)
+                results.append({'mode': mode,
+                                'pool': pool,
+                                'n': n,
+                                'total': round(c.time() - t0, 3),
+                                'p50': round(float(np.percentile(latencies, 50)), 4),
+                                'p99': round(float(np.percentile(latencies, 99)), 4)})
+        c.module('client').close_sessions()
+        c.print(c.df(results))
+        return results
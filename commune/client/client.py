@@ -5,25 +5,42 @@ import asyncio
 import commune as c
 import aiohttp
 import json
+import threading
+import atexit
 from .pool import ClientPool
 from .virtual import VirtualClient
+from .stream import Stream
 # from .pool import ClientPool
 
 class Client(c.Module, ClientPool):
+    address2wire_format = {} # the wire format that each server accepts, shared across clients
+    loop2session = {} # loop -> {connector kwargs: session}, the pooled sessions shared across clients
+    session_lock = threading.Lock() # the loops of the executor threads share loop2session
+    connector_kwargs = {'limit': 100, # max connections per session
+                        'limit_per_host': 32, # max keep-alive connections per host
+                        'keepalive_timeout': 30, # idle connections are closed after this many seconds
+                        'ttl_dns_cache': 300} # seconds to cache dns lookups
+    serializer = None
+
     def __init__( 
             self,
             module : str = '0.0.0.0:8000',
             network: bool = 'local',
             key = None,
             loop = None,
+            wire_format : str = 'msgpack', # msgpack or json, falls back to json if the server does not support msgpack
+            pool : bool = True, # share the keep-alive session of the event loop, otherwise use a new session per request
+            session_kwargs : dict = None, # connector kwargs of the pooled session, clients with the same ones share it
             **kwargs
         ):
 
-        self.serializer = c.module('serializer')()
-        self.session = aiohttp.ClientSession()
+        self.wire_format = wire_format
+        self.pool = pool
+        self.session_kwargs = session_kwargs or {}
+        if Client.serializer == None:
+            Client.serializer = c.module('serializer')() # stateless, so the clients share it
         self.loop = c.get_event_loop() if loop == None else loop
         self.key  = c.get_key(key, create_if_not_exists=True)
-        print('key', self.key)
         # we dont want to load the namespace if we have the address
         if not c.is_address(module):
             namespace = c.get_namespace(search=module, network=network)
@@ -52,8 +69,6 @@ class Client(c.Module, ClientPool):
                 args = [fn] + list(args)
             module , fn = module.split('/')
 
-        print('module', module)
-
         module = cls.connect(module=module,
                            network=network,  
                            virtual=False, 
@@ -146,18 +161,26 @@ class Client(c.Module, ClientPool):
                     "timestamp": c.timestamp(),
                     }
         
-
-        input = self.key.sign(self.serializer.serialize(input), return_json=True)
-
-    
-
+        wire_format = self.address2wire_format.get(module, self.wire_format)
+        session = self.session if self.pool else aiohttp.ClientSession()
 
         c.print(f"🛰️ Call {url} 🛰️  (🔑{self.key.ss58_address})", color='green', verbose=verbose)
         try:
-            response =  await self.session.post(url, json=input, headers=headers)
+            response = await self.post(url, input=input, key=key, wire_format=wire_format, headers=headers, session=session)
+            if response.status in [415, 422] and wire_format != 'json':
+                # the server does not speak this wire format, so we fall back to json and remember it
+                wire_format = self.address2wire_format[module] = 'json'
+                response.release() # hands the connection back to the pool before the retry
+                response = await self.post(url, input=input, key=key, wire_format=wire_format, headers=headers, session=session)
+            # a stream outlives this call, so a session of its own is closed when the stream ends
+            stream_session = None if self.pool else session
+            if response.content_type == self.serializer.stream_content_type:
+                return Stream(self.stream_frames(response, session=stream_session), loop=self.loop)
             if response.content_type == 'text/event-stream':
-                return self.iter_over_async(self.stream_generator(response))
-            if response.content_type == 'application/json':
+                return self.iter_over_async(self.stream_generator(response, session=stream_session))
+            if response.content_type == self.serializer.wire_formats['msgpack']:
+                result = await asyncio.wait_for(response.read(), timeout=timeout)
+            elif response.content_type == 'application/json':
                 result = await asyncio.wait_for(response.json(), timeout=timeout)
             elif response.content_type == 'text/plain':
                 result = await asyncio.wait_for(response.text(), timeout=timeout)
@@ -166,15 +189,103 @@ class Client(c.Module, ClientPool):
             result = self.serializer.deserialize(result)
         except Exception as e:
             result = c.detailed_error(e)
-
+        if not self.pool:
+            await session.close()
         return result
     
-    def __del__(self):
-        try:
-            if hasattr(self, 'session'):
-                asyncio.run(self.session.close())
-        except:
-            pass
+    async def post(self, url:str, input:dict, key=None, wire_format:str = 'json', headers:dict = None, session=None):
+        """
+        signs the input and posts it to the url in the wire format
+        json: the signed input is a json string with tensors as hex strings
+        msgpack: the signed input is msgpack bytes with tensors as raw buffers
+        """
+        key = self.resolve_key(key)
+        session = session or self.session
+        headers = {**(headers or {}), 'Content-Type': self.serializer.wire_formats[wire_format]}
+        if wire_format == 'msgpack':
+            data = self.serializer.to_bytes(input)
+            request = {'data': data, 
+                       'signature': key.sign(data).hex(), 
+                       'address': key.ss58_address, 
+                       'crypto_type': key.crypto_type}
+            return await session.post(url, data=self.serializer.to_bytes(request), headers=headers)
+        request = key.sign(self.serializer.serialize(input), return_json=True)
+        return await session.post(url, json=request, headers=headers)
+
+    @classmethod
+    def get_session(cls, **connector_kwargs) -> aiohttp.ClientSession:
+        """
+        Returns the pooled session of the running event loop, so every client on the loop 
+        reuses the same keep-alive connections and dns cache, 
+        connector_kwargs override the connector_kwargs of the class, and each set of them gets its own session
+        """
+        loop = asyncio.get_running_loop()
+        connector_kwargs = {**cls.connector_kwargs, **connector_kwargs}
+        kwargs_key = tuple(sorted(connector_kwargs.items()))
+        with cls.session_lock:
+            closed_loops = {l: cls.loop2session.pop(l) for l in list(cls.loop2session) if l.is_closed()}
+            sessions = cls.loop2session.setdefault(loop, {})
+            session = sessions.get(kwargs_key, None)
+            if session == None or session.closed:
+                connector = aiohttp.TCPConnector(**connector_kwargs)
+                session = sessions[kwargs_key] = aiohttp.ClientSession(connector=connector)
+        for l, closed_sessions in closed_loops.items():
+            cls.close_loop_sessions(l, closed_sessions)
+        return session
+
+    @staticmethod
+    def close_loop_sessions(loop, sessions:dict, timeout:int = 2):
+        """
+        closes the sessions of a loop from outside of it
+        """
+        for session in sessions.values():
+            if session.closed:
+                continue
+            try:
+                if loop.is_closed():
+                    session.detach() # the connections died with the loop
+                elif loop.is_running():
+                    asyncio.run_coroutine_threadsafe(session.close(), loop).result(timeout=timeout)
+                else:
+                    loop.run_until_complete(session.close())
+            except Exception as e:
+                c.print(f'Failed to close session {session} ({e})', color='red')
+
+    @classmethod
+    def close_all_sessions(cls):
+        """
+        closes the pooled sessions of every loop, runs at exit
+        """
+        with cls.session_lock:
+            loop2session, cls.loop2session = cls.loop2session, {}
+        for loop, sessions in loop2session.items():
+            cls.close_loop_sessions(loop, sessions)
+        return {'success': True, 'msg': f'Closed the sessions of {len(loop2session)} loops'}
+
+    @classmethod
+    async def async_close_sessions(cls, **connector_kwargs):
+        """
+        closes the pooled sessions of the running loop, or only the one of the connector_kwargs if given
+        """
+        loop = asyncio.get_running_loop()
+        with cls.session_lock:
+            if len(connector_kwargs) > 0:
+                kwargs_key = tuple(sorted({**cls.connector_kwargs, **connector_kwargs}.items()))
+                session = cls.loop2session.get(loop, {}).pop(kwargs_key, None)
+                sessions = {kwargs_key: session} if session != None else {}
+            else:
+                sessions = cls.loop2session.pop(loop, {})
+        for session in sessions.values():
+            await session.close()
+        return {'success': True, 'msg': f'Closed {len(sessions)} sessions', 'sessions': len(cls.loop2session)}
+
+    @classmethod
+    def close_sessions(cls):
+        return c.get_event_loop().run_until_complete(cls.async_close_sessions())
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self.get_session(**self.session_kwargs)
 
     def iter_over_async(self, ait):
         # helper async fn that just gets the next element
@@ -192,12 +303,34 @@ class Client(c.Module, ClientPool):
                 break
             yield obj
 
-    async def stream_generator(self, response):
-        async for line in response.content:
-            event =  self.process_stream_line(line)
-            if event == '':
-                continue
-            yield event
+    async def stream_frames(self, response, session=None):
+        """
+        the items of each frame of a framed stream (see Server.stream_output)
+        """
+        header = self.serializer.frame_header
+        try:
+            while True:
+                try:
+                    kind, size = header.unpack(await response.content.readexactly(header.size))
+                except asyncio.IncompleteReadError as e:
+                    assert len(e.partial) == 0, 'stream ended mid frame'
+                    break
+                yield self.serializer.unpack_frame(kind, await response.content.readexactly(size))
+        finally:
+            response.release()
+            if session != None:
+                await session.close()
+
+    async def stream_generator(self, response, session=None):
+        try:
+            async for line in response.content:
+                event =  self.process_stream_line(line)
+                if event == '':
+                    continue
+                yield event
+        finally:
+            if session != None:
+                await session.close()
         
         
 
@@ -255,4 +388,6 @@ class Client(c.Module, ClientPool):
     
         return module2connection
 
-  
\ No newline at end of file
+  
+
+atexit.register(Client.close_all_sessions) # the pooled sessions outlive the clients
@@ -0,0 +1,25 @@
+import asyncio
+
+
+class Stream:
+    """
+    The items of a streamed response. async for iterates natively on the loop,
+    for runs the loop once per frame (a frame carries a batch of items)
+    """
+    def __init__(self, batches, loop = None):
+        self.batches = batches # async iterator of item lists
+        self.loop = loop
+
+    async def __aiter__(self):
+        async for items in self.batches:
+            for item in items:
+                yield item
+
+    def __iter__(self):
+        loop = self.loop or asyncio.get_event_loop()
+        while True:
+            try:
+                items = loop.run_until_complete(self.batches.__anext__())
+            except StopAsyncIteration:
+                break
+            yield from items
@@ -0,0 +1,77 @@
+import commune as c
+import numpy as np
+
+class Bench(c.Module):
+    """
+    Benchmarks for submitting jobs to the executor
+    """
+
+    @staticmethod
+    def noop(x=None):
+        return 1
+
+    def submit(self, n:int = 100_000, max_workers:int = 16):
+        """
+        n tiny tasks through c.submit one by one vs c.submit_many
+        """
+        results = []
+        for mode in ['submit', 'submit_many']:
+            t0 = c.time()
+            if mode == 'submit':
+                futures = [c.submit(self.noop, args=[i], max_workers=max_workers) for i in range(n)]
+            else:
+                futures = c.submit_many(self.noop, batch_args=[[i] for i in range(n)], max_workers=max_workers)
+            submit_latency = c.time() - t0
+            assert sum(c.wait(futures, timeout=600)) == n
+            results.append({'mode': mode, 'n': n, 'submit_latency': round(submit_latency, 3), 'latency': round(c.time() - t0, 3)})
+        c.print(c.df(results))
+        return results
+
+    def payload(self, n:int = 1000, size_mb:int = 10, max_workers:int = 16):
+        """
+        n tasks that each get the same size_mb array, with copy=True (the old default) vs copy=False
+        """
+        x = np.zeros(size_mb * 2**20, dtype=np.uint8)
+        results = []
+        for copy in [True, False]:
+            t0 = c.time()
+            futures = [c.submit(self.noop, args=[x], copy=copy, max_workers=max_workers) for i in range(n)]
+            submit_latency = c.time() - t0
+            assert sum(c.wait(futures, timeout=600)) == n
+            results.append({'copy': copy, 'n': n, 'size_mb': size_mb, 'submit_latency': round(submit_latency, 3), 'latency': round(c.time() - t0, 3)})
+        c.print(c.df(results))
+        return results
+
+    @staticmethod
+    def sleep(seconds:float = 0.01):
+        c.sleep(seconds)
+        return 1
+
+    def fairness(self, n:int = 10_000, n_low:int = 50, max_workers:int = 8, seconds:float = 0.005):
+        """
+        latency of a low volume tenant (one task every 20ms) while a high volume tenant floods the pool with n tasks,
+        with one shared tenant (FIFO, like the old priority queue) vs a tenant per caller
+        """
+        results = []
+        for fair in [False, True]:
+            executor = c.module('executor.thread')(max_workers=max_workers, maxsize=0)
+            high = executor.submit_many(self.sleep, batch_args=[[seconds]] * n, tenant='high' if fair else None)
+            latencies = []
+            low = []
+            for i in range(n_low):
+                t0 = c.time()
+                future = executor.submit(self.sleep, args=[seconds], tenant='low' if fair else None)
+                future.add_done_callback(lambda f, t0=t0: latencies.append(c.time() - t0))
+                low.append(future)
+                c.sleep(0.02)
+            c.wait(low + high, timeout=600)
+            results.append({'fair': fair, 
+                            'n_high': n, 
+                            'n_low': n_low, 
+                            'p50': round(float(np.percentile(latencies, 50)), 4), 
+                            'p99': round(float(np.percentile(latencies, 99)), 4)})
+        c.print(c.df(results))
+        return results
+
+    def forward(self):
+        return {'submit': self.submit(), 'payload': self.payload(), 'fairness': self.fairness()}
@@ -0,0 +1,138 @@
+import sys
+import queue
+import threading
+import itertools
+from collections import deque
+from typing import List
+import commune as c
+
+
+class Scheduler(c.Module):
+    """
+    Drop-in for queue.PriorityQueue of (priority, task) for the thread executor.
+    Lower priorities run first, tasks of the same priority are shared between tenants
+    (task.tenant, e.g. the caller address) by weighted fair queuing on a virtual clock,
+    and each tenant is FIFO. put/get block on condition variables instead of polling.
+    """
+
+    def __init__(self, maxsize:int = 0):
+        self.maxsize = maxsize or 0 # 0 is unbounded
+        self.mutex = threading.Lock()
+        self.not_empty = threading.Condition(self.mutex)
+        self.not_full = threading.Condition(self.mutex)
+        self.levels = {} # priority -> {'tenants': {tenant: deque}, 'vtime': {tenant: float}, 'clock': float}
+        self.size = 0
+        self.counter = itertools.count().__next__
+
+    def qsize(self) -> int:
+        with self.mutex:
+            return self.size
+
+    def empty(self) -> bool:
+        with self.mutex:
+            return self.size == 0
+
+    def full(self) -> bool:
+        with self.mutex:
+            return 0 < self.maxsize <= self.size
+
+    def put(self, item:tuple, block:bool = True, timeout:float = None):
+        priority, task = item
+        with self.not_full:
+            # the shutdown entry (sys.maxsize) skips the backpressure so workers can always exit
+            if self.maxsize > 0 and priority != sys.maxsize:
+                if not block:
+                    if self.size >= self.maxsize:
+                        raise queue.Full
+                elif not self.not_full.wait_for(lambda: self.size < self.maxsize, timeout=timeout):
+                    raise queue.Full
+            self.add(priority, task)
+            self.not_empty.notify()
+
+    def put_many(self, items:List[tuple], timeout:float = None):
+        """
+        puts the (priority, task) items under one lock and wakes the workers once. when the queue fills up
+        it waits for room (the items already put stay queued if the timeout passes)
+        """
+        with self.not_full:
+            added = 0
+            for priority, task in items:
+                if self.maxsize > 0 and priority != sys.maxsize and self.size >= self.maxsize:
+                    self.not_empty.notify(added) # the workers take what is queued so far
+                    added = 0
+                    if not self.not_full.wait_for(lambda: self.size < self.maxsize, timeout=timeout):
+                        raise queue.Full
+                self.add(priority, task)
+                added += 1
+            self.not_empty.notify(added)
+
+    def add(self, priority:int, task):
+        # called with the mutex held
+        tenant = getattr(task, 'tenant', None)
+        level = self.levels.setdefault(priority, {'tenants': {}, 'vtime': {}, 'weight': {}, 'clock': 0.0})
+        if tenant not in level['tenants']:
+            # a tenant that was idle starts at the clock, so it cannot bank credit while away
+            level['tenants'][tenant] = deque()
+            level['vtime'][tenant] = level['clock']
+        level['weight'][tenant] = max(getattr(task, 'weight', 1) or 1, 1e-6)
+        level['tenants'][tenant].append((self.counter(), task))
+        self.size += 1
+
+    def put_nowait(self, item:tuple):
+        return self.put(item, block=False)
+
+    def get(self, block:bool = True, timeout:float = None) -> tuple:
+        with self.not_empty:
+            if not block:
+                if self.size == 0:
+                    raise queue.Empty
+            elif not self.not_empty.wait_for(lambda: self.size > 0, timeout=timeout):
+                raise queue.Empty
+            priority = min(self.levels)
+            level = self.levels[priority]
+            tenants, vtime = level['tenants'], level['vtime']
+            # the tenant with the lowest virtual time, ties go to the oldest task
+            tenant = min(tenants, key=lambda t: (vtime[t], tenants[t][0][0]))
+            _, task = tenants[tenant].popleft()
+            level['clock'] = vtime[tenant]
+            vtime[tenant] += 1 / level['weight'][tenant]
+            if len(tenants[tenant]) == 0:
+                del tenants[tenant], vtime[tenant], level['weight'][tenant]
+                if len(tenants) == 0:
+                    del self.levels[priority]
+            self.size -= 1
+            self.not_full.notify()
+            return (priority, task)
+
+    def get_nowait(self) -> tuple:
+        return self.get(block=False)
+
+    def tenants(self) -> dict:
+        """
+        number of queued tasks per (priority, tenant)
+        """
+        with self.mutex:
+            return {(p, t): len(q) for p, level in self.levels.items() for t, q in level['tenants'].items()}
+
+    @classmethod
+    def test(cls):
+        Task = c.module('executor.task')
+        self = cls()
+        for i in range(3):
+            self.put((1, Task(fn=None, args=[i], kwargs={}, tenant='a')))
+        self.put((1, Task(fn=None, args=[0], kwargs={}, tenant='b')))
+        self.put((0, Task(fn=None, args=[0], kwargs={}, tenant='c')))
+        order = [(t.tenant, t.args[0]) for _, t in [self.get() for _ in range(5)]]
+        # priority first, then the tenants take turns, each in FIFO order
+        assert order == [('c', 0), ('a', 0), ('b', 0), ('a', 1), ('a', 2)], order
+        self = cls(maxsize=1)
+        self.put((1, Task(fn=None, args=[], kwargs={})))
+        try:
+            self.put((1, Task(fn=None, args=[], kwargs={})), timeout=0.01)
+            raise AssertionError('put did not block on a full queue')
+        except queue.Full:
+            pass
+        self = cls()
+        self.put_many([(1, Task(fn=None, args=[i], kwargs={}, tenant=t)) for i, t in enumerate('aab')])
+        assert [t.tenant for _, t in [self.get() for _ in range(3)]] == ['a', 'b', 'a']
+        return {'success': True, 'msg': 'scheduler test passed'}
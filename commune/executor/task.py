@@ -13,6 +13,8 @@
 # threads finish.
 
 import time
+import inspect
+import threading
 from concurrent.futures._base import Future
 import commune as c
 
@@ -24,18 +26,24 @@ class Task(c.Module):
                 timeout:int=10, 
                 priority:int=1, 
                 path = None, 
+                tenant = None, # who the task is for (e.g. the caller address), the scheduler shares the pool fairly between tenants
+                weight:float = 1, # share of the pool of the tenant relative to the others
                 **extra_kwargs):
         
         self.future = Future()
         self.fn = fn # the function to run
         self.start_time = time.time() # the time the task was created
+        self.run_time = None # the time the task started running
         self.end_time = None
         self.args = args # the arguments of the task
         self.kwargs = kwargs # the arguments of the task
         self.timeout = timeout # the timeout of the task
         self.priority = priority # the priority of the task
+        self.tenant = tenant
+        self.weight = weight
         self.data = None # the result of the task
         self.latency = None
+        self.cancel_token = threading.Event() # set when the task is cancelled or times out, fns can take it as a cancel_token kwarg
     
         self.fn_name = fn.__name__ if fn != None else str(fn) # the name of the function
         # for the sake of simplicity, we'll just add all the extra kwargs to the task object
@@ -48,6 +56,19 @@ class Task(c.Module):
     def lifetime(self) -> float:
         return time.time() - self.start_time
 
+    @property
+    def deadline(self) -> float:
+        return self.start_time + self.timeout
+
+    @property
+    def expired(self) -> bool:
+        return self.timeout != None and time.time() > self.deadline
+
+    @property
+    def queue_time(self) -> float:
+        # the time the task waited in the queue before running
+        return (self.run_time or time.time()) - self.start_time
+
     @property
     def state(self) -> dict:
         return {
@@ -66,13 +87,21 @@ class Task(c.Module):
     
     def run(self):
         """Run the given work item"""
-        # Checks if future is canceled or if work item is stale
-        self.start_time = c.time()
-
-        if (not self.future.set_running_or_notify_cancel()) or (time.time() - self.start_time) > self.timeout:
-            self.future.set_exception(TimeoutError('Task timed out'))
+        self.run_time = time.time()
+        # drop the task without running it if it was cancelled or expired in the queue
+        if not self.future.set_running_or_notify_cancel():
+            self.status = 'cancelled'
+            return
+        if self.expired:
+            self.status = 'expired'
+            self.cancel_token.set()
+            self.future.set_exception(TimeoutError(f'Task expired in the queue after {self.queue_time:.3f}s (timeout={self.timeout})'))
+            return
+        kwargs = self.kwargs
+        if self.accepts_cancel_token:
+            kwargs = {**kwargs, 'cancel_token': self.cancel_token}
         try:
-            data = self.fn(*self.args, **self.kwargs)
+            data = self.fn(*self.args, **kwargs)
             self.status = 'complete'
         except Exception as e:
             data = c.detailed_error(e)
@@ -80,7 +109,8 @@ class Task(c.Module):
                 c.new_event_loop(nest_asyncio=True)
             self.status = 'failed'
 
-        self.future.set_result(data)
+        if not self.future.done(): # the executor may have timed it out already
+            self.future.set_result(data)
         # store the result of the task
         if self.path != None:
             self.save(self.path, self.state)
@@ -105,8 +135,31 @@ class Task(c.Module):
     def _waiters(self) -> bool:
         return self.future._waiters
 
+    @property
+    def accepts_cancel_token(self) -> bool:
+        try:
+            return 'cancel_token' in inspect.signature(self.fn).parameters
+        except (TypeError, ValueError):
+            return False
+
+    def timeout_running(self) -> bool:
+        """
+        Times out a running task: sets the cancel token and releases whoever waits on the future,
+        the function keeps the thread until it returns or checks the token
+        """
+        self.cancel_token.set()
+        self.status = 'timeout'
+        if self.future.done():
+            return False
+        try:
+            self.future.set_exception(TimeoutError(f'Task ran past its timeout of {self.timeout}s'))
+        except Exception:
+            return False # finished in the meantime
+        return True
+
     def cancel(self) -> bool:
-        self.future.cancel()
+        self.cancel_token.set()
+        return self.future.cancel()
 
     def running(self) -> bool:
         return self.future.running()
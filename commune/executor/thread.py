@@ -9,18 +9,21 @@ import itertools
 import threading
 
 from loguru import logger
-from typing import Callable
+from typing import Callable, List
 import concurrent
 from concurrent.futures._base import Future
 import commune as c
 import gc
 
 Task = c.module('executor.task')
+Scheduler = c.module('executor.scheduler')
 
 NULL_ENTRY = (sys.maxsize, Task(None, (), {}))
 
 class ThreadPoolExecutor(c.Module):
-    """Base threadpool executor with a priority queue"""
+    """Base threadpool executor with a priority queue that is shared fairly between tenants"""
+
+    latency_buckets = [0.001, 0.01, 0.1, 1, 10, 100] # upper bounds (seconds) of the queue_wait/run_time histograms
 
     # Used to assign unique thread names when thread_name_prefix is not supplied.
     _counter = itertools.count().__next__
@@ -32,6 +35,7 @@ class ThreadPoolExecutor(c.Module):
         max_workers: int =None,
         maxsize : int = None ,
         thread_name_prefix : str ="",
+        watchdog_interval : float = 0.5, # seconds between checks for running tasks that passed their timeout
     ):
         """Initializes a new ThreadPoolExecutor instance.
         Args:
@@ -42,18 +46,26 @@ class ThreadPoolExecutor(c.Module):
         self.start_time = c.time()
 
         max_workers = (os.cpu_count() or 1) * 5 if max_workers == None else max_workers
-        maxsize = max_workers * 10 or None
+        maxsize = max_workers * 10 if maxsize == None else maxsize # 0 is unbounded
         if max_workers <= 0:
             raise ValueError("max_workers must be greater than 0")
             
         self.max_workers = max_workers
-        self.work_queue = queue.PriorityQueue(maxsize=maxsize)
+        self.work_queue = Scheduler(maxsize=maxsize)
         self.idle_semaphore = threading.Semaphore(0)
         self.threads = []
         self.broken = False
         self.shutdown = False
         self.shutdown_lock = threading.Lock()
         self.thread_name_prefix = thread_name_prefix or ("ThreadPoolExecutor-%d" % self._counter() )
+        self.threads_lock = threading.Lock()
+        self.running = {} # thread -> the task it is running
+        self.abandoned = set() # threads stuck on a timed out task, replaced and left to exit when the task returns
+        self.watchdog_interval = watchdog_interval
+        self.watchdog_thread = None
+        self.stats_lock = threading.Lock()
+        self.status_counts = {}
+        self.histograms = {k: [0] * (len(self.latency_buckets) + 1) for k in ['queue_wait', 'run_time']}
 
     @property
     def is_empty(self):
@@ -79,7 +91,9 @@ class ThreadPoolExecutor(c.Module):
                 timeout=200, 
                 return_future:bool=True,
                 wait = True, 
-                path:str=None) -> Future:
+                path:str=None,
+                tenant = None,
+                weight:float = 1) -> Future:
         if params != None:
             if isinstance(params, dict):
                 kwargs = params
@@ -87,13 +101,6 @@ class ThreadPoolExecutor(c.Module):
                 args = params
             else:
                 raise ValueError("params must be a list or a dict")
-        # check if the queue is full and if so, raise an exception
-        if self.work_queue.full():
-            if wait:
-                while self.work_queue.full():
-                    time.sleep(0.1)
-            else:
-                return {'success': False, 'msg':"cannot schedule new futures after maxsize exceeded"}
 
         args = args or []
         kwargs = kwargs or {}
@@ -107,11 +114,14 @@ class ThreadPoolExecutor(c.Module):
             priority = kwargs.get("priority", priority)
             if "priority" in kwargs:
                 del kwargs["priority"]
-            task = Task(fn=fn, args=args, kwargs=kwargs, timeout=timeout, path=path)
-            # add the work item to the queue
-            self.work_queue.put((priority, task), block=False)
-            # adjust the thread count to match the new task
-            self.adjust_thread_count()
+            task = Task(fn=fn, args=args, kwargs=kwargs, timeout=timeout, path=path, priority=priority, tenant=tenant, weight=weight)
+        # add the work item to the queue, if it is full this waits for a worker to take one
+        try:
+            self.work_queue.put((priority, task), block=wait)
+        except queue.Full:
+            return {'success': False, 'msg':"cannot schedule new futures after maxsize exceeded"}
+        # adjust the thread count to match the new task
+        self.adjust_thread_count()
             
         # return the future (MAYBE WE CAN RETURN THE TASK ITSELF)
         if return_future:
@@ -120,17 +130,50 @@ class ThreadPoolExecutor(c.Module):
         return task.future.result()
 
 
+    def submit_many(self, 
+                    fn: Callable, 
+                    batch_args: List[list] = None, 
+                    batch_kwargs: List[dict] = None, 
+                    priority:int = 1, 
+                    timeout = 200, 
+                    path:str = None,
+                    tenant = None,
+                    weight:float = 1) -> List[Future]:
+        """
+        Submits fn once per args/kwargs in the batch, returns the futures in order
+        """
+        n = len(batch_args if batch_args != None else batch_kwargs)
+        batch_args = batch_args or [[]] * n
+        batch_kwargs = batch_kwargs or [{}] * n
+        assert len(batch_args) == len(batch_kwargs), "batch_args and batch_kwargs must be the same length"
+        with self.shutdown_lock:
+            if self.broken:
+                raise Exception("ThreadPoolExecutor is broken")
+            if self.shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            tasks = [Task(fn=fn, args=args or [], kwargs=kwargs or {}, timeout=timeout, path=path, priority=priority, tenant=tenant, weight=weight) 
+                     for args, kwargs in zip(batch_args, batch_kwargs)]
+            # the workers are started first, a batch larger than the queue waits (without polling) for them to take tasks
+            for _ in range(min(len(tasks), self.max_workers)):
+                self.adjust_thread_count()
+            # under the shutdown lock, so a shutdown cannot land between the check and the puts
+            self.work_queue.put_many([(priority, task) for task in tasks])
+        return [task.future for task in tasks]
+
     def adjust_thread_count(self):
         # if idle threads are available, don't spin new threads
         if self.idle_semaphore.acquire(timeout=0):
             return
+        with self.threads_lock:
+            self.start_thread()
 
+    def start_thread(self):
         # When the executor gets lost, the weakref callback will wake up
         # the worker threads.
         def weakref_cb(_, q=self.work_queue):
             q.put(NULL_ENTRY)
-
-        num_threads = len(self.threads)
+        self.threads = [t for t in self.threads if t.is_alive()]
+        num_threads = len([t for t in self.threads if t not in self.abandoned])
         if num_threads < self.max_workers:
             thread_name = "%s_%d" % (self.thread_name_prefix or self, num_threads)
             t = threading.Thread(
@@ -145,6 +188,60 @@ class ThreadPoolExecutor(c.Module):
             t.start()
             self.threads.append(t)
             self.threads_queues[t] = self.work_queue
+        if self.watchdog_thread == None:
+            self.watchdog_thread = threading.Thread(target=self.watchdog, 
+                                                    args=(weakref.ref(self), self.watchdog_interval), 
+                                                    name=f'{self.thread_name_prefix}_watchdog',
+                                                    daemon=True)
+            self.watchdog_thread.start()
+
+    def check_timeouts(self) -> int:
+        """
+        Times out the running tasks that passed their deadline and replaces their threads
+        """
+        n = 0
+        for thread, task in list(self.running.items()):
+            if thread not in self.abandoned and task.expired:
+                if task.timeout_running():
+                    self.record(task)
+                self.abandoned.add(thread)
+                n += 1
+        if n > 0:
+            with self.threads_lock:
+                for _ in range(n):
+                    self.start_thread()
+        return n
+
+    @staticmethod
+    def watchdog(executor_reference, interval:float):
+        while True:
+            time.sleep(interval)
+            executor = executor_reference()
+            if executor is None or executor.shutdown == True:
+                return
+            try:
+                executor.check_timeouts()
+            except Exception as e:
+                logger.error(e)
+            del executor
+
+    def bucket(self, value:float) -> int:
+        for i, bound in enumerate(self.latency_buckets):
+            if value <= bound:
+                return i
+        return len(self.latency_buckets)
+
+    def record(self, task):
+        with self.stats_lock:
+            self.status_counts[task.status] = self.status_counts.get(task.status, 0) + 1
+            if task.run_time != None:
+                self.histograms['queue_wait'][self.bucket(task.run_time - task.start_time)] += 1
+            if task.status in ['complete', 'failed'] and task.end_time != None:
+                self.histograms['run_time'][self.bucket(task.end_time - task.run_time)] += 1
+
+    def histogram(self, name:str = 'run_time') -> dict:
+        labels = [f'<={b}s' for b in self.latency_buckets] + [f'>{self.latency_buckets[-1]}s']
+        return dict(zip(labels, self.histograms[name]))
 
     def shutdown(self, wait=True):
         with self.shutdown_lock:
@@ -174,9 +271,25 @@ class ThreadPoolExecutor(c.Module):
                 item = work_item[1]
 
                 if item is not None:
+                    thread = threading.current_thread()
+                    executor = executor_reference()
+                    if executor is not None:
+                        executor.running[thread] = item
+                    del executor
                     item.run()
+                    executor = executor_reference()
+                    abandoned = False
+                    if executor is not None:
+                        executor.running.pop(thread, None)
+                        abandoned = thread in executor.abandoned
+                        if abandoned:
+                            executor.abandoned.discard(thread)
+                        elif item.status != 'timeout':
+                            executor.record(item)
                     # Delete references to object. See issue16284
-                    del item
+                    del item, executor
+                    if abandoned:
+                        return # a replacement thread took over
                     continue
 
                 executor = executor_reference()
@@ -238,6 +351,24 @@ class ThreadPoolExecutor(c.Module):
 
         return {'success': True, 'msg': 'thread pool test passed'}
 
+    @classmethod
+    def test_timeout(cls):
+        def hang(cancel_token=None):
+            while not cancel_token.is_set():
+                time.sleep(0.01)
+            return 'cancelled'
+        self = cls(max_workers=1, watchdog_interval=0.05)
+        future = self.submit(fn=hang, timeout=0.1)
+        try:
+            future.result(timeout=2)
+            raise AssertionError('hung task did not time out')
+        except TimeoutError:
+            pass
+        # the hung thread is replaced, so the pool keeps serving
+        assert self.submit(fn=lambda: 1, timeout=2).result(timeout=2) == 1
+        assert self.status()['status_counts'].get('timeout', 0) == 1
+        return {'success': True, 'msg': 'thread pool timeout test passed'}
+
         
 
     @property
@@ -245,10 +376,15 @@ class ThreadPoolExecutor(c.Module):
         return self.work_queue.empty()
     def status(self):
         return dict(
-            num_threads = len(self.threads),
+            num_threads = len([t for t in self.threads if t.is_alive()]),
+            num_running = len(self.running),
+            num_abandoned = len(self.abandoned),
             num_tasks = self.num_tasks,
             is_empty = self.is_empty,
-            is_full = self.is_full
+            is_full = self.is_full,
+            status_counts = dict(self.status_counts),
+            queue_wait = self.histogram('queue_wait'),
+            run_time = self.histogram('run_time'),
         )
     
     
\ No newline at end of file
@@ -0,0 +1,81 @@
+import commune as c
+
+class Bench(c.Module):
+    """
+    Benchmarks for the keys
+    """
+
+    def keyring(self, n:int = 1000, prefix:str = 'bench.keyring'):
+        """
+        c.get_key and c.key2address with n keys on disk, decoding from the key file
+        on every call (cache=False, the old behaviour) vs the keyring of the process
+        """
+        Key = c.module('key')
+        keys = [f'{prefix}.{i}' for i in range(n)]
+        # write the key files directly, add_key rebuilds key2address on every key
+        for k in keys:
+            if not Key.key_exists(k):
+                Key.put(k, Key.new_key().to_json())
+        Key.key2address(update=True)
+        results = []
+        for mode in ['file', 'keyring']:
+            Key.keyring.clear()
+            t0 = c.time()
+            for k in keys:
+                c.get_key(k, cache=(mode == 'keyring'))
+            t1 = c.time()
+            for k in keys:
+                c.get_key(k, cache=(mode == 'keyring'))
+            results.append({'fn': 'get_key', 'mode': mode, 'n': n, 'first_pass': round(t1 - t0, 3), 'second_pass': round(c.time() - t1, 3)})
+        # key2address without its cache file: decoding every key (old) vs reading the addresses from the key files
+        Key.keyring.clear()
+        t0 = c.time()
+        key2address = {k: Key.get_key(k, cache=False).ss58_address for k in Key.keys() if k != 'key2address'}
+        t1 = c.time()
+        Key.rm('key2address')
+        assert Key.key2address() == key2address
+        t2 = c.time()
+        # c.key2address adds the route to the key module on top of this
+        for _ in range(n):
+            Key.key2address()
+        # the first pass rebuilds it without the file, the second calls it n times
+        results.append({'fn': 'key2address', 'mode': 'file', 'n': n, 'first_pass': round(t1 - t0, 3), 'second_pass': None})
+        results.append({'fn': 'key2address', 'mode': 'keyring', 'n': n, 'first_pass': round(t2 - t1, 3), 'second_pass': round(c.time() - t2, 3)})
+        for k in keys:
+            Key.rm(k)
+        Key.key2address(update=True)
+        c.print(c.df(results))
+        return results
+
+    def crypto(self, n:int = 2000, batch_sizes = [1, 10, 100, 1000], crypto_types = ['sr25519', 'ed25519', 'ecdsa'], max_workers:int = 1):
+        """
+        ops/sec of sign/verify (one call per message) and sign_batch/verify_batch per crypto type and batch size
+        """
+        Key = c.module('key')
+        results = []
+        for crypto_type in crypto_types:
+            key = Key.new_key(crypto_type=crypto_type)
+            messages = [c.python2str({'i': i, 'timestamp': c.timestamp()}) for i in range(n)]
+            signatures = [key.sign(m) for m in messages]
+            for batch_size in batch_sizes:
+                batches = [list(range(i, min(i + batch_size, n))) for i in range(0, n, batch_size)]
+                row = {'crypto_type': crypto_type, 'batch_size': batch_size}
+                t0 = c.time()
+                if batch_size == 1:
+                    [key.sign(m) for m in messages]
+                else:
+                    [key.sign_batch([messages[i] for i in b], max_workers=max_workers) for b in batches]
+                row['sign_per_sec'] = int(n / (c.time() - t0))
+                t0 = c.time()
+                if batch_size == 1:
+                    verified = [key.verify(m, signature=s) for m, s in zip(messages, signatures)]
+                else:
+                    verified = [v for b in batches for v in key.verify_batch([messages[i] for i in b], [signatures[i] for i in b], max_workers=max_workers)]
+                row['verify_per_sec'] = int(n / (c.time() - t0))
+                assert all(verified), f'{crypto_type} failed to verify'
+                results.append(row)
+        c.print(c.df(results))
+        return results
+
+    def forward(self):
+        return {'keyring': self.keyring(), 'crypto': self.crypto()}
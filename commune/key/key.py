@@ -1,8 +1,11 @@
 
+import os
 import json
-from scalecodec.utils.ss58 import ss58_encode, ss58_decode, get_ss58_format
+import math
+from concurrent.futures import ThreadPoolExecutor
+from scalecodec.utils.ss58 import ss58_encode, ss58_decode, get_ss58_format, is_valid_ss58_address
 from scalecodec.base import ScaleBytes
-from typing import Union, Optional
+from typing import Union, Optional, List
 import time
 import binascii
 import re
@@ -11,14 +14,7 @@ from base64 import b64encode
 
 import nacl.bindings
 import nacl.public
-from eth_keys.datatypes import PrivateKey
-from substrateinterface.utils import ss58
 
-from substrateinterface.constants import DEV_PHRASE
-from substrateinterface.exceptions import ConfigurationError
-from substrateinterface.key import extract_derive_path
-from substrateinterface.utils.ecdsa_helpers import mnemonic_to_ecdsa_private_key, ecdsa_verify, ecdsa_sign
-from substrateinterface.utils.encrypted_json import decode_pair_from_encrypted_json, encode_pair
 
 from bip39 import bip39_to_mini_secret, bip39_generate, bip39_validate
 import sr25519
@@ -66,8 +62,41 @@ class MnemonicLanguageCode:
     SPANISH = 'es'
 
 
+# signing backends take (private_key, public_key, data), verifying backends (signature, data, public_key)
+
+def sr25519_sign(private_key:bytes, public_key:bytes, data:bytes) -> bytes:
+    return sr25519.sign((public_key, private_key), data)
+
+def ed25519_sign(private_key:bytes, public_key:bytes, data:bytes) -> bytes:
+    # libsodium (cffi releases the GIL) signs faster than ed25519_zebra, the signatures are the same
+    secret_key = private_key if len(private_key) == 64 else private_key + public_key
+    return nacl.bindings.crypto_sign(data, secret_key)[:nacl.bindings.crypto_sign_BYTES]
+
+# substrateinterface imports eth_keys, which takes longer than the rest of commune, so it is imported on first use
+def configuration_error(msg:str) -> Exception:
+    from substrateinterface.exceptions import ConfigurationError
+    return ConfigurationError(msg)
+
+def ecdsa_sign_data(private_key:bytes, public_key:bytes, data:bytes) -> bytes:
+    # eth_keys uses coincurve when it is installed
+    from substrateinterface.utils.ecdsa_helpers import ecdsa_sign
+    return ecdsa_sign(private_key, data)
+
+def ecdsa_verify(signature:bytes, data:bytes, address:bytes) -> bool:
+    from substrateinterface.utils.ecdsa_helpers import ecdsa_verify
+    return ecdsa_verify(signature, data, address)
+
+def mnemonic_to_ecdsa_private_key(*args, **kwargs) -> bytes:
+    from substrateinterface.utils.ecdsa_helpers import mnemonic_to_ecdsa_private_key
+    return mnemonic_to_ecdsa_private_key(*args, **kwargs)
+
+
 class Keypair(c.Module):
     keys_path = c.data_path + '/keys.json'
+    keyring = {} # key path -> (file version, Keypair), the keys decoded by this process
+    key2address_state = None # {version, key2address, address2key} of the key2address file
+    crypto_type2sign = {KeypairType.ED25519: ed25519_sign, KeypairType.SR25519: sr25519_sign, KeypairType.ECDSA: ecdsa_sign_data}
+    crypto_type2verify = {KeypairType.ED25519: ed25519_zebra.ed_verify, KeypairType.SR25519: sr25519.verify, KeypairType.ECDSA: ecdsa_verify}
     def __init__(self, 
                  ss58_address: str = None, 
                  public_key: Union[bytes, str] = None,
@@ -133,6 +162,7 @@ class Keypair(c.Module):
                     public_key = sr25519.public_from_secret_key(private_key)
 
             if self.crypto_type == KeypairType.ECDSA:
+                from eth_keys.datatypes import PrivateKey
                 private_key_obj = PrivateKey(private_key)
                 public_key = private_key_obj.public_key.to_address()
                 ss58_address = private_key_obj.public_key.to_checksum_address()
@@ -334,12 +364,30 @@ class Keypair(c.Module):
     mnemonics = mems
     
 
+    @classmethod
+    def key_version(cls, path:str) -> Optional[tuple]:
+        """
+        the version (mtime, size, inode) of the json file of the key, None if it is not a file.
+        in the kv storage mode it is the stored text of the key, which changes with any write to it
+        """
+        if not isinstance(path, str):
+            return None
+        if cls.storage_mode == 'kv':
+            text = cls.kv().raw(cls.kv_key(path))
+            return None if text == None else ('kv', text)
+        try:
+            st = os.stat(cls.resolve_path(path, extension='json'))
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
     @classmethod
     def get_key(cls, 
                 path:str,
                 password:str=None, 
                 json:bool=False,
                 create_if_not_exists:bool = False,
+                cache:bool = True, # use the decoded key of the keyring if its file did not change
                 **kwargs):
         if hasattr(path, 'ss58_address'):
             key = path
@@ -347,13 +395,17 @@ class Keypair(c.Module):
         # if ss58_address is provided, get key from address
         if cls.valid_ss58_address(path):
             path = cls.address2key().get(path)
-        if not cls.key_exists(path):
+        version = cls.key_version(path)
+        if cache and not json and version != None:
+            entry = cls.keyring.get(path, None)
+            if entry != None and entry[0] == version:
+                return entry[1]
+        if version == None and not cls.key_exists(path):
             if create_if_not_exists:
-                print(path, 'FAM')
                 key = cls.add_key(path, **kwargs)
                 c.print(f'key does not exist, generating new key -> {key["path"]}')
+                version = cls.key_version(path)
             else:
-                print(path)
                 raise ValueError(f'key does not exist at --> {path}')
         key_json = cls.get(path)
 
@@ -373,7 +425,10 @@ class Keypair(c.Module):
             key_json['path'] = path
             return key_json
         else:
-            return cls.from_json(key_json)
+            key = cls.from_json(key_json)
+            if version != None:
+                cls.keyring[path] = (version, key)
+            return key
         
         
         
@@ -397,25 +452,54 @@ class Keypair(c.Module):
 
     @classmethod
     def key2address(cls, search=None, update=False, **kwargs):
+        """
+        {key: ss58_address}, kept in memory until the key2address file changes
+        """
         path = 'key2address'
-        key2address =  cls.get(path, None , max_age=None, update=update)
-        if key2address == None:
-            key2address =  { k: v.ss58_address for k,v  in cls.get_keys(search).items()}
-            cls.put(path, key2address)
+        version = cls.key_version(path)
+        state = cls.key2address_state
+        if update or state == None or version == None or state['version'] != version:
+            key2address = None if update else cls.get(path, None, max_age=None)
+            if isinstance(key2address, str):
+                key2address = json.loads(key2address)
+            if key2address == None:
+                key2address = cls.build_key2address()
+                cls.put(path, key2address)
+                version = cls.key_version(path)
+            state = cls.key2address_state = {'version': version,
+                                             'key2address': key2address,
+                                             'address2key': {v: k for k, v in key2address.items()}}
+        key2address = dict(state['key2address'])
         if search != None:
             key2address =  {k:v for k,v in key2address.items() if  search in k}
-        if isinstance(key2address, str):
-            import json
-            key2address = json.loads(key2address)
-            self.put(path, key2address)
+        return key2address
+
+    @classmethod
+    def build_key2address(cls) -> dict:
+        """
+        reads the addresses from the key files, only keys without one are decoded
+        """
+        key2address = {}
+        for key in cls.keys():
+            if key == 'key2address':
+                continue
+            try:
+                key_json = cls.get(key)
+                if isinstance(key_json, str) and not cls.is_encrypted(key_json):
+                    key_json = json.loads(key_json)
+                address = key_json.get('ss58_address', None) if isinstance(key_json, dict) else None
+                key2address[key] = address or cls.get_key(key).ss58_address
+            except Exception as e:
+                c.print(f'failed to get address for {key} due to {e}', color='red')
         return key2address
 
     @classmethod
     def address2key(cls, search:Optional[str]=None, update:bool=False):
-        address2key =  { v: k for k,v in cls.key2address(update=update).items()}
+        cls.key2address(update=update)
+        address2key = cls.key2address_state['address2key']
         if search != None :
             return address2key.get(search, None)
-        return address2key
+        return dict(address2key)
     
     @classmethod
     def get_address(cls, key):
@@ -479,6 +563,7 @@ class Keypair(c.Module):
         if key not in keys:
             raise Exception(f'key {key} not found, available keys: {keys}')
         c.rm(key2path[key])
+        cls.keyring.pop(key, None)
         cls.rm_key_address(key)
         return {'deleted':[key]}
     
@@ -783,6 +868,7 @@ class Keypair(c.Module):
             suri = '//' + suri
 
         if suri and suri.startswith('/'):
+            from substrateinterface.constants import DEV_PHRASE
             suri = DEV_PHRASE + suri
 
         suri_regex = re.match(r'^(?P<phrase>.[^/]+( .[^/]+)*)(?P<path>(//?[^/]+)*)(///(?P<password>.*))?$', suri)
@@ -815,6 +901,7 @@ class Keypair(c.Module):
                 if crypto_type not in [KeypairType.SR25519]:
                     raise NotImplementedError('Derivation paths for this crypto type not supported')
 
+                from substrateinterface.key import extract_derive_path
                 derive_junctions = extract_derive_path(suri_parts['path'])
 
                 child_pubkey = derived_keypair.public_key
@@ -888,6 +975,7 @@ class Keypair(c.Module):
         if type(json_data) is str:
             json_data = json.loads(json_data)
 
+        from substrateinterface.utils.encrypted_json import decode_pair_from_encrypted_json
         private_key, public_key = decode_pair_from_encrypted_json(json_data, passphrase)
 
         if 'sr25519' in json_data['encoding']['content']:
@@ -927,6 +1015,7 @@ class Keypair(c.Module):
         # https://github.com/polkadot-js/wasm/blob/master/packages/wasm-crypto/src/rs/sr25519.rs#L125
         converted_private_key = sr25519.convert_secret_key_to_ed25519(self.private_key)
 
+        from substrateinterface.utils.encrypted_json import encode_pair
         encoded = encode_pair(self.public_key, converted_private_key, passphrase)
 
         json_data = {
@@ -960,29 +1049,14 @@ class Keypair(c.Module):
         signature in bytes
 
         """
-        if not isinstance(data, str):
-            data = c.python2str(data)
-        if type(data) is ScaleBytes:
-            data = bytes(data.data)
-        elif data[0:2] == '0x':
-            data = bytes.fromhex(data[2:])
-        elif type(data) is str:
-            data = data.encode()
+        data = self.resolve_message(data)
 
         if not self.private_key:
-            raise ConfigurationError('No private key set to create signatures')
+            raise configuration_error('No private key set to create signatures')
 
-        if self.crypto_type == KeypairType.SR25519:
-            signature = sr25519.sign((self.public_key, self.private_key), data)
-
-        elif self.crypto_type == KeypairType.ED25519:
-            signature = ed25519_zebra.ed_sign(self.private_key, data)
-
-        elif self.crypto_type == KeypairType.ECDSA:
-            signature = ecdsa_sign(self.private_key, data)
-
-        else:
-            raise ConfigurationError("Crypto type not supported")
+        if self.crypto_type not in self.crypto_type2sign:
+            raise configuration_error("Crypto type not supported")
+        signature = self.crypto_type2sign[self.crypto_type](self.private_key, self.public_key, data)
         
         if return_json:
             return {
@@ -996,6 +1070,92 @@ class Keypair(c.Module):
             return f'{data.decode()}{seperator}{signature.hex()}'
         return signature
     
+    @staticmethod
+    def resolve_message(data: Union[ScaleBytes, bytes, str, dict]) -> bytes:
+        if type(data) is bytes:
+            return data
+        if not isinstance(data, (str, bytes)):
+            data = c.python2str(data)
+        if type(data) is ScaleBytes:
+            data = bytes(data.data)
+        elif data[0:2] == '0x':
+            data = bytes.fromhex(data[2:])
+        elif type(data) is str:
+            data = data.encode()
+        return data
+
+    @staticmethod
+    def batch_map(fn, items:list, max_workers:int = 1) -> list:
+        """
+        maps fn over the items, split into one chunk per thread if max_workers > 1 
+        (only faster for backends that release the GIL)
+        """
+        if max_workers <= 1 or len(items) < 2:
+            return [fn(x) for x in items]
+        n = math.ceil(len(items) / max_workers)
+        chunks = [items[i:i+n] for i in range(0, len(items), n)]
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            return [y for ys in executor.map(lambda chunk: [fn(x) for x in chunk], chunks) for y in ys]
+
+    def sign_batch(self, messages:list, max_workers:int = 1, return_json:bool = False) -> list:
+        """
+        Signs the messages with one lookup of the backend, returns the signatures (or the signed jsons) in order
+        """
+        if not self.private_key:
+            raise configuration_error('No private key set to create signatures')
+        if self.crypto_type not in self.crypto_type2sign:
+            raise configuration_error("Crypto type not supported")
+        sign_fn = self.crypto_type2sign[self.crypto_type]
+        private_key, public_key = self.private_key, self.public_key
+        messages = [self.resolve_message(m) for m in messages]
+        signatures = self.batch_map(lambda m: sign_fn(private_key, public_key, m), messages, max_workers=max_workers)
+        if return_json:
+            return [{'data': m.decode(), 'crypto_type': self.crypto_type, 'signature': s.hex(), 'address': self.ss58_address} 
+                    for m, s in zip(messages, signatures)]
+        return signatures
+
+    def verify_batch(self, 
+                     messages:list, 
+                     signatures:list = None, 
+                     addresses:list = None, 
+                     crypto_types:list = None,
+                     max_workers:int = 1) -> List[bool]:
+        """
+        Verifies the messages against the signatures, returns a bool per message.
+        The messages can be signed jsons {data, signature, address, crypto_type} with no signatures,
+        messages without an address are verified against this key.
+        """
+        n = len(messages)
+        if signatures == None:
+            messages = [dict(m) for m in messages]
+            signatures = [m.pop('signature') for m in messages]
+            addresses = [m.pop('address', None) for m in messages] if addresses == None else addresses
+            crypto_types = crypto_types or [m.pop('crypto_type', self.crypto_type) for m in messages]
+            messages = [m.pop('data') if 'data' in m else m for m in messages]
+        crypto_types = crypto_types or [self.crypto_type] * n
+        addresses = addresses or [None] * n
+        assert len(signatures) == n and len(addresses) == n and len(crypto_types) == n, 'messages, signatures, addresses and crypto_types must be the same length'
+        address2public_key = {None: self.public_key}
+        items = []
+        for message, signature, address, crypto_type in zip(messages, signatures, addresses, crypto_types):
+            crypto_type = int(crypto_type) if crypto_type != None else self.crypto_type
+            if address not in address2public_key:
+                if crypto_type == KeypairType.ECDSA:
+                    address2public_key[address] = bytes.fromhex(address[2:] if address[:2] == '0x' else address)
+                else:
+                    address2public_key[address] = bytes.fromhex(ss58_decode(address))
+            if isinstance(signature, str):
+                signature = bytes.fromhex(signature[2:] if signature[:2] == '0x' else signature)
+            items.append((self.crypto_type2verify[crypto_type], signature, self.resolve_message(message), address2public_key[address]))
+        def verify(item):
+            verify_fn, signature, data, public_key = item
+            try:
+                # polkadot-js wraps the data before signing
+                return bool(verify_fn(signature, data, public_key) or verify_fn(signature, b'<Bytes>' + data + b'</Bytes>', public_key))
+            except Exception:
+                return False
+        return self.batch_map(verify, items, max_workers=max_workers)
+
     def ticket2address(self, ticket, **kwargs):
         return self.verify(ticket, **kwargs)
 
@@ -1049,7 +1209,7 @@ class Keypair(c.Module):
             if is_type_1:
                 data = data.pop('data')
             
-        if not isinstance(data, str):
+        if not isinstance(data, (str, bytes)):
             data = c.python2str(data)
 
 
@@ -1078,14 +1238,9 @@ class Keypair(c.Module):
         if type(signature) is not bytes:
             raise TypeError("Signature should be of type bytes or a hex-string")
 
-        if self.crypto_type == KeypairType.SR25519:
-            crypto_verify_fn = sr25519.verify
-        elif self.crypto_type == KeypairType.ED25519:
-            crypto_verify_fn = ed25519_zebra.ed_verify
-        elif self.crypto_type == KeypairType.ECDSA:
-            crypto_verify_fn = ecdsa_verify
-        else:
-            raise ConfigurationError("Crypto type not supported")
+        if self.crypto_type not in self.crypto_type2verify:
+            raise configuration_error("Crypto type not supported")
+        crypto_verify_fn = self.crypto_type2verify[self.crypto_type]
 
         verified = crypto_verify_fn(signature, data, public_key)
 
@@ -1150,9 +1305,9 @@ class Keypair(c.Module):
         """
 
         if not self.private_key:
-            raise ConfigurationError('No private key set to encrypt')
+            raise configuration_error('No private key set to encrypt')
         if self.crypto_type != KeypairType.ED25519:
-            raise ConfigurationError('Only ed25519 keypair type supported')
+            raise configuration_error('Only ed25519 keypair type supported')
         
         
         curve25519_public_key = nacl.bindings.crypto_sign_ed25519_pk_to_curve25519(recipient_public_key)
@@ -1177,9 +1332,9 @@ class Keypair(c.Module):
         """
 
         if not self.private_key:
-            raise ConfigurationError('No private key set to decrypt')
+            raise configuration_error('No private key set to decrypt')
         if self.crypto_type != KeypairType.ED25519:
-            raise ConfigurationError('Only ed25519 keypair type supported')
+            raise configuration_error('Only ed25519 keypair type supported')
         private_key = nacl.bindings.crypto_sign_ed25519_sk_to_curve25519(self.private_key + self.public_key)
         recipient = nacl.public.PrivateKey(private_key)
         curve25519_public_key = nacl.bindings.crypto_sign_ed25519_pk_to_curve25519(sender_public_key)
@@ -1346,7 +1501,7 @@ class Keypair(c.Module):
             True if the address is a valid ss58 address for Bittensor, False otherwise.
         """
         try:
-            return ss58.is_valid_ss58_address( address, valid_ss58_format=c.__ss58_format__ )
+            return is_valid_ss58_address( address, valid_ss58_format=c.__ss58_format__ )
         except (IndexError):
             return False
         
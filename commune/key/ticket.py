@@ -45,10 +45,22 @@ class Ticket(c.Module):
         max_age = age or timeout or max_age 
         staleness = c.time() - data['time']
         assert staleness < max_age, f"Staleness: {staleness} > {max_age}"
-        ticket = data.get('ticket')
-        address = ticket['address']
-        signature = ticket.pop('signature')
-        return c.verify(ticket, signature=signature, address=address, seperator=self.signature_seperator,  **kwargs)
+        return self.verify_many([data], max_age=max_age)[0]
+
+    def verify_many(self, tickets:list, max_age:float = 5, max_workers:int = 1) -> list:
+        """
+        Verifies the signatures of the tickets in one batch, stale tickets are False
+        """
+        now = c.time()
+        fresh = [t for t in tickets if now - t['time'] < max_age]
+        # the signature is over the data and the time of the ticket
+        verified = c.get_key().verify_batch([{'data': t['data'], 'time': t['time']} for t in fresh],
+                                            signatures=[t['ticket']['signature'] for t in fresh],
+                                            addresses=[t['ticket']['address'] for t in fresh],
+                                            crypto_types=[t['ticket'].get('crypto_type', None) for t in fresh],
+                                            max_workers=max_workers)
+        id2verified = {id(t): v for t, v in zip(fresh, verified)}
+        return [id2verified.get(id(t), False) for t in tickets]
 
 
     @classmethod
@@ -0,0 +1,41 @@
+import commune as c
+
+class Bench(c.Module):
+    """
+    Benchmarks c.put/c.get/c.ls on n keys with a json file per key (mode='json')
+    against the sqlite kv store (mode='kv'), one by one and batched
+    """
+
+    def forward(self, n:int = 100_000, modes = ['json', 'kv']):
+        path = 'bench'
+        results = []
+        for mode in modes:
+            self.rm(path)
+            self.rm_kv(path)
+            keys = [f'{path}/{i}' for i in range(n)]
+            t0 = c.time()
+            for i, k in enumerate(keys):
+                self.put(k, {'i': i}, mode=mode)
+            t1 = c.time()
+            values = [self.get(k, mode=mode) for k in keys]
+            t2 = c.time()
+            paths = self.ls(path) if mode == 'json' else self.ls_kv(path)
+            t3 = c.time()
+            assert values[-1] == {'i': n - 1} and len(paths) == n, f'{mode} mismatch'
+            result = {'mode': mode,
+                      'n': n,
+                      'put': round(t1 - t0, 3),
+                      'get': round(t2 - t1, 3),
+                      'ls': round(t3 - t2, 3)}
+            if mode == 'kv':
+                self.put_many({k: {'i': i} for i, k in enumerate(keys)}, mode=mode)
+                t4 = c.time()
+                values = self.get_many(keys, mode=mode)
+                t5 = c.time()
+                assert values[-1] == {'i': n - 1}
+                result.update({'put_many': round(t4 - t3, 3), 'get_many': round(t5 - t4, 3)})
+            results.append(result)
+        self.rm(path)
+        self.rm_kv(path)
+        c.print(c.df(results))
+        return results
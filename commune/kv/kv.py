@@ -0,0 +1,225 @@
+import commune as c
+from typing import *
+from collections import OrderedDict
+import os
+import json
+import sqlite3
+import threading
+
+
+class KV(c.Module):
+    """
+    Single file key value store for c.put/c.get (mode='kv'), a sqlite table in WAL mode.
+    Keys are the resolved storage paths (without .json), so a directory is a key prefix
+    and ls/rm are range scans instead of os.listdir. Reads go through an LRU of the raw json,
+    which is dropped when another process commits (PRAGMA data_version).
+    """
+
+    def __init__(self,
+                 path:str = '~/.commune/kv.sqlite',
+                 cache_size:int = 10_000, # max values in the read cache
+                 timeout:float = 10 # seconds to wait for the write lock of another process
+                 ):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS kv (k TEXT PRIMARY KEY, v TEXT NOT NULL) WITHOUT ROWID')
+        self.lock = threading.RLock()
+        self.cache = OrderedDict() # k -> json text
+        self.cache_size = cache_size
+        self.data_version = self.get_data_version()
+
+    def get_data_version(self) -> int:
+        return self.conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def sync_cache(self):
+        # data_version only changes when another connection commits
+        data_version = self.get_data_version()
+        if data_version != self.data_version:
+            self.cache.clear()
+            self.data_version = data_version
+
+    def cache_put(self, k:str, v:str):
+        self.cache[k] = v
+        self.cache.move_to_end(k)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    @staticmethod
+    def prefix_range(prefix:str) -> Tuple[str, str]:
+        # all keys under the directory prefix: [prefix/, prefix0) as '0' comes right after '/'
+        prefix = prefix.rstrip('/')
+        return prefix + '/', prefix + '0'
+
+    def put(self, k:str, v:Any) -> str:
+        text = json.dumps(v)
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO kv (k, v) VALUES (?, ?)', (k, text))
+            self.cache_put(k, text)
+        return k
+
+    def put_many(self, items:Dict[str, Any]) -> List[str]:
+        """
+        writes all the items in one transaction
+        """
+        rows = [(k, json.dumps(v)) for k, v in items.items()]
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.executemany('INSERT OR REPLACE INTO kv (k, v) VALUES (?, ?)', rows)
+                self.conn.execute('COMMIT')
+            except Exception as e:
+                self.conn.execute('ROLLBACK')
+                raise e
+            for k, text in rows:
+                self.cache_put(k, text)
+        return list(items.keys())
+
+    def get(self, k:str, default:Any = None) -> Any:
+        text = self.raw(k)
+        if text == None:
+            return default
+        # parse on every get so callers can mutate the result without touching the cache
+        return json.loads(text)
+
+    def raw(self, k:str) -> Optional[str]:
+        """
+        the json text of k (None if it is not stored), it changes whenever the value does so it is also its version
+        """
+        with self.lock:
+            self.sync_cache()
+            text = self.cache.get(k, None)
+            if text == None:
+                row = self.conn.execute('SELECT v FROM kv WHERE k = ?', (k,)).fetchone()
+                if row == None:
+                    return None
+                text = row[0]
+                self.cache_put(k, text)
+        return text
+
+    def get_many(self, keys:List[str], default:Any = None) -> List[Any]:
+        with self.lock:
+            self.sync_cache()
+            k2text = {k: self.cache[k] for k in keys if k in self.cache}
+            missing = [k for k in keys if k not in k2text]
+            for i in range(0, len(missing), 500): # stay under the sqlite variable limit
+                chunk = missing[i:i+500]
+                rows = self.conn.execute(f'SELECT k, v FROM kv WHERE k IN ({",".join("?" * len(chunk))})', chunk).fetchall()
+                for k, text in rows:
+                    k2text[k] = text
+                    self.cache_put(k, text)
+        return [json.loads(k2text[k]) if k in k2text else default for k in keys]
+
+    def exists(self, k:str) -> bool:
+        with self.lock:
+            self.sync_cache()
+            if k in self.cache:
+                return True
+            return self.conn.execute('SELECT 1 FROM kv WHERE k = ?', (k,)).fetchone() != None
+
+    def keys(self, prefix:str = '') -> List[str]:
+        """
+        all keys under the prefix, sorted
+        """
+        with self.lock:
+            if prefix == '':
+                return [r[0] for r in self.conn.execute('SELECT k FROM kv ORDER BY k')]
+            start, end = self.prefix_range(prefix)
+            return [r[0] for r in self.conn.execute('SELECT k FROM kv WHERE k >= ? AND k < ? ORDER BY k', (start, end))]
+
+    def items(self, prefix:str = '') -> Dict[str, Any]:
+        start, end = self.prefix_range(prefix)
+        with self.lock:
+            rows = self.conn.execute('SELECT k, v FROM kv WHERE k >= ? AND k < ? ORDER BY k', (start, end)).fetchall()
+        return {k: json.loads(v) for k, v in rows}
+
+    def ls(self, prefix:str = '', recursive:bool = False, extension:str = None) -> List[str]:
+        """
+        the keys under the prefix, or like os.listdir its children (keys and the prefixes with keys under them),
+        the keys get the extension so they line up with the files they replace
+        """
+        keys = self.keys(prefix)
+        extension = '' if extension == None else '.' + extension
+        if recursive:
+            return [k + extension for k in keys]
+        start = len(prefix.rstrip('/')) + 1
+        paths = set()
+        for k in keys:
+            name = k[start:]
+            paths.add(k[:start] + name.split('/')[0] if '/' in name else k + extension)
+        return sorted(paths)
+
+    def rm(self, k:str) -> int:
+        """
+        removes the key and every key under it, returns the number of keys removed
+        """
+        start, end = self.prefix_range(k)
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                n = self.conn.execute('DELETE FROM kv WHERE k = ?', (k,)).rowcount
+                n += self.conn.execute('DELETE FROM kv WHERE k >= ? AND k < ?', (start, end)).rowcount
+                self.conn.execute('COMMIT')
+            except Exception as e:
+                self.conn.execute('ROLLBACK')
+                raise e
+            for key in [key for key in self.cache if key == k or start <= key < end]:
+                del self.cache[key]
+        return n
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM kv').fetchone()[0]
+
+    def migrate(self, path:str = '~/.commune', rm:bool = False, batch_size:int = 1000, exclude = ['.git', '__pycache__']) -> dict:
+        """
+        copies every json file under path into the store (keyed by its path without .json),
+        rm deletes the files that were copied
+        """
+        path = os.path.expanduser(path)
+        batch, migrated, failed = {}, [], []
+        def flush():
+            self.put_many(batch)
+            migrated.extend(batch.keys())
+            batch.clear()
+        for root, dirs, files in os.walk(path):
+            dirs[:] = [d for d in dirs if d not in exclude]
+            for f in files:
+                if not f.endswith('.json'):
+                    continue
+                file_path = os.path.join(root, f)
+                try:
+                    with open(file_path) as file:
+                        batch[file_path[:-len('.json')]] = json.load(file)
+                except Exception as e:
+                    failed.append(file_path)
+                if len(batch) >= batch_size:
+                    flush()
+        flush()
+        if rm:
+            for k in migrated:
+                os.remove(k + '.json')
+        return {'success': True, 'migrated': len(migrated), 'failed': failed, 'path': self.path}
+
+    @classmethod
+    def test(cls):
+        path = c.resolve_path('~/.commune/kv/test.sqlite')
+        if os.path.exists(path):
+            os.remove(path)
+        self = cls(path=path)
+        self.put('a/b/1', {'data': 1})
+        self.put_many({'a/b/2': {'data': 2}, 'a/c': {'data': 3}, 'ab': {'data': 4}})
+        assert self.get('a/b/1') == {'data': 1}
+        assert self.get_many(['a/b/2', 'a/x'], default={}) == [{'data': 2}, {}]
+        assert self.ls('a') == ['a/b', 'a/c'], self.ls('a')
+        assert self.ls('a', extension='json') == ['a/b', 'a/c.json']
+        assert self.ls('a', recursive=True) == ['a/b/1', 'a/b/2', 'a/c']
+        # a write from another connection invalidates the cache
+        cls(path=path).put('a/b/1', {'data': 5})
+        assert self.get('a/b/1') == {'data': 5}
+        assert self.rm('a/b') == 2
+        assert self.keys() == ['a/c', 'ab'] and self.get('a/b/1') == None
+        os.remove(path)
+        return {'success': True, 'msg': 'kv test passed'}
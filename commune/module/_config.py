@@ -33,6 +33,7 @@ class Config:
 
         self.config = config 
         self.kwargs = kwargs
+        self.clear_info_cache()
 
             
         return self.config
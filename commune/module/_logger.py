@@ -1,8 +1,5 @@
-from rich.console import Console
-
-
 class Logger:
-    console = Console() # the consolve
+    console = None # the console, rich is imported on the first print
 
     @classmethod
     def logs(cls, *args, **kwargs):
@@ -17,16 +14,11 @@ class Logger:
 
     @classmethod
     def resolve_console(cls, console = None, **kwargs):
-        if hasattr(cls,'console'):
+        if cls.console != None:
             return cls.console
-        import logging
-        from rich.logging import RichHandler
         from rich.console import Console
-        logging.basicConfig(level=logging.DEBUG, handlers=[RichHandler()])   
-            # print the line number
-        console = Console()
-        cls.console = console
-        return console
+        cls.console = Console()
+        return cls.console
     
 
 
@@ -43,7 +35,7 @@ class Logger:
     def print(cls, *text:str, 
               color:str=None, 
               verbose:bool = True,
-              console: Console = None,
+              console: 'Console' = None,
               flush:bool = False,
               buffer:str = None,
               **kwargs):
@@ -1,6 +1,5 @@
 import os
 import urllib
-import requests
 import netaddr
 from typing import *
 import socket
@@ -95,6 +94,7 @@ class Network:
                 Exception(Exception):
                     Raised if all external ip attempts fail.
         """
+        import requests # slow to import, only needed here
         # --- Try curl.
 
 
@@ -425,6 +425,44 @@ class Network:
                 return True
             except socket.error:
                 return False
+
+    @classmethod
+    async def async_connect(cls, port: int, ip: str = '0.0.0.0', timeout: float = 1) -> Optional[socket.socket]:
+        """
+        Non-blocking connect, returns the connected (non-blocking) socket or None if nothing is listening
+        """
+        import asyncio
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            await asyncio.wait_for(asyncio.get_running_loop().sock_connect(sock, (ip, int(port))), timeout=timeout)
+            return sock
+        except (OSError, asyncio.TimeoutError):
+            sock.close()
+            return None
+
+    @classmethod
+    async def async_port_used(cls, port: int, ip: str = '0.0.0.0', timeout: float = 1) -> bool:
+        sock = await cls.async_connect(port=port, ip=ip, timeout=timeout)
+        if sock == None:
+            return False
+        sock.close()
+        return True
+
+    @classmethod
+    async def async_used_ports(cls, ports:List[int] = None, ip:str = '0.0.0.0', port_range:Tuple[int, int] = None, timeout:float = 1, max_concurrency:int = 512) -> List[int]:
+        """
+        Non-blocking connects to every port, with at most max_concurrency sockets open at once
+        """
+        import asyncio
+        if ports == None:
+            ports = list(range(*cls.resolve_port_range(port_range=port_range)))
+        semaphore = asyncio.Semaphore(max_concurrency)
+        async def check_port(port):
+            async with semaphore:
+                return await cls.async_port_used(port=port, ip=ip, timeout=timeout)
+        results = await asyncio.gather(*[check_port(port) for port in ports])
+        return [port for port, used in zip(ports, results) if used]
     
     @classmethod
     def port_free(cls, *args, **kwargs) -> bool:
@@ -562,33 +600,18 @@ class Network:
         return not cls.port_used(port=port, ip=ip)
         
     @classmethod
-    def used_ports(cls, ports:List[int] = None, ip:str = '0.0.0.0', port_range:Tuple[int, int] = None):
+    def used_ports(cls, ports:List[int] = None, ip:str = '0.0.0.0', port_range:Tuple[int, int] = None, timeout:float = 1, max_concurrency:int = 512):
         '''
         Get availabel ports out of port range
         
         Args:
             ports: list of ports
             ip: ip address
-        
+            timeout: timeout per port
+            max_concurrency: max ports checked at once
         '''
-        port_range = cls.resolve_port_range(port_range=port_range)
-        if ports == None:
-            ports = list(range(*port_range))
-        
-        async def check_port(port, ip):
-            return cls.port_used(port=port, ip=ip)
-        
-        used_ports = []
-        jobs = []
-        for port in ports: 
-            jobs += [check_port(port=port, ip=ip)]
-                
-        results = cls.gather(jobs)
-        for port, result in zip(ports, results):
-            if isinstance(result, bool) and result:
-                used_ports += [port]
-            
-        return used_ports
+        job = cls.async_used_ports(ports=ports, ip=ip, port_range=port_range, timeout=timeout, max_concurrency=max_concurrency)
+        return cls.gather(job, timeout=None)
     
 
     get_used_ports = used_ports
@@ -1,5 +1,8 @@
 
 import os
+import time
+import threading
+from collections import OrderedDict
 from functools import partial
 from typing import List, Dict
 
@@ -123,10 +126,17 @@ class Routes:
         # WARNING : THE PLACE HOLDERS MUST NOT INTERFERE WITH THE KWARGS OTHERWISE IT WILL CAUSE A BUG IF THE KWARGS ARE THE SAME AS THE PLACEHOLDERS
         # THE PLACEHOLDERS ARE NAMED AS module_ph and fn_ph AND WILL UNLIKELY INTERFERE WITH THE KWARGS
         def fn_generator( *args, module_ph, fn_ph, **kwargs):
-            module_ph = cls.module(module_ph)
-            fn_type = module_ph.classify_fn(fn_ph)
-            module_ph = module_ph() if fn_type == 'self' else module_ph
-            return getattr(module_ph, fn_ph)(*args, **kwargs)
+            module, fn_type = cls.route_target(module_ph, fn_ph)
+            if fn_type == 'self':
+                module = cls.route_instance(module_ph)
+            t0 = time.time()
+            success = False
+            try:
+                output = getattr(module, fn_ph)(*args, **kwargs)
+                success = True
+                return output
+            finally:
+                cls.add_route_latency(f'{module_ph}.{fn_ph}', time.time() - t0, success)
 
         if routes == None:
             if not hasattr(cls, 'routes'):
@@ -146,9 +156,89 @@ class Routes:
         t1 = cls.time()
         cls.print(f'enabled routes in {t1-t0} seconds', verbose=verbose)
         cls.routes_enabled = True
+        cls.schema_version = getattr(cls, 'schema_version', 0) + 1 # the instances rebuild their schema with the routes
         return {'success': True, 'msg': 'enabled routes'}
     
 
+    # ROUTE DISPATCH
+    # a route resolves its module and the type of its function once, and the functions that need an instance use
+    # a warm one from a bounded pool keyed by (module, init kwargs) instead of constructing the module (its config, connections ...) on every call.
+    # modules like subspace keep connection state that is not thread safe, so each thread has its own pool (a threading.local)
+    route_targets = {} # (module, fn) -> (module class, fn type)
+    route_local = threading.local() # .instances: (module, init kwargs) -> instance, least recently used first
+    route_version = 0 # clear_routes bumps it to drop the pools of every thread
+    max_route_instances = 32 # per thread
+    route_latencies = {} # module.fn -> {calls, errors, total, max} in seconds
+    route_lock = threading.Lock()
+
+    @classmethod
+    def route_target(cls, module:str, fn:str) -> tuple:
+        target = Routes.route_targets.get((module, fn), None)
+        if target == None:
+            module_class = cls.module(module)
+            target = Routes.route_targets[(module, fn)] = (module_class, module_class.classify_fn(fn))
+        return target
+
+    @classmethod
+    def route_instances(cls) -> OrderedDict:
+        """
+        the pool of warm instances of the calling thread
+        """
+        local = Routes.route_local
+        if getattr(local, 'version', None) != Routes.route_version:
+            local.instances, local.version = OrderedDict(), Routes.route_version
+        return local.instances
+
+    @classmethod
+    def route_instance(cls, module:str, **init_kwargs):
+        """
+        the warm instance of the module for its init kwargs, constructed on first use
+        """
+        key = (module, tuple(sorted(init_kwargs.items())))
+        instances = cls.route_instances()
+        instance = instances.get(key, None)
+        if instance != None:
+            instances.move_to_end(key)
+            return instance
+        instance = instances[key] = cls.module(module)(**init_kwargs)
+        while len(instances) > Routes.max_route_instances:
+            instances.popitem(last=False)
+        return instance
+
+    @classmethod
+    def add_route_latency(cls, route:str, latency:float, success:bool = True):
+        with Routes.route_lock:
+            stats = Routes.route_latencies.get(route, None)
+            if stats == None:
+                stats = Routes.route_latencies[route] = {'calls': 0, 'errors': 0, 'total': 0.0, 'max': 0.0}
+            stats['calls'] += 1
+            stats['errors'] += int(not success)
+            stats['total'] += latency
+            stats['max'] = max(stats['max'], latency)
+
+    @classmethod
+    def route_stats(cls, search:str = None) -> Dict[str, dict]:
+        """
+        the calls, errors and mean/max latency (ms) of each route called in this process
+        """
+        with Routes.route_lock:
+            latencies = {k: dict(v) for k, v in Routes.route_latencies.items() if search == None or search in k}
+        return {k: {'calls': v['calls'],
+                    'errors': v['errors'],
+                    'mean_ms': round(v['total'] / v['calls'] * 1000, 3),
+                    'max_ms': round(v['max'] * 1000, 3)} for k, v in latencies.items()}
+
+    @classmethod
+    def clear_routes(cls) -> dict:
+        """
+        drops the resolved route targets, the warm instances and the latencies
+        """
+        with Routes.route_lock:
+            Routes.route_targets.clear()
+            Routes.route_version += 1
+            Routes.route_latencies.clear()
+        return {'success': True, 'msg': 'cleared the route targets and instances'}
+
     def fn2module(cls):
         '''
         get the module of a function
@@ -1,18 +1,37 @@
 
 from typing import *
+from copy import deepcopy
 import inspect
 
 class Schema:
     whitelist = []
 
     _schema = None
+    _info_cache = None # the endpoints, metadata and info of the module, see clear_info_cache
+    _cache_version = None
+    schema_version = 0 # bumped when functions are installed on the class (enable_routes), which drops the caches of its instances
+
+    def clear_info_cache(self) -> dict:
+        """
+        drops the cached schema and info, for after changing the functions or the schema attributes 
+        (whitelist, name, address, key ...) of the module
+        """
+        self._info_cache = None
+        self._schema = None
+        return {'success': True, 'msg': 'cleared the info cache'}
+
+    def info_cache(self) -> dict:
+        if self._info_cache == None or self._cache_version != self.schema_version:
+            self._info_cache, self._schema, self._cache_version = {}, None, self.schema_version
+        return self._info_cache
+
     def schema(self,
                 search = None,
                 docs: bool = True,
                 defaults:bool = True, 
                 cache=True) -> 'Schema':
         schema = {}
-        if cache and self._schema != None:
+        if cache and self._schema != None and self._cache_version == self.schema_version:
             return self._schema
         fns = self.public_functions()
         for fn in fns:
@@ -23,6 +42,7 @@ class Schema:
         # sort by keys
         schema = dict(sorted(schema.items()))
         if cache:
+            self.info_cache() # drops the caches of an older schema version
             self._schema = schema
 
         return schema
@@ -356,7 +376,7 @@ class Schema:
         assert not hasattr(self, name), f'{name} already exists'
 
         setattr(self, name, fn)
-
+        self.clear_info_cache()
         return {
             'success':True ,
             'message':f'Added {name} to {self.__class__.__name__}'
@@ -931,11 +951,15 @@ class Schema:
         '''
         hey, whadup hey how is it going
         '''
-        info = self.metadata()
-        info['name'] = self.server_name or self.module_name()
-        info['address'] = self.address
-        info['key'] = self.key.ss58_address
-        return info
+        cache = self.info_cache()
+        if 'info' not in cache:
+            info = self.metadata()
+            info['name'] = self.server_name or self.module_name()
+            info['address'] = self.address
+            info['key'] = self.key.ss58_address
+            cache = self.info_cache() # reading the key the first time sets it, which resets the cache
+            cache['info'] = info
+        return deepcopy(cache['info']) # the callers get their own copy to mutate
     
 
 
@@ -975,12 +999,18 @@ class Schema:
 
     
     def public_functions(self, search=None, include_helper_functions = True):
+        cache = self.info_cache()
+        is_default = search == None and include_helper_functions
+        if is_default and 'endpoints' in cache:
+            return list(cache['endpoints'])
         endpoints = []  
         if include_helper_functions:
             endpoints += self.helper_functions
 
         for f in dir(self):
             try:
+                if isinstance(inspect.getattr_static(type(self), f, None), property):
+                    continue # properties can run anything
                 if not callable(getattr(self, f)):
                     continue
 
@@ -996,8 +1026,9 @@ class Schema:
         if hasattr(self, 'whitelist'):
             endpoints += self.whitelist
             endpoints = list(set(endpoints))
-
-        return endpoints
+        if is_default:
+            cache['endpoints'] = endpoints
+        return list(endpoints)
 
     get_whitelist = endpoints = public_functions
     
@@ -1015,11 +1046,13 @@ class Schema:
              'email': None}
     
     def metadata(self, to_string=False, code=False):
-        schema = {f:getattr(getattr(self, f), '__metadata__') for f in self.endpoints() if self.is_endpoint(f)}
-        metadata = {}
-        metadata['schema'] = schema
-        metadata['description'] = self.description
-        metadata['urls'] = {k: v for k,v in self.urls.items() if v != None}
+        cache = self.info_cache()
+        if 'metadata' not in cache:
+            schema = {f:getattr(getattr(self, f), '__metadata__') for f in self.endpoints() if self.is_endpoint(f)}
+            cache['metadata'] = {'schema': schema,
+                                 'description': self.description,
+                                 'urls': {k: v for k,v in self.urls.items() if v != None}}
+        metadata = deepcopy(cache['metadata']) # the callers get their own copy to mutate
         if to_string:
             return self.python2str(metadata)
         return metadata
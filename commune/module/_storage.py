@@ -12,6 +12,9 @@ import shutil
 
 class Storage:
 
+    storage_mode = os.environ.get('COMMUNE_STORAGE_MODE', 'json') # json (a file per key) or kv (one sqlite file, see commune/kv)
+    kv_stores = {}
+
     @classmethod
     async def async_put_json(cls,*args,**kwargs) -> str:
         return cls.put_json(*args, **kwargs) 
@@ -78,6 +81,7 @@ class Storage:
         
         assert isinstance(path, str), f'path must be a string, got {type(path)}'
         path = cls.resolve_path(path=path, extension=extension)
+        n = cls.rm_kv(path) if cls.storage_mode == 'kv' else 0
 
         # incase we want to remove the json file
         mode_suffix = f'.{mode}'
@@ -85,6 +89,8 @@ class Storage:
             path += mode_suffix
 
         if not os.path.exists(path):
+            if n > 0:
+                return {'success':True, 'message':f'{path} removed ({n} keys)'}
             return {'success':False, 'message':f'{path} does not exist'}
         if os.path.isdir(path):
             cls.rmdir(path)
@@ -385,9 +391,14 @@ class Storage:
         try:
             ls_files = cls.lsdir(path) if not recursive else cls.walk(path)
         except FileNotFoundError:
-            return []
+            ls_files = []
         if return_full_path:
             ls_files = [os.path.abspath(os.path.join(path,f)) for f in ls_files]
+        if cls.storage_mode == 'kv':
+            kv_files = cls.ls_kv(path, recursive=recursive)
+            if not return_full_path:
+                kv_files = [f[len(path.rstrip('/'))+1:] for f in kv_files]
+            ls_files = list(set(ls_files + kv_files))
 
         ls_files = sorted(ls_files)
         if search != None:
@@ -396,39 +407,58 @@ class Storage:
     
 
 
+    @classmethod
+    def pack_data(cls, v:Any, encrypt:bool = False, password:str = None) -> dict:
+        encrypt = encrypt or password != None
+        
+        if encrypt or password != None:
+            v = cls.encrypt(v, password=password)
+
+        if not cls.jsonable(v):
+            v = cls.serialize(v)    
+        
+        return {'data': v, 'encrypted': encrypt, 'timestamp': cls.timestamp()}
+
     @classmethod
     def put(cls, 
             k: str, 
             v: Any,  
-            mode: bool = 'json',
+            mode: str = None,
             encrypt: bool = False, 
             verbose: bool = False, 
             password: str = None, **kwargs) -> Any:
         '''
         Puts a value in the config
         '''
-        encrypt = encrypt or password != None
-        
-        if encrypt or password != None:
-            v = cls.encrypt(v, password=password)
-
-        if not cls.jsonable(v):
-            v = cls.serialize(v)    
-        
-        data = {'data': v, 'encrypted': encrypt, 'timestamp': cls.timestamp()}            
+        mode = mode or cls.storage_mode
+        data = cls.pack_data(v, encrypt=encrypt, password=password)
         
         # default json 
         getattr(cls,f'put_{mode}')(k, data)
 
-        data_size = cls.sizeof(v)
+        data_size = cls.sizeof(data['data'])
     
-        return {'k': k, 'data_size': data_size, 'encrypted': encrypt, 'timestamp': cls.timestamp()}
+        return {'k': k, 'data_size': data_size, 'encrypted': data['encrypted'], 'timestamp': data['timestamp']}
+
+    @classmethod
+    def put_many(cls, items:Dict[str, Any], mode:str = None, encrypt:bool = False, password:str = None) -> List[str]:
+        '''
+        Puts the {k: v} items, in one transaction for the kv mode
+        '''
+        mode = mode or cls.storage_mode
+        k2data = {k: cls.pack_data(v, encrypt=encrypt, password=password) for k, v in items.items()}
+        if mode == 'kv':
+            cls.kv().put_many({cls.kv_key(k): data for k, data in k2data.items()})
+        else:
+            for k, data in k2data.items():
+                getattr(cls,f'put_{mode}')(k, data)
+        return list(items.keys())
     
     @classmethod
     def get(cls,
             k:str, 
             default: Any=None, 
-            mode:str = 'json',
+            mode:str = None,
             max_age:str = None,
             cache :bool = False,
             full :bool = False,
@@ -445,6 +475,7 @@ class Storage:
         if cache:
             if k in cls.cache:
                 return cls.cache[k]
+        mode = mode or cls.storage_mode
         data = getattr(cls, f'get_{mode}')(k,default=default, **kwargs)
         
             
@@ -453,6 +484,33 @@ class Storage:
             assert data['encrypted'] , f'{k} is not encrypted'
             data['data'] = cls.decrypt(data['data'], password=password, key=key)
 
+        data = cls.unpack_data(k, data, default=default, max_age=max_age, full=full, update=update)
+
+        # local cache
+        if cache:
+            cls.cache[k] = data
+        return data
+
+    @classmethod
+    def get_many(cls, 
+                 keys:List[str], 
+                 default:Any = None, 
+                 mode:str = None, 
+                 max_age:int = None, 
+                 full:bool = False, 
+                 update:bool = False) -> List[Any]:
+        '''
+        Gets the values of the keys in order, in one query for the kv mode
+        '''
+        mode = mode or cls.storage_mode
+        if mode == 'kv':
+            datas = cls.kv().get_many([cls.kv_key(k) for k in keys])
+        else:
+            datas = [getattr(cls, f'get_{mode}')(k, default=None) for k in keys]
+        return [cls.unpack_data(k, data, default=default, max_age=max_age, full=full, update=update) for k, data in zip(keys, datas)]
+
+    @classmethod
+    def unpack_data(cls, k:str, data:Any, default:Any = None, max_age:int = None, full:bool = False, update:bool = False) -> Any:
         data = data or default
         
         if isinstance(data, dict):
@@ -472,12 +530,48 @@ class Storage:
             if isinstance(data, dict):
                 if 'data' in data:
                     data = data['data']
-
-        # local cache
-        if cache:
-            cls.cache[k] = data
         return data
-  
+
+    @classmethod
+    def kv(cls, path:str = None) -> 'KV':
+        '''
+        The kv store of the process (see commune/kv), one sqlite file under the cache path by default
+        '''
+        path = path or f'{cls.cache_path}/kv.sqlite'
+        # connections are not shared with forked processes
+        key = (path, os.getpid())
+        if key not in Storage.kv_stores:
+            Storage.kv_stores[key] = cls.module('kv')(path=path)
+        return Storage.kv_stores[key]
+
+    @classmethod
+    def kv_key(cls, k:str) -> str:
+        path = cls.resolve_path(k)
+        return path[:-len('.json')] if path.endswith('.json') else path
+
+    @classmethod
+    def put_kv(cls, k:str, data:Any, **kwargs) -> str:
+        return cls.kv().put(cls.kv_key(k), data)
+
+    @classmethod
+    def get_kv(cls, k:str, default:Any = None, **kwargs) -> Any:
+        return cls.kv().get(cls.kv_key(k), default)
+
+    @classmethod
+    def rm_kv(cls, k:str) -> int:
+        return cls.kv().rm(cls.kv_key(k))
+
+    @classmethod
+    def ls_kv(cls, path:str = '', recursive:bool = False) -> List[str]:
+        return cls.kv().ls(cls.kv_key(path), recursive=recursive, extension='json')
+
+    @classmethod
+    def migrate_storage(cls, path:str = None, rm:bool = False) -> dict:
+        '''
+        Copies the json files under the cache path (~/.commune) into the kv store, 
+        set COMMUNE_STORAGE_MODE=kv to use it for put/get/ls/rm
+        '''
+        return cls.kv().migrate(path or cls.cache_path, rm=rm)
 
 
     
@@ -110,6 +110,7 @@ class Task:
                 module: str = None,
                 mode:str='thread',
                 max_workers : int = 100,
+                copy : bool = False, # deep copy the args, only needed if the caller mutates them while the task runs
                 ):
         kwargs = {} if kwargs == None else kwargs
         args = [] if args == None else args
@@ -123,10 +124,11 @@ class Task:
         
         fn = cls.get_fn(fn)
         executor = cls.executor(max_workers=max_workers, mode=mode) if executor == None else executor
-        args = cls.copy(args)
-        kwargs = cls.copy(kwargs)
-        init_kwargs = cls.copy(init_kwargs)
-        init_args = cls.copy(init_args)
+        if copy:
+            args = cls.copy(args)
+            kwargs = cls.copy(kwargs)
+            init_kwargs = cls.copy(init_kwargs)
+            init_args = cls.copy(init_args)
         if module == None:
             module = cls
         else:
@@ -154,12 +156,43 @@ class Task:
         else:
             return cls.wait(future, timeout=timeout)
 
+    @classmethod
+    def submit_many(cls, 
+                    fn, 
+                    batch_args: List[list] = None, 
+                    batch_kwargs: List[dict] = None, 
+                    timeout:int = 40, 
+                    return_future:bool = True,
+                    executor = None,
+                    mode:str = 'thread',
+                    max_workers:int = 100,
+                    copy:bool = False):
+        """
+        Submits fn once per args/kwargs in the batch, enqueued under one lock of the executor
+        """
+        fn = cls.get_fn(fn)
+        executor = cls.executor(max_workers=max_workers, mode=mode) if executor == None else executor
+        if copy:
+            batch_args = cls.copy(batch_args)
+            batch_kwargs = cls.copy(batch_kwargs)
+        futures = executor.submit_many(fn=fn, batch_args=batch_args, batch_kwargs=batch_kwargs, timeout=timeout)
+        if return_future:
+            return futures
+        return cls.wait(futures, timeout=timeout)
+
+    @classmethod
+    def map(cls, fn, *iterables, timeout:int = 40, **kwargs) -> list:
+        """
+        Like the builtin map, but in the executor, returns the results in order
+        """
+        return cls.submit_many(fn, batch_args=[list(args) for args in zip(*iterables)], timeout=timeout, return_future=False, **kwargs)
+
     @classmethod
     def submit_batch(cls,  fn:str, batch_kwargs: List[Dict[str, Any]], return_future:bool=False, timeout:int=10, module = None,  *args, **kwargs):
         n = len(batch_kwargs)
         module = cls if module == None else module
         executor = cls.executor(max_workers=n)
-        futures = [ executor.submit(fn=getattr(module, fn), kwargs=batch_kwargs[i], timeout=timeout) for i in range(n)]
+        futures = executor.submit_many(fn=getattr(module, fn), batch_kwargs=batch_kwargs, timeout=timeout)
         if return_future:
             return futures
         return cls.wait(futures)
@@ -167,13 +200,15 @@ class Task:
    
     executor_cache = {}
     @classmethod
-    def executor(cls, max_workers:int=None, mode:str="thread", cache:bool = True, maxsize=200, **kwargs):
+    def executor(cls, max_workers:int=None, mode:str="thread", cache:bool = True, maxsize=None, **kwargs):
+        # one executor per (mode, max_workers), so asking for a different size does not hand back the cached one
+        key = (mode, max_workers)
         if cache:
-            if mode in cls.executor_cache:
-                return cls.executor_cache[mode]
+            if key in cls.executor_cache:
+                return cls.executor_cache[key]
         executor =  cls.module(f'executor.{mode}')(max_workers=max_workers, maxsize=maxsize , **kwargs)
         if cache:
-            cls.executor_cache[mode] = executor
+            cls.executor_cache[key] = executor
         return executor
     
 
@@ -1,5 +1,6 @@
 
 from typing import *
+import json
 import os
 from copy import deepcopy
 
@@ -161,52 +162,170 @@ class Tree:
                     tree_path:str = None, 
                     extension = '.py', 
                     verbose = True,
-                    avoid_paths = ['__pycache__', '.git', '.vscode', '.ipynb_checkpoints', '/env/'],
+                    avoid_paths = ['__pycache__', '.git', '.vscode', '.ipynb_checkpoints'],
                     search=None,
                    **kwargs):
         
         tree_path = tree_path or cls.libpath
         t1 = cls.time()
         tree_path = cls.resolve_path(tree_path)
+        update = cls.update_tree(tree_path, extension=extension, avoid_paths=avoid_paths)
+        dirs = cls.tree_state(tree_path)['dirs']
         module_tree = {}
-        for path in cls.glob(tree_path+'/**/**.py', recursive=True):
-            simple_path = cls.path2simple(path)
-            if simple_path == None:
-                continue
-            module_tree[simple_path] = path
+        for dirpath in sorted(dirs, key=lambda d: (-d.count('/'), d)):
+            module_tree.update(dirs[dirpath]['modules']) # the shallower module wins a name, like simple2path
         latency = cls.time() - t1
         if search != None:
             module_tree = {k:v for k,v in module_tree.items() if search in k}
-        cls.print(f'Tree updated -> path={tree_path} latency={latency}, n={len(module_tree)}',  color='cyan', verbose=verbose)
+        cls.print(f'Tree updated -> path={tree_path} latency={latency}, n={len(module_tree)} scanned={update["scanned"]}',  color='cyan', verbose=verbose)
 
         return module_tree
+
+    # INCREMENTAL TREE
+    # the tree is kept per folder with the folder's mtime, which changes when a file is added, removed or renamed in it,
+    # so an update stats the folders and only lists the ones that changed
+    tree_states = {} # tree path -> {mtime, state} of its tree state file
+    max_tree_changes = 1000 # versions kept in the change feed
+
     @classmethod
-    def tree_paths(cls, update=False, **kwargs) -> List[str]:
-        return cls.ls()
-    
+    def tree_state_path(cls, tree_path:str) -> str:
+        return cls.cache_path + '/tree/' + tree_path.strip('/').replace('/', '_') + '.json'
+
     @classmethod
-    def tree_hash(cls, *args, **kwargs):
-        tree = cls.tree(*args, **kwargs)
-        tree_hash = cls.hash(tree)
-        cls.put('tree_hash', tree_hash)
-        return tree_hash
+    def tree_state(cls, tree_path:str = None) -> dict:
+        """
+        the persisted tree of tree_path as {dirs: {dir: {mtime, modules, subdirs}}, version, hash, changes, pwd}
+        """
+        tree_path = cls.resolve_path(tree_path or cls.libpath)
+        path = cls.tree_state_path(tree_path)
+        mtime = cls.file_mtime(path)
+        cached = cls.tree_states.get(tree_path, None)
+        if cached == None or cached['mtime'] != mtime:
+            state = None
+            if mtime != None:
+                try:
+                    with open(path) as f:
+                        state = json.load(f)
+                except Exception:
+                    state = None
+            # the simple paths outside of the library are relative to the working directory
+            pwd = None if tree_path.startswith(cls.libpath) else cls.pwd()
+            if state == None or state.get('pwd') != pwd:
+                state = {'root': tree_path, 'pwd': pwd, 'dirs': {}, 'version': 0, 'hash': '0' * 64, 'changes': []}
+            cached = cls.tree_states[tree_path] = {'mtime': mtime, 'state': state}
+        return cached['state']
+
+    @classmethod
+    def scan_dir(cls, dirpath:str, extension:str = '.py', avoid_paths:List[str] = []) -> dict:
+        mtime = cls.file_mtime(dirpath) # before listing, so a change during the listing is seen by the next update
+        modules, subdirs = {}, []
+        for entry in os.scandir(dirpath):
+            if entry.name.startswith('.'):
+                continue # hidden like glob
+            if entry.is_dir():
+                # virtualenvs are skipped by their pyvenv.cfg, not by name, so a module package named env stays in the tree
+                if not any([p in entry.path + '/' for p in avoid_paths]) and not os.path.exists(entry.path + '/pyvenv.cfg'):
+                    subdirs.append(entry.path)
+            elif entry.name.endswith(extension) and entry.is_file():
+                simple_path = cls.path2simple(entry.path)
+                if simple_path != None:
+                    modules[simple_path] = entry.path
+        return {'mtime': mtime, 'modules': modules, 'subdirs': sorted(subdirs)}
+
+    @staticmethod
+    def dir_hash(dirpath:str, modules:dict) -> int:
+        # the tree hash is the xor of the folder hashes, so a folder is swapped out without rehashing the others
+        if len(modules) == 0:
+            return 0
+        import hashlib
+        data = json.dumps([dirpath, sorted(modules.items())])
+        return int(hashlib.sha256(data.encode()).hexdigest(), 16)
+
+    @classmethod
+    def update_tree(cls,
+                    tree_path:str = None,
+                    extension:str = '.py',
+                    avoid_paths:List[str] = ['__pycache__', '.git', '.vscode', '.ipynb_checkpoints']) -> dict:
+        """
+        rescans the folders whose mtime changed, adds what changed to the change feed and saves the tree if anything did
+        """
+        import fcntl
+        tree_path = cls.resolve_path(tree_path or cls.libpath)
+        path = cls.tree_state_path(tree_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                state = cls.tree_state(tree_path)
+                dirs, new_dirs, scanned = state['dirs'], {}, []
+                rescan = state.get('avoid_paths', None) != avoid_paths # a tree scanned with other avoid_paths is scanned again
+                stack = [tree_path]
+                while len(stack) > 0:
+                    dirpath = stack.pop()
+                    info = dirs.get(dirpath, None)
+                    mtime = cls.file_mtime(dirpath)
+                    if mtime == None:
+                        continue
+                    if rescan or info == None or info['mtime'] != mtime:
+                        info = cls.scan_dir(dirpath, extension=extension, avoid_paths=avoid_paths)
+                        scanned.append(dirpath)
+                    new_dirs[dirpath] = info
+                    stack.extend(info['subdirs'])
+                changes = []
+                tree_hash = int(state['hash'], 16)
+                for dirpath in scanned + [d for d in dirs if d not in new_dirs]:
+                    old = dirs.get(dirpath, {}).get('modules', {})
+                    new = new_dirs.get(dirpath, {}).get('modules', {})
+                    if old != new:
+                        changes.append({'dir': dirpath,
+                                        'added': {k: v for k, v in new.items() if old.get(k) != v},
+                                        'removed': [k for k in old if k not in new]})
+                        tree_hash ^= cls.dir_hash(dirpath, old) ^ cls.dir_hash(dirpath, new)
+                if len(scanned) > 0 or len(new_dirs) != len(dirs):
+                    state = {**state, 'dirs': new_dirs, 'hash': f'{tree_hash:064x}', 'avoid_paths': avoid_paths}
+                    if len(changes) > 0:
+                        state['version'] += 1
+                        state['changes'] = (state['changes'] + [{'version': state['version'], 'timestamp': cls.time(), 'changes': changes}])[-cls.max_tree_changes:]
+                    tmp_path = f'{path}.{os.getpid()}.tmp'
+                    with open(tmp_path, 'w') as f:
+                        json.dump(state, f)
+                    os.replace(tmp_path, path)
+                    cls.tree_states[tree_path] = {'mtime': cls.file_mtime(path), 'state': state}
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return {'version': state['version'], 'hash': state['hash'], 'changes': changes, 'scanned': len(scanned), 'dirs': len(new_dirs)}
+
+    @classmethod
+    def tree_changes(cls, since:int = 0, tree_path:str = None, update:bool = True) -> dict:
+        """
+        the change feed of the tree: the changes after version since. complete is False when the feed no longer
+        goes back to since, then the caller should reread the whole tree
+        """
+        if update:
+            cls.update_tree(tree_path)
+        state = cls.tree_state(tree_path)
+        feed = state['changes']
+        complete = since >= state['version'] or (len(feed) > 0 and feed[0]['version'] <= since + 1)
+        return {'version': state['version'], 'complete': complete, 'changes': [c for c in feed if c['version'] > since]}
+
+    @classmethod
+    def tree_hash(cls, path:str = None, **kwargs):
+        return cls.update_tree(path)['hash']
 
     @classmethod
-    def old_tree_hash(cls, *args, **kwargs):
-        return cls.get('tree_hash', None)
+    def old_tree_hash(cls, path:str = None, **kwargs):
+        return cls.tree_state(path)['hash']
 
     @classmethod
-    def has_tree_changed(cls, *args, **kwargs):
-        old_tree_hash = cls.old_tree_hash(*args, **kwargs)
-        new_tree_hash = cls.tree_hash(*args, **kwargs)
-        return old_tree_hash != new_tree_hash
+    def has_tree_changed(cls, path:str = None, **kwargs):
+        return len(cls.update_tree(path)['changes']) > 0
 
     def run_loop(self, *args, sleep_time=10, **kwargs):
         while True:
             self.print('Checking for tree changes')
             if self.has_tree_changed():
                 self.tree(update=True)
-            self.sleep(10)
+            self.sleep(sleep_time)
         
     @classmethod
     def add_tree(cls, tree_path:str = './', **kwargs):
@@ -408,14 +527,105 @@ class Tree:
 
 
 
+    module_index_state = None # the module index file as of its last read/write in this process
+
+    @classmethod
+    def module_index_path(cls) -> str:
+        return cls.cache_path + '/module_index.json'
+
+    @staticmethod
+    def file_mtime(path:str):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    @classmethod
+    def module_index(cls, update:bool = False) -> dict:
+        """
+        simple path -> {path, object_path, mtime, dir_mtime, pwd}, shared by the processes through module_index.json
+        and reloaded when that file changes
+        """
+        path = cls.module_index_path()
+        mtime = cls.file_mtime(path)
+        state = cls.module_index_state
+        if update or state == None or state['mtime'] != mtime:
+            index = {}
+            if mtime != None:
+                try:
+                    with open(path) as f:
+                        index = json.load(f)
+                except Exception:
+                    index = {} # a corrupt index is rebuilt as modules resolve
+            state = cls.module_index_state = {'mtime': mtime, 'index': index}
+        return state['index']
+
+    @classmethod
+    def is_valid_index_entry(cls, entry:dict) -> bool:
+        # the file must not have changed, nor its folder (a module file added or removed next to it)
+        if entry.get('pwd') not in [None, cls.pwd()]:
+            return False
+        return entry['mtime'] == cls.file_mtime(entry['path']) and entry['dir_mtime'] == cls.file_mtime(os.path.dirname(entry['path']))
+
+    @classmethod
+    def index_lookup(cls, simple_path:str) -> Optional[str]:
+        """
+        the object path of the simple path if the index has a valid entry for it
+        """
+        entry = cls.module_index().get(simple_path, None)
+        if entry == None or not cls.is_valid_index_entry(entry):
+            return None
+        return entry['object_path']
+
+    @classmethod
+    def index_module(cls, simple_path:str, path:str, object_path:str) -> dict:
+        """
+        adds the module to the index file in a locked read-modify-write, written to a temporary file and renamed over it
+        """
+        import fcntl
+        entry = {'path': path,
+                 'object_path': object_path,
+                 'mtime': cls.file_mtime(path),
+                 'dir_mtime': cls.file_mtime(os.path.dirname(path)),
+                 # modules outside of the library were found relative to the working directory
+                 'pwd': None if path.startswith(cls.libpath) else cls.pwd()}
+        index_path = cls.module_index_path()
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        with open(index_path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                index = dict(cls.module_index())
+                index[simple_path] = entry
+                tmp_path = f'{index_path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, index_path)
+                cls.module_index_state = {'mtime': cls.file_mtime(index_path), 'index': index}
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return entry
+
+    @classmethod
+    def rm_module_index(cls) -> dict:
+        path = cls.module_index_path()
+        if os.path.exists(path):
+            os.remove(path)
+        cls.module_index_state = None
+        return {'success': True, 'msg': f'removed the module index at {path}'}
+
     @classmethod
     def simple2objectpath(cls, 
                           simple_path:str,
                            cactch_exception = False, 
+                           cache = True,
                            **kwargs) -> str:
+        if cache:
+            object_path = cls.index_lookup(simple_path)
+            if object_path != None:
+                return object_path
 
         pwd = cls.pwd()
-        object_path = cls.simple2path(simple_path, **kwargs)
+        object_path = path = cls.simple2path(simple_path, **kwargs)
         classes =  cls.find_classes(object_path)
 
         if object_path.startswith(pwd):
@@ -429,6 +639,8 @@ class Tree:
         if object_path.startswith('.'):
             object_path = object_path[1:]
         object_path = object_path + '.' + classes[-1]
+        if cache:
+            cls.index_module(simple_path, path, object_path)
         return object_path
 
 
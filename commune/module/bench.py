@@ -0,0 +1,135 @@
+import commune as c
+import subprocess
+from functools import partial
+import json
+import sys
+import os
+
+class Bench(c.Module):
+    """
+    Benchmarks for the cold start of commune and the module resolution
+    """
+
+    def run_python(self, *args, env:dict = None) -> subprocess.CompletedProcess:
+        env = {**os.environ, 'PYTHONPATH': c.libpath, **(env or {})}
+        return subprocess.run([sys.executable, *args], capture_output=True, text=True, env=env, cwd=c.libpath)
+
+    def importtime(self, n:int = 20) -> list:
+        """
+        the n slowest imports of import commune (python -X importtime), by cumulative time
+        """
+        stderr = self.run_python('-X', 'importtime', '-c', 'import commune').stderr
+        rows = []
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            rows.append({'module': name.strip(), 'self_ms': int(self_us) / 1000, 'cumulative_ms': int(cumulative_us) / 1000})
+        return sorted(rows, key=lambda r: r['cumulative_ms'], reverse=True)[:n]
+
+    def startup(self, trials:int = 5, commands = [['-c', 'import commune'], ['-c', 'from commune.cli import main; main()', 'info']]):
+        """
+        wall time of a fresh interpreter for import commune and for the cli (c info), min over trials
+        """
+        results = []
+        for command in commands:
+            latencies = []
+            for _ in range(trials):
+                t0 = c.time()
+                process = self.run_python(*command)
+                latencies.append(c.time() - t0)
+                assert process.returncode == 0, process.stderr[-1000:]
+            results.append({'command': ' '.join(command), 'trials': trials, 'min': round(min(latencies), 3), 'mean': round(sum(latencies) / trials, 3)})
+        return results
+
+    resolve_script = """
+import commune as c, json, sys, time
+paths, cache = json.loads(sys.argv[1]), sys.argv[2] == '1'
+latencies = []
+for path in paths:
+    t0 = time.time()
+    path = c.shortcuts(cache=cache).get(path, path)
+    c.simple2objectpath(path, cache=cache)
+    latencies.append(time.time() - t0)
+print(json.dumps(latencies))
+"""
+
+    def resolve(self, n:int = 200):
+        """
+        latency of resolving n modules (shortcuts + simple path -> object path, without the import) in a fresh process,
+        without the index (baseline), with an empty index (cold) and with the index on disk (warm)
+        """
+        paths = []
+        for path in c.tree():
+            try:
+                c.simple2objectpath(path, cache=False)
+                paths.append(path)
+            except Exception:
+                pass
+        paths = paths[:n]
+        results = []
+        for mode in ['baseline', 'cold', 'warm']:
+            if mode == 'cold':
+                c.rm_module_index()
+            process = self.run_python('-c', self.resolve_script, json.dumps(paths), str(int(mode != 'baseline')))
+            assert process.returncode == 0, process.stderr[-1000:]
+            latencies = sorted(json.loads(process.stdout.splitlines()[-1]))
+            results.append({'mode': mode,
+                            'modules': len(paths),
+                            'total_ms': round(sum(latencies) * 1000, 2),
+                            'p50_us': round(latencies[len(latencies) // 2] * 1e6, 1),
+                            'p99_us': round(latencies[int(len(latencies) * 0.99)] * 1e6, 1)})
+        return results
+
+    def tree_update(self, trials:int = 5, tree_path:str = None):
+        """
+        rebuilding the module tree with a full glob (baseline) vs the incremental tree when nothing or one folder changed
+        """
+        tree_path = tree_path or c.libpath
+        def glob_tree():
+            return {c.path2simple(p): p for p in c.glob(tree_path + '/**/**.py', recursive=True)}
+        def touch():
+            path = c.root_path + '/tree_bench.py'
+            c.put_text(path, 'class TreeBench: pass')
+            os.remove(path)
+            return c.update_tree(tree_path)
+        results = []
+        for mode, fn in [('glob', glob_tree), ('unchanged', lambda: c.update_tree(tree_path)), ('one_dir_changed', touch)]:
+            fn()
+            latencies = []
+            for _ in range(trials):
+                t0 = c.time()
+                fn()
+                latencies.append(c.time() - t0)
+            results.append({'mode': mode, 'min_ms': round(min(latencies) * 1000, 2), 'mean_ms': round(sum(latencies) / trials * 1000, 2)})
+        return results
+
+    @staticmethod
+    def route_baseline(module:str, fn:str, *args, **kwargs):
+        # the dispatch before the route cache, resolving and constructing the module on every call
+        module = c.module(module)
+        fn_type = module.classify_fn(fn)
+        module = module() if fn_type == 'self' else module
+        return getattr(module, fn)(*args, **kwargs)
+
+    def routes(self, n:int = 200, routes = [['ticket', 'ticket', []], ['user', 'is_user', ['module']], ['key', 'key_exists', ['module']]]):
+        """
+        latency of n routed calls (c.<fn>) with the per call dispatch (baseline) and with the cached targets and instances
+        """
+        results = []
+        for module, fn, args in routes:
+            for mode in ['baseline', 'cached']:
+                call = partial(self.route_baseline, module, fn) if mode == 'baseline' else getattr(c.Module, fn)
+                call(*args)
+                t0 = c.time()
+                for _ in range(n):
+                    call(*args)
+                results.append({'route': f'{module}.{fn}', 'mode': mode, 'calls': n, 'mean_us': round((c.time() - t0) / n * 1e6, 1)})
+        return results
+
+    def forward(self, trials:int = 5, n:int = 20):
+        importtime = self.importtime(n=n)
+        c.print(c.df(importtime))
+        results = self.startup(trials=trials)
+        c.print(c.df(results))
+        return {'importtime': importtime, 'startup': results}
@@ -82,6 +82,7 @@ class c(*CORE_MODULES):
         if key == None:
             key = self.server_name
         self._key = key if hasattr(key, 'ss58_address') else c.get_key(key, create_if_not_exists=True)
+        self.clear_info_cache()
         return self._key
 
     @classmethod
@@ -122,6 +123,8 @@ class c(*CORE_MODULES):
         return os.path.dirname(cls.filepath())
     folderpath = dirname = dirpath
 
+    module_name_cache = {} # module file -> simple name, storage paths resolve it on every put/get
+
     @classmethod
     def module_name(cls, obj=None):
         if hasattr(cls, 'name') and isinstance(cls.name, str):
@@ -129,7 +132,9 @@ class c(*CORE_MODULES):
         
         obj = cls.resolve_object(obj)
         module_file =  inspect.getfile(obj)
-        return cls.path2simple(module_file)
+        if module_file not in cls.module_name_cache:
+            cls.module_name_cache[module_file] = cls.path2simple(module_file)
+        return cls.module_name_cache[module_file]
     
     path  = name = module_name 
     
@@ -298,6 +303,7 @@ class c(*CORE_MODULES):
     @server_name.setter
     def server_name(self, name):
         self._server_name = name
+        self.clear_info_cache()
 
     @classmethod
     def resolve_server_name(cls, 
@@ -620,6 +626,8 @@ class c(*CORE_MODULES):
     
     is_module_folder = is_folder_module
 
+    key_module_cache = {} # mode -> key module, so c.get_key does not resolve it on every call
+
     @classmethod
     def get_key(cls,key:str = None ,mode='commune', **kwargs) -> None:
         mode2module = {
@@ -633,7 +641,9 @@ class c(*CORE_MODULES):
         key = cls.resolve_keypath(key)
         if 'Keypair' in c.type_str(key):
             return key
-        module = c.module(mode2module[mode])
+        if mode not in cls.key_module_cache:
+            cls.key_module_cache[mode] = c.module(mode2module[mode])
+        module = cls.key_module_cache[mode]
         if hasattr(module, 'get_key'):
             key = module.get_key(key, **kwargs)
         else:
@@ -898,9 +908,14 @@ class c(*CORE_MODULES):
         return  getattr(cls, f'{mode}_launch')(**launch_kwargs)
 
 
+    shortcuts_state = None # (mtime, shortcuts) of shortcuts.yaml
     @classmethod
     def shortcuts(cls, cache=True) -> Dict[str, str]:
-        return cls.get_yaml(os.path.dirname(__file__)+ '/shortcuts.yaml')
+        path = os.path.dirname(__file__)+ '/shortcuts.yaml'
+        mtime = cls.file_mtime(path)
+        if not cache or c.shortcuts_state == None or c.shortcuts_state[0] != mtime:
+            c.shortcuts_state = (mtime, cls.get_yaml(path))
+        return dict(c.shortcuts_state[1])
 
     def __repr__(self) -> str:
         return f'<{self.class_name()}'
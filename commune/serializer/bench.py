@@ -0,0 +1,54 @@
+import commune as c
+import numpy as np
+import json
+
+class Bench(c.Module):
+    """
+    Benchmarks the json (hex) wire format against the msgpack (raw buffer) wire format
+    for a signed request carrying one float32 array, round tripped through the same
+    steps as the client and server (encode + sign, verify + decode, encode echo, decode)
+    """
+    def __init__(self, key=None):
+        self.serializer = c.module('serializer')()
+        self.key = c.get_key(key, create_if_not_exists=True)
+
+    def json_roundtrip(self, x):
+        request = json.dumps(self.key.sign(self.serializer.serialize({'args': [x]}), return_json=True))
+        input = json.loads(request)
+        assert self.key.verify(input), 'invalid signature'
+        input = self.serializer.deserialize(input['data'])
+        response = json.dumps(self.serializer.serialize(input['args'][0]))
+        output = self.serializer.deserialize(json.loads(response))
+        return output, len(request) + len(response)
+
+    def msgpack_roundtrip(self, x):
+        data = self.serializer.to_bytes({'args': [x]})
+        request = self.serializer.to_bytes({'data': data, 'signature': self.key.sign(data).hex(), 'address': self.key.ss58_address})
+        input = self.serializer.from_bytes(request)
+        assert self.key.verify(input), 'invalid signature'
+        input = self.serializer.from_bytes(input['data'])
+        response = self.serializer.to_bytes(input['args'][0])
+        output = self.serializer.from_bytes(response)
+        return output, len(request) + len(response)
+
+    def forward(self, sizes = [1, 10, 100], modes = ['json', 'msgpack'], trials:int = 3):
+        """
+        sizes are in MB
+        """
+        results = []
+        for size in sizes:
+            x = np.random.rand(size * 1024 * 1024 // 4).astype(np.float32)
+            for mode in modes:
+                roundtrip = getattr(self, f'{mode}_roundtrip')
+                latencies = []
+                for _ in range(trials):
+                    t0 = c.time()
+                    output, nbytes = roundtrip(x)
+                    latencies.append(c.time() - t0)
+                assert np.array_equal(output, x), f'{mode} roundtrip mismatch'
+                results.append({'mode': mode,
+                                'size_mb': size,
+                                'wire_mb': round(nbytes / 2**20, 2),
+                                'latency': round(min(latencies), 4)})
+        c.print(c.df(results))
+        return results
@@ -7,6 +7,7 @@ import numpy as np
 from typing import *
 from copy import deepcopy
 import commune as c
+import struct
 import json
 
 
@@ -143,6 +144,11 @@ class Serializer(c.Module):
     list_types = [list, set, tuple] # shit that you can turn into lists for json
     iterable_types = [list, set, tuple, dict] # 
     json_serializable_types = [int, float, str, bool, type(None)]
+    buffer_types = ['numpy', 'torch'] # types that travel as raw buffers in msgpack
+    wire_formats = {'msgpack': 'application/msgpack', 'json': 'application/json'} # wire format -> content type
+    stream_content_type = 'application/msgpack-stream' # generator outputs as length prefixed frames
+    frame_header = struct.Struct('>BI') # kind, length of the payload
+    frame_kinds = {'msgpack': 0, 'raw': 1} # msgpack: one or more packed items, raw: one bytes item as is
 
 
     def serialize(self,x:dict, mode = 'dict', copy_value = True):
@@ -168,20 +174,8 @@ class Serializer(c.Module):
 
         else:
             # GET THE TYPE OF THE VALUE
-            data_type = str(type(x)).split("'")[1]
-            if 'Munch' in data_type:
-                data_type = 'munch'
-            if 'Tensor' in data_type or 'torch' in data_type:
-                data_type = 'torch'
-            if 'ndarray' in data_type:
-                data_type = 'numpy'
-            if  'DataFrame' in data_type:
-                data_type = 'pandas'
-            serializer = self.name2serializer[data_type]
-            if not hasattr(serializer, 'date_type'):
-                serializer = serializer()
-                setattr(serializer, 'date_type', data_type)
-                self.name2serializer[data_type] = serializer
+            data_type = self.get_data_type(x)
+            serializer = self.get_serializer(data_type)
             if serializer is not None:
                 # SERIALIZE MODE ON
                 result = {'data':  serializer.serialize(x), 
@@ -194,6 +188,26 @@ class Serializer(c.Module):
         return result
 
 
+    def get_data_type(self, x) -> str:
+        data_type = str(type(x)).split("'")[1]
+        if 'Munch' in data_type:
+            data_type = 'munch'
+        if 'Tensor' in data_type or 'torch' in data_type:
+            data_type = 'torch'
+        if 'ndarray' in data_type:
+            data_type = 'numpy'
+        if  'DataFrame' in data_type:
+            data_type = 'pandas'
+        return data_type
+
+    def get_serializer(self, data_type:str):
+        serializer = self.name2serializer[data_type]
+        if not hasattr(serializer, 'date_type'):
+            serializer = serializer()
+            setattr(serializer, 'date_type', data_type)
+            self.name2serializer[data_type] = serializer
+        return serializer
+
     def resolve_serialized_result(self, result, mode = 'str'):
         if mode == 'str':
             if isinstance(result, dict):
@@ -221,7 +235,9 @@ class Serializer(c.Module):
     def deserialize(self, x) -> object:
         """Serializes a torch object to DataBlock wire format.
         """
-        if isinstance(x, dict) and isinstance(x.get('data', None), str):
+        if isinstance(x, bytes):
+            return self.from_bytes(x)
+        if isinstance(x, dict) and isinstance(x.get('data', None), str) and not self.is_serialized(x):
             x = x['data']
 
 
@@ -253,14 +269,114 @@ class Serializer(c.Module):
             if self.is_serialized(v):
                 data_type = v['data_type']
                 data = v['data']
-                if hasattr(self, f'deserialize_{data_type}'):
-                    x[k] = getattr(self, f'deserialize_{data_type}')(data=data)
+                if data_type in self.name2serializer:
+                    x[k] = self.get_serializer(data_type).deserialize(data)
             elif type(v) in [dict, list, tuple, set]:
                 x[k] = self.deserialize(x=v)
         if is_single:
             x = x[0]
         return x
 
+    ############ MSGPACK WIRE FORMAT ###############
+
+    def wire_format(self, content_type:str = None) -> str:
+        """
+        Resolves the wire format from a content type (e.g. application/msgpack -> msgpack)
+        returns None if the content type is not supported
+        """
+        content_type = (content_type or self.wire_formats['json']).split(';')[0].strip().lower()
+        content_type2wire_format = {v:k for k,v in self.wire_formats.items()}
+        return content_type2wire_format.get(content_type, None)
+
+    def to_bytes(self, x:Any) -> bytes:
+        """
+        Packs x with msgpack, where numpy arrays and torch tensors travel as raw buffers 
+        with a dtype/shape header instead of hex strings inside json
+        """
+        import msgpack
+        return msgpack.packb(x, default=self.encode_buffer, use_bin_type=True)
+
+    def from_bytes(self, data:bytes) -> Any:
+        import msgpack
+        return msgpack.unpackb(data, object_hook=self.decode_buffer, raw=False, strict_map_key=False)
+
+    def encode_buffer(self, x:Any) -> Any:
+        """
+        msgpack hook for the objects that msgpack cannot pack natively
+        """
+        if type(x) in self.list_types:
+            return list(x)
+        data_type = self.get_data_type(x)
+        if data_type not in self.buffer_types:
+            # everything else falls back to the json serializers
+            return self.serialize(x, mode=None, copy_value=False)
+        if data_type == 'torch':
+            x = x.detach().cpu()
+            if 'bfloat16' in str(x.dtype):
+                x = x.float() # numpy has no bfloat16
+            x = x.numpy()
+        if x.dtype.hasobject:
+            # the items are packed one by one (through this hook), decode_buffer puts them back in an array of the shape
+            return {'data': x.reshape(-1).tolist(), 
+                    'dtype': x.dtype.str, 
+                    'shape': list(x.shape), 
+                    'data_type': data_type, 
+                    'serialized': True}
+        x = np.ascontiguousarray(x)
+        return {'data': memoryview(x.reshape(-1).view(np.uint8)), 
+                'dtype': x.dtype.str, 
+                'shape': list(x.shape),
+                'data_type': data_type, 
+                'serialized': True}
+
+    def decode_buffer(self, x:dict) -> Any:
+        """
+        msgpack hook that turns the buffers from encode_buffer back into arrays/tensors
+        """
+        if not self.is_serialized(x):
+            return x
+        data_type = x['data_type']
+        if data_type in self.buffer_types and isinstance(x['data'], bytes):
+            # zero copy view over the received buffer (read only, like msgpack_numpy)
+            array = np.frombuffer(x['data'], dtype=np.dtype(x['dtype'])).reshape(x['shape'])
+            if data_type == 'torch':
+                import torch
+                array = torch.from_numpy(array.copy())
+            return array
+        if data_type == 'numpy' and isinstance(x['data'], list):
+            array = np.empty(len(x['data']), dtype=np.dtype(x['dtype']))
+            array[:] = x['data']
+            return array.reshape(x['shape'])
+        return self.get_serializer(data_type).deserialize(x['data'])
+
+    def packer(self):
+        import msgpack
+        return msgpack.Packer(default=self.encode_buffer, use_bin_type=True)
+
+    def pack_frame(self, items:List[bytes]) -> bytes:
+        """
+        a msgpack frame from items that are already packed (packer().pack)
+        """
+        payload = b''.join(items)
+        return self.frame_header.pack(self.frame_kinds['msgpack'], len(payload)) + payload
+
+    def raw_frame(self, data:bytes) -> List[bytes]:
+        """
+        a raw frame, the header and the data are sent apart so the data is not copied
+        """
+        return [self.frame_header.pack(self.frame_kinds['raw'], len(data)), data]
+
+    def unpack_frame(self, kind:int, payload:bytes) -> list:
+        """
+        the items of a frame
+        """
+        import msgpack
+        if kind == self.frame_kinds['raw']:
+            return [payload]
+        unpacker = msgpack.Unpacker(object_hook=self.decode_buffer, raw=False, strict_map_key=False, max_buffer_size=max(len(payload), 2**20))
+        unpacker.feed(payload)
+        return list(unpacker)
+
     def dict2bytes(self, data:dict) -> bytes:
         import msgpack
         data_json_str = json.dumps(data)
@@ -275,3 +391,12 @@ class Serializer(c.Module):
         if isinstance(data, str):
             data = json.loads(data)
         return data
+
+    @classmethod
+    def test(cls):
+        self = cls()
+        for x in [np.arange(6, dtype=np.float32).reshape(2, 3), np.array([{'a': 1}, 'b', None, [1, 2]], dtype=object).reshape(2, 2)]:
+            outputs = {'json': self.deserialize(self.serialize(x)), 'msgpack': self.from_bytes(self.to_bytes(x))}
+            for wire_format, y in outputs.items():
+                assert isinstance(y, np.ndarray) and y.dtype == x.dtype and y.tolist() == x.tolist(), f'{wire_format} returned {y}'
+        return {'success': True, 'msg': 'serializer test passed'}
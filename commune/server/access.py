@@ -17,7 +17,9 @@ class Access(c.Module):
                 state_path = f'state_path', # the path to the state
                 refresh: bool = False,
                 stake_from_multipler: int =  1.0, # 1 call per every N tokens staked per timescale
-                max_staleness: int =  60, #  1000 seconds per sync with the network
+                min_rate: float = 0, # calls per timescale for callers without stake (0 denies them)
+                max_staleness: int =  60, # seconds per sync with the network
+                max_slots: int = 100_000, # max (address, fn) rate limit slots kept in memory
                 **kwargs):
         
         self.set_config(locals())
@@ -29,22 +31,60 @@ class Access(c.Module):
         if isinstance(module, str):
             module = c.module(module)()
         self.module = module
-        c.thread(self.run_loop)
-
+        self.limiter = c.module('server.limiter')(period=self.period, max_slots=self.config.max_slots)
         self.state = {'sync_time': 0, 
+                      'stake': {},
                       'stake_from': {}, 
                       'fn_info': {}}
+        self.set_rates(self.state)
+        c.thread(self.run_loop)
 
+    def set_rates(self, state:dict) -> dict:
+        """
+        precomputes the rate of every staked address and the roles of the callers, 
+        and swaps them in at once so forward never sees a half built map
+        """
+        stake_from = state.get('stake_from', {})
+        address2stake = dict(state.get('stake', {}))
+        for address, stake in stake_from.items():
+            address2stake[address] = address2stake.get(address, 0) + stake * self.config.stake_from_multipler
+        users = self.user_module.users()
+        min_rate = self.config.min_rate
+        self.rates = {
+            'min_rate': min_rate,
+            'address2rate': {address: max(stake / self.config.stake2rate, min_rate) for address, stake in address2stake.items()},
+            # the rate of a fn is scaled by its own stake2rate
+            'fn2scale': {fn: self.config.stake2rate / info.get('stake2rate', self.config.stake2rate) for fn, info in state.get('fn_info', {}).items()},
+            'admins': {address for address, info in users.items() if info.get('role') == 'admin'},
+            'unlimited': set(users) | set(c.address2key()), # users and local keys
+        }
+        return self.rates
+
+    def get_role(self, address) -> str:
+        """
+        admin, unlimited (local keys and users) or None, from the snapshot of the last sync, 
+        the keys and users added since then are checked live and added to it
+        """
+        rates = self.rates
+        if address in rates['admins']:
+            return 'admin'
+        if address in rates['unlimited']:
+            return 'unlimited'
+        if c.is_admin(address):
+            rates['admins'].add(address)
+            return 'admin'
+        if c.address2key(address) != None or c.is_user(address):
+            rates['unlimited'].add(address)
+            return 'unlimited'
+        return None
 
     def get_rate_limit(self, fn, address):
         # stake rate limit
-        stake = self.state['stake'].get(address, 0)
-        stake_from = self.state['stake_from'].get(address, 0)
-        stake = (stake_from * self.config.stake_from_multipler) + stake
-        fn_info = self.state.get('fn_info', {}).get(fn, {'stake2rate': self.config.stake2rate, 'max_rate': self.config.max_rate})
-        rate_limit = (stake / fn_info['stake2rate']) # convert the stake to a rate
-
-        return rate_limit
+        rates = self.rates
+        rate = rates['address2rate'].get(address, rates['min_rate'])
+        if fn in rates['fn2scale']:
+            rate = max(rate * rates['fn2scale'][fn], rates['min_rate'])
+        return rate
 
     whitelist = ['info', 'verify', 'rm_state']
     @c.endpoint(cost=1)
@@ -64,39 +104,25 @@ class Access(c.Module):
             - to check admins use the is_admin function (c.is_admin(address) or c.admins() for all admins)
             - to add an admin use the add_admin function (c.add_admin(address))
         2. Local keys have unlimited access but only to the functions in the whitelist
+        3. Everyone else gets stake / stake2rate calls per timescale (at least min_rate), no stake means no calls
         returns : dict
         """
         input = input or {}
         address = input.get('address', address)
-        print(f'address={address}')
-        if c.is_admin(address):
+        rates = self.rates
+        role = self.get_role(address)
+        if role == 'admin':
             return {'success': True, 'msg': f'is verified admin'}
         assert fn in self.module.whitelist , f"Function {fn} not in whitelist={self.module.whitelist}"
         is_private_fn = bool(fn.startswith('__') or fn.startswith('_'))
         assert not is_private_fn, f'Function {fn} is private'
-        # CHECK IF THE ADDRESS IS A LOCAL KEY
-        is_local_key = address in self.address2key
-        is_user = c.is_user(address)
-        if is_local_key or is_user:
+        # CHECK IF THE ADDRESS IS A LOCAL KEY OR A USER
+        if role == 'unlimited':
             return {'success': True, 'msg': f'address {address} is a local key or user, so it has unlimited access'}
         rate_limit = self.get_rate_limit(fn, address)
         # check if the user has exceeded the rate limit
-        user_info = self.state.get('user_info', {}).get(address, {})
-        user_info['timestamp'] = c.time()
-        user_info['fn_info'] = user_info.get('fn_info', {})
-        user_fn_info = user_info['fn_info'].get(fn, {"timestamp": c.time(), 'count': 0})
-        reset_count = bool((c.time() - user_fn_info['timestamp']) > self.period)
-        if reset_count:
-            user_fn_info['count'] = 0
-        else:
-            user_fn_info['count'] += 1
-        assert user_fn_info['count'] <= rate_limit, f'rate limit exceeded for {fn}'
-
-        user_info['fn_info'][fn] = user_fn_info
-        self.state['user_info'] = self.state.get('user_info', {})
-        self.state['user_info'][address] = user_info
-        # check the rate limit
-        return user_info
+        assert self.limiter.allow((address, fn), rate_limit), f'rate limit exceeded for {fn}'
+        return {'success': True, 'fn': fn, 'address': address, 'rate_limit': rate_limit}
 
     verify = forward
 
@@ -118,8 +144,6 @@ class Access(c.Module):
         netuid = netuid or self.config.netuid
         network = network or self.config.network
         staleness = c.time() - state.get('sync_time', 0)
-        self.address2key = c.address2key()
-        c.namespace(max_age=self.config.max_staleness)
         response = { 
                     'path': self.state_path,
                     'max_staleness':  self.config.max_staleness,
@@ -128,8 +152,14 @@ class Access(c.Module):
                     'staleness': int(staleness), 
                     }
         
+        if network == 'local':
+            # the local network has no stake, so only the roles are refreshed
+            response['msg'] = 'Synced the roles of the local network'
+            self.set_rates({**self.state, **state})
+            return response
         if staleness < self.config.max_staleness:
             response['msg'] = f'synced too earlly waiting {self.config.max_staleness - staleness} seconds'
+            self.set_rates({**self.state, **state})
             return response
         else:
             response['msg'] =  'Synced with the network'
@@ -137,6 +167,8 @@ class Access(c.Module):
         self.subspace = c.module('subspace')(network=network)
         state['stake'] = self.subspace.stakes(fmt='j', netuid=netuid, update=update, max_age=self.config.max_staleness)
         state['stake_from'] = self.subspace.stake_from(fmt='j', netuid=netuid, update=update, max_age=self.config.max_staleness)
+        state['sync_time'] = c.time()
+        self.set_rates(state)
         self.state = state
         self.put(self.state_path, self.state)
         return response
@@ -0,0 +1,280 @@
+import commune as c
+import threading
+import os
+
+class Bench(c.Module):
+    """
+    Benchmarks for the server request path
+    """
+    whitelist = ['items', 'chunks'] # the generators of the stream bench
+
+    def verifier(self, n:int = 1000, crypto_types = ['sr25519', 'ed25519']):
+        """
+        verifications/sec on one core for Keypair.verify (the old c.verify path) vs the server Verifier
+        """
+        Key = c.module('key')
+        serializer = c.module('serializer')()
+        verifier = c.module('server.verifier')()
+        results = []
+        for crypto_type in crypto_types:
+            key = Key.create_from_mnemonic(Key.generate_mnemonic(), crypto_type=Key.crypto_name2type(crypto_type))
+            inputs = [key.sign(serializer.serialize({'args': [], 'kwargs': {'i': i}, 'timestamp': c.timestamp()}), return_json=True) for i in range(n)]
+            for mode in ['keypair', 'verifier']:
+                t0 = c.time()
+                if mode == 'keypair':
+                    verified = [key.verify(input) for input in inputs]
+                else:
+                    verified = verifier.verify_many(inputs)
+                latency = c.time() - t0
+                assert all(verified), f'{mode} failed to verify {crypto_type}'
+                results.append({'crypto_type': crypto_type, 'mode': mode, 'n': n, 'verifications_per_sec': int(n / latency)})
+        c.print(c.df(results))
+        return results
+
+    def scan(self, port_ranges = [[50050, 50150], [40000, 50000]], max_concurrency:int = 512):
+        """
+        seconds to scan the port ranges for servers (build_namespace) and for open ports (used_ports)
+        """
+        namespace = c.module('namespace')
+        results = []
+        for port_range in port_ranges:
+            t0 = c.time()
+            used_ports = c.used_ports(port_range=port_range, max_concurrency=max_concurrency)
+            t1 = c.time()
+            port2name = c.gather(namespace.async_scan_ports(list(range(*port_range)), max_concurrency=max_concurrency), timeout=None)
+            t2 = c.time()
+            c.gather(namespace.async_scan_ports(list(range(*port_range)), max_concurrency=max_concurrency, incremental=True), timeout=None)
+            t3 = c.time()
+            results.append({'ports': port_range[1] - port_range[0], 
+                            'used_ports': len(used_ports), 
+                            'servers': len([n for n in port2name.values() if n != None]),
+                            'used_ports_latency': round(t1 - t0, 3),
+                            'scan_latency': round(t2 - t1, 3), 
+                            'incremental_scan_latency': round(t3 - t2, 3)})
+        c.print(c.df(results))
+        return results
+
+    def access(self, n:int = 200_000, threads:int = 64, addresses:int = 10_000, rate:float = 100):
+        """
+        rate limit checks/sec with threads concurrent threads, for the limiter alone and Access.forward 
+        (stake -> rate lookup + limiter) with addresses staked callers, and the calls let through 
+        when every thread hammers one address with rate calls per period
+        """
+        module = c.module('module')()
+        module.whitelist = ['info']
+        access = c.module('server.access')(module=module, network='local', stake2rate=1, max_rate=rate)
+        callers = [f'caller{i}' for i in range(addresses)]
+        access.set_rates({'stake': {a: rate for a in callers}})
+        def run(fn, inputs):
+            # one thread per chunk, all released at once
+            chunks = [inputs[i::threads] for i in range(threads)]
+            outputs = [None] * threads
+            barrier = threading.Barrier(threads)
+            def worker(i):
+                barrier.wait()
+                outputs[i] = [fn(x) for x in chunks[i]]
+            workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+            [w.start() for w in workers]
+            [w.join() for w in workers]
+            return [r for output in outputs for r in output]
+        def check(address):
+            try:
+                access.forward(fn='info', input={'address': address})
+                return True
+            except AssertionError:
+                return False
+        results = []
+        inputs = [callers[i % addresses] for i in range(n)]
+        for mode in ['limiter', 'access']:
+            access.limiter.slots.clear()
+            t0 = c.time()
+            if mode == 'limiter':
+                allowed = run(lambda a: access.limiter.allow((a, 'info'), rate), inputs)
+            else:
+                allowed = run(check, inputs)
+            seconds = c.time() - t0
+            results.append({'mode': mode, 'threads': threads, 'n': n, 'checks_per_sec': int(n / seconds), 'allowed': sum(allowed)})
+        access.limiter.slots.clear()
+        allowed = run(check, [callers[0]] * (threads * 100))
+        results.append({'mode': 'one_address', 'threads': threads, 'n': threads * 100, 'checks_per_sec': None, 'allowed': sum(allowed)})
+        assert sum(allowed) == rate, f'{sum(allowed)} calls were let through, expected {rate}'
+        c.print(c.df(results))
+        return results
+
+    @staticmethod
+    def echo_app(port:int, mode:str = 'asgi', max_bytes:int = 10 * 2**20):
+        """
+        a minimal app behind the old (base, BaseHTTPMiddleware) or the new (asgi) middleware
+        """
+        import uvicorn
+        from fastapi import FastAPI, Request
+        from fastapi.responses import JSONResponse
+        app = FastAPI()
+        if mode == 'base':
+            # the middleware before the change (a BaseHTTPMiddleware), the body is read here and again by the route
+            @app.middleware('http')
+            async def base(request, call_next):
+                content_length = request.headers.get('content-length')
+                if content_length and int(content_length) > max_bytes:
+                    return JSONResponse(status_code=413, content={"error": "Request too large"})
+                body = await request.body()
+                if len(body) > max_bytes:
+                    return JSONResponse(status_code=413, content={"error": "Request too large"})
+                return await call_next(request)
+        else:
+            app.add_middleware(c.module('server.middleware'), max_bytes=max_bytes)
+        @app.post('/echo')
+        async def echo(request: Request):
+            body = getattr(request.state, 'body', None)
+            if body == None:
+                body = await request.body()
+            return {'size': len(body)}
+        uvicorn.run(app, host='127.0.0.1', port=port, log_level='error')
+
+    def middleware(self, sizes = {'1KB': [2**10, 2000], '5MB': [5 * 2**20, 50]}, modes = ['base', 'asgi'], concurrency:int = 16, max_bytes:int = 10 * 2**20):
+        """
+        requests/sec through uvicorn with the old and the new ServerMiddleware for each size, [bytes, requests]
+        """
+        import multiprocessing as mp
+        import aiohttp
+        import asyncio
+        async def post(session, url, data):
+            async with session.post(url, data=data) as response:
+                return response.status, await response.json()
+        async def run(url, data, n):
+            semaphore = asyncio.Semaphore(concurrency)
+            async with aiohttp.ClientSession() as session:
+                async def job():
+                    async with semaphore:
+                        return await post(session, url, data)
+                return await asyncio.gather(*[job() for _ in range(n)])
+        async def wait(url):
+            async with aiohttp.ClientSession() as session:
+                for _ in range(100):
+                    try:
+                        return await post(session, url, b'')
+                    except aiohttp.ClientError:
+                        await asyncio.sleep(0.1)
+        loop = asyncio.new_event_loop()
+        results = []
+        for mode in modes:
+            port = c.free_port()
+            url = f'http://127.0.0.1:{port}/echo'
+            process = mp.Process(target=self.echo_app, args=(port, mode, max_bytes), daemon=True)
+            process.start()
+            try:
+                loop.run_until_complete(wait(url))
+                for size_name, (size, n) in sizes.items():
+                    data = os.urandom(size)
+                    t0 = c.time()
+                    responses = loop.run_until_complete(run(url, data, n))
+                    seconds = c.time() - t0
+                    assert all([s == 200 and r['size'] == size for s, r in responses]), responses[:1]
+                    results.append({'mode': mode, 'size': size_name, 'n': n, 'requests_per_sec': round(n / seconds, 1), 'mb_per_sec': round(n * size / seconds / 2**20, 1)})
+                [(status, _)] = loop.run_until_complete(run(url, b'0' * (max_bytes + 1), 1))
+                assert status == 413, f'{mode} let an oversized request through'
+            finally:
+                process.terminate()
+                process.join()
+        loop.close()
+        c.print(c.df(results))
+        return results
+
+    def items(self, n:int = 1000):
+        for i in range(n):
+            yield f'token{i}'
+
+    def chunks(self, n:int = 10, size:int = 10 * 2**20):
+        chunk = os.urandom(size)
+        for i in range(n):
+            yield chunk
+
+    @classmethod
+    def stream_server(cls, port:int, name:str):
+        c.module('server')(module=cls(), name=name, port=port, network='local')
+
+    def stream(self, tests = {'items': {'n': 1_000_000}, 'chunks': {'n': 100, 'size': 10 * 2**20}}, wire_formats = ['json', 'msgpack'], timeout:int = 600):
+        """
+        items/sec of a generator streamed from a server, as server sent events (json, the old path) 
+        and as framed msgpack (msgpack), for small items and for large bytes chunks
+        """
+        import multiprocessing as mp
+        name, port = 'server.bench.stream', c.free_port()
+        process = mp.Process(target=self.stream_server, args=(port, name), daemon=True)
+        process.start()
+        results = []
+        try:
+            client = c.module('client')(module=f'0.0.0.0:{port}')
+            for _ in range(100):
+                if client.check_response(client.forward(fn='info')):
+                    break
+                c.sleep(0.1)
+            for fn, kwargs in tests.items():
+                for wire_format in wire_formats:
+                    client.wire_format = wire_format
+                    t0 = c.time()
+                    count, nbytes = 0, 0
+                    try:
+                        for item in client.forward(fn=fn, kwargs=kwargs, timeout=timeout):
+                            count += 1
+                            nbytes += len(item)
+                        assert count == kwargs['n'], f'streamed {count}/{kwargs["n"]} items'
+                        error = None
+                    except Exception as e:
+                        error = str(e)[:64] # server sent events cannot carry bytes
+                    seconds = c.time() - t0
+                    results.append({'fn': fn, 'wire_format': wire_format, 'n': count, 'seconds': round(seconds, 3), 'items_per_sec': int(count / seconds), 'mb_per_sec': round(nbytes / seconds / 2**20, 1), 'error': error})
+        finally:
+            process.terminate()
+            process.join()
+            c.deregister_server(name, network='local')
+        c.print(c.df(results))
+        return results
+
+    @staticmethod
+    def info_server(port:int, name:str, n:int = 500):
+        # a module with n endpoints
+        def make_fn(i):
+            def fn(self, x:int = 1, y:str = 'y') -> int:
+                """returns x"""
+                return x
+            fn.__name__ = f'fn{i}'
+            return c.endpoint()(fn)
+        Wide = type('Wide', (c.Module,), {f'fn{i}': make_fn(i) for i in range(n)})
+        c.module('server')(module=Wide(), name=name, port=port, network='local')
+
+    def info_throughput(self, n:int = 2000, fns:int = 500, concurrency:int = 32, wire_formats = ['json', 'msgpack']):
+        """
+        /info requests/sec of a module with fns endpoints
+        """
+        import multiprocessing as mp
+        import asyncio
+        name, port = 'server.bench.info', c.free_port()
+        process = mp.Process(target=self.info_server, args=(port, name, fns), daemon=True)
+        process.start()
+        results = []
+        try:
+            client = c.module('client')(module=f'0.0.0.0:{port}')
+            for _ in range(200):
+                if client.check_response(client.forward(fn='info')):
+                    break
+                c.sleep(0.1)
+            async def run():
+                semaphore = asyncio.Semaphore(concurrency)
+                async def call():
+                    async with semaphore:
+                        return await client.async_forward(fn='info')
+                return await asyncio.gather(*[call() for _ in range(n)])
+            for wire_format in wire_formats:
+                client.wire_format = wire_format
+                t0 = c.time()
+                infos = client.loop.run_until_complete(run())
+                seconds = c.time() - t0
+                assert all([len(info['schema']) == fns for info in infos]), [info for info in infos if 'schema' not in info][:1]
+                results.append({'wire_format': wire_format, 'fns': fns, 'n': n, 'requests_per_sec': round(n / seconds, 1)})
+        finally:
+            process.terminate()
+            process.join()
+            c.deregister_server(name, network='local')
+        c.print(c.df(results))
+        return results
@@ -1,53 +1,248 @@
-
 import commune as c
 from typing import *
 import pandas as pd
+import numpy as np
+import threading
+import msgpack
+import random
+import queue
+import os
 
 class History(c.Module):
-    def __init__(self, history_path='history', **kwargs):
+    """
+    Request history as an append-only log. add_history only enqueues the item (dropped when the buffer is full),
+    a writer thread appends the items in batches to msgpack segments (history_path/<start>.log, rotated every
+    segment_bytes) and keeps per minute rollups of (fn, address): count, error rate, p50/p95 latency.
+    history() reads the rollups instead of the raw events. close() flushes the buffer and stops the writer.
+    """
+
+    def __init__(self,
+                 history_path:str = 'history',
+                 buffer_size:int = 100_000, # max items waiting for the writer
+                 segment_bytes:int = 64 * 2**20, # bytes per segment before rotating
+                 max_segments:int = 100, # the oldest segments are removed after this many
+                 max_samples:int = 512, # latency samples per rollup (reservoir)
+                 max_rollups:int = 100_000, # closed rollups kept in memory
+                 flush_interval:float = 1, # seconds between writes of a partial batch
+                 **kwargs):
+        self.buffer = queue.Queue(maxsize=buffer_size)
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.max_samples = max_samples
+        self.max_rollups = max_rollups
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.lock = threading.Lock()
         self.set_history_path(history_path)
-    # HISTORY 
-    def add_history(self, item:dict):    
-        path = self.history_path + '/' + item['address'] + '/'+  str(item['timestamp']) 
-        self.put(path, item)
+        self.stopped = threading.Event()
+        self.writer_thread = c.thread(self.writer, daemon=True)
+
+    def close(self, timeout:float = 10):
+        """
+        stops the writer once the buffer is written
+        """
+        self.stopped.set()
+        self.writer_thread.join(timeout=timeout)
+        return {'success': not self.writer_thread.is_alive(), 'msg': f'closed the history at {self.history_dir}'}
+
+    # HISTORY
+    def add_history(self, item:dict) -> bool:
+        """
+        queues the item ({fn, address, timestamp, latency, success | error, ...}) for the writer
+        """
+        try:
+            self.buffer.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
 
     def set_history_path(self, history_path):
         assert history_path is not None, f"History path is not set"
-        self.history_path = history_path
+        with self.lock:
+            self.history_path = history_path
+            self.history_dir = self.resolve_path(history_path)
+            os.makedirs(self.history_dir, exist_ok=True)
+            self.rollups_path = os.path.join(self.history_dir, 'rollups.log')
+            self.open_rollups = {} # (minute, fn, address) -> {count, errors, samples}
+            self.closed_rollups = self.read_log(self.rollups_path)[-self.max_rollups:]
+            self.segment = None
         return {'history_path': self.history_path}
 
-    def rm_history(self, server):
-        dirpath  = f'{self.history_path}/{server}'
-        return c.rm(dirpath)
-    
+    def rm_history(self, server=None):
+        """
+        removes the history of the server (the address of the caller), or all of it if None
+        """
+        with self.lock:
+            if server == None:
+                for path in self.history_paths(history_path=self.history_path, n=None) + [self.rollups_path]:
+                    if os.path.exists(path):
+                        os.remove(path)
+                self.open_rollups, self.closed_rollups, self.segment = {}, [], None
+                return {'success': True, 'msg': f'removed the history at {self.history_dir}'}
+            # the segments are append-only, so the ones with events of the server are rewritten without them
+            for path in self.history_paths(history_path=self.history_path, n=None) + [self.rollups_path]:
+                items = self.read_log(path)
+                kept = [item for item in items if item.get('address', None) != server]
+                if len(kept) < len(items):
+                    with open(path + '.tmp', 'wb') as f:
+                        f.write(b''.join([msgpack.packb(item, default=str) for item in kept]))
+                    os.replace(path + '.tmp', path)
+            self.open_rollups = {k: v for k, v in self.open_rollups.items() if k[2] != server}
+            self.closed_rollups = [r for r in self.closed_rollups if r['address'] != server]
+        return {'success': True, 'msg': f'removed the history of {server} at {self.history_dir}'}
+
     @classmethod
-    def history_paths(cls, server=None, history_path='history', n=100, key=None):
-        if server == None:
-            dirpath  = f'{history_path}'
-            paths =  cls.glob(dirpath)
-        else:
-            
-            dirpath  = f'{history_path}/{server}'
-            paths =  cls.ls(dirpath)
-        paths = sorted(paths, reverse=True)[:n]
-        return paths
-
-    def history(self, 
-                key=None, 
-                history_path='history',
-                features=[ 'module', 'fn', 'seconds_ago', 'latency', 'address'], 
+    def history_paths(cls, server=None, history_path='history', n=100, key=None) -> List[str]:
+        """
+        the segments, newest first, only the ones with events of the server (or of the address of key) if given
+        """
+        history_dir = cls.resolve_path(history_path)
+        if not os.path.exists(history_dir):
+            return []
+        paths = [os.path.join(history_dir, f) for f in os.listdir(history_dir) if f.endswith('.log') and f != 'rollups.log']
+        paths = sorted(paths, key=lambda p: float(os.path.basename(p)[:-len('.log')]), reverse=True)
+        if key != None:
+            server = c.get_key(key).ss58_address
+        if server != None:
+            paths = [p for p in paths if any([e.get('address', None) == server for e in cls.read_log(p)])]
+        return paths if n == None else paths[:n]
+
+    @staticmethod
+    def read_log(path:str) -> List[dict]:
+        if not os.path.exists(path):
+            return []
+        with open(path, 'rb') as f:
+            return list(msgpack.Unpacker(f, raw=False))
+
+    def writer(self):
+        while not (self.stopped.is_set() and self.buffer.empty()):
+            items = []
+            try:
+                items.append(self.buffer.get(timeout=self.flush_interval))
+                while len(items) < 10_000:
+                    items.append(self.buffer.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                self.write(items)
+            except Exception as e:
+                c.print(c.detailed_error(e), color='red')
+
+    def write(self, items:List[dict]):
+        with self.lock:
+            if len(items) > 0:
+                if self.segment == None or os.path.getsize(self.segment) > self.segment_bytes:
+                    self.segment = os.path.join(self.history_dir, f'{c.time()}.log')
+                    for path in self.history_paths(history_path=self.history_path, n=None)[self.max_segments:]:
+                        os.remove(path)
+                with open(self.segment, 'ab') as f:
+                    f.write(b''.join([msgpack.packb(item, default=str) for item in items]))
+                for item in items:
+                    self.add_rollup(item)
+            self.close_rollups()
+
+    def add_rollup(self, item:dict):
+        key = (int(item.get('timestamp', c.time()) // 60) * 60, item.get('fn', None), item.get('address', None))
+        rollup = self.open_rollups.get(key, None)
+        if rollup == None:
+            rollup = self.open_rollups[key] = {'count': 0, 'errors': 0, 'samples': []}
+        rollup['count'] += 1
+        rollup['errors'] += int(item.get('success', True) == False or 'error' in item)
+        latency = item.get('latency', None)
+        if latency != None:
+            # reservoir sampling keeps the percentiles of a busy minute at a fixed cost
+            if len(rollup['samples']) < self.max_samples:
+                rollup['samples'].append(latency)
+            else:
+                i = random.randrange(rollup['count'])
+                if i < self.max_samples:
+                    rollup['samples'][i] = latency
+
+    @staticmethod
+    def summarize(key:tuple, rollup:dict) -> dict:
+        samples = rollup['samples']
+        return {'minute': key[0],
+                'fn': key[1],
+                'address': key[2],
+                'count': rollup['count'],
+                'error_rate': rollup['errors'] / rollup['count'],
+                'p50': float(np.percentile(samples, 50)) if len(samples) > 0 else None,
+                'p95': float(np.percentile(samples, 95)) if len(samples) > 0 else None}
+
+    def close_rollups(self):
+        # the minutes that ended are summarized and appended to the rollups log
+        minute = int(c.time() // 60) * 60
+        keys = [k for k in self.open_rollups if k[0] < minute]
+        if len(keys) == 0:
+            return
+        rollups = [self.summarize(k, self.open_rollups.pop(k)) for k in sorted(keys, key=lambda k: k[0])]
+        with open(self.rollups_path, 'ab') as f:
+            f.write(b''.join([msgpack.packb(r) for r in rollups]))
+        self.closed_rollups = (self.closed_rollups + rollups)[-self.max_rollups:]
+
+    def rollups(self, minutes:int = 60, fn:str = None, address:str = None) -> List[dict]:
+        """
+        the rollups of the last minutes, including the minute in progress
+        """
+        start = c.time() - minutes * 60
+        with self.lock:
+            rollups = self.closed_rollups + [self.summarize(k, r) for k, r in self.open_rollups.items()]
+        return [r for r in rollups if r['minute'] >= start - 60 and (fn == None or r['fn'] == fn) and (address == None or r['address'] == address)]
+
+    def history(self,
+                key=None,
+                history_path=None,
+                features=['minute', 'fn', 'address', 'count', 'error_rate', 'p50', 'p95'],
                 to_list=False,
+                minutes:int = 60,
+                fn:str = None,
                 **kwargs
                 ):
-        key = c.get_key(key)
-        history_path = self.history_paths(key=key, history_path=history_path)
-        df =  c.df([self.get(path) for path in history_path])
-        now = c.timestamp()
-        df['seconds_ago'] = df['timestamp'].apply(lambda x: now - x)
-        df = df[features]
+        """
+        the per minute rollups of the requests of the address of key (all addresses if None)
+        """
+        if history_path != None and history_path != self.history_path:
+            self.set_history_path(history_path)
+        address = c.get_key(key).ss58_address if key != None else None
+        rollups = self.rollups(minutes=minutes, fn=fn, address=address)
         if to_list:
-            return df.to_dict('records')
+            return [{k: r[k] for k in features} for r in rollups]
+        return pd.DataFrame(rollups, columns=features)
+
+    def events(self, n:int = 100, address:str = None) -> List[dict]:
+        """
+        the last n raw events (from the newest segments), only for debugging
+        """
+        events = []
+        for path in self.history_paths(history_path=self.history_path, n=None):
+            segment_events = [e for e in self.read_log(path) if address == None or e.get('address') == address]
+            events = segment_events + events
+            if len(events) >= n:
+                break
+        return events[-n:]
 
-        return df
-    
-    
\ No newline at end of file
+    @classmethod
+    def test(cls, n:int = 1000):
+        self = cls(history_path='history_test', flush_interval=0.1)
+        self.rm_history()
+        now = c.time()
+        for i in range(n):
+            self.add_history({'fn': 'info', 'address': 'a', 'timestamp': now - 60, 'latency': i / n, 'success': i % 10 != 0})
+        self.add_history({'fn': 'info', 'address': 'b', 'timestamp': now, 'latency': 1})
+        while self.buffer.qsize() > 0 or len(self.events(n=n + 1)) < n + 1:
+            c.sleep(0.1)
+        c.sleep(0.2)
+        rollups = {r['address']: r for r in self.history(to_list=True)}
+        assert rollups['a']['count'] == n and rollups['a']['error_rate'] == 0.1, rollups
+        assert abs(rollups['a']['p50'] - 0.5) < 0.1 and rollups['b']['count'] == 1
+        assert len(cls.read_log(self.rollups_path)) >= 1 # the minute of a is closed
+        assert cls.history_paths(server='b', history_path='history_test') == cls.history_paths(history_path='history_test')
+        self.rm_history('b')
+        assert [e['address'] for e in self.events(n=n + 1)] == ['a'] * n
+        assert set([r['address'] for r in self.history(to_list=True)]) == {'a'}
+        self.rm_history()
+        self.add_history({'fn': 'info', 'address': 'c', 'timestamp': now, 'latency': 1})
+        assert self.close()['success'] and len(self.events()) == 1 # the buffer is written before the writer stops
+        self.rm_history()
+        return {'success': True, 'msg': 'history test passed'}
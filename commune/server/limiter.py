@@ -0,0 +1,65 @@
+import commune as c
+from typing import *
+from collections import OrderedDict
+import threading
+
+
+class Limiter(c.Module):
+    """
+    Thread safe rate limiter (GCRA, a token bucket kept as one float) keyed by (address, fn).
+    Each slot is the theoretical arrival time of the next call, a caller can burst up to its rate
+    and then gets rate calls per period. Idle slots are evicted least recently used first,
+    which loses nothing once their arrival time has passed.
+    """
+
+    def __init__(self,
+                 period:float = 60, # seconds the rate is per
+                 max_slots:int = 100_000, # max (address, fn) slots in memory
+                 ):
+        self.period = period
+        self.max_slots = max_slots
+        self.slots = OrderedDict() # (address, fn) -> theoretical arrival time
+        self.lock = threading.Lock()
+
+    def allow(self, key:tuple, rate:float, now:float = None) -> bool:
+        """
+        takes a call of the key if it is within rate calls per period
+        """
+        if rate <= 0:
+            return False
+        now = c.time() if now == None else now
+        interval = self.period / rate
+        with self.lock:
+            tat = max(self.slots.get(key, now), now) + interval
+            if tat - now > self.period:
+                return False
+            self.slots[key] = tat
+            self.slots.move_to_end(key)
+            if len(self.slots) > self.max_slots:
+                self.slots.popitem(last=False)
+        return True
+
+    def remaining(self, key:tuple, rate:float, now:float = None) -> int:
+        """
+        the calls the key can make right now
+        """
+        now = c.time() if now == None else now
+        tat = max(self.slots.get(key, now), now)
+        return max(int((self.period - (tat - now)) * rate / self.period), 0)
+
+    def __len__(self):
+        return len(self.slots)
+
+    @classmethod
+    def test(cls):
+        self = cls(period=60, max_slots=2)
+        assert all([self.allow(('a', 'info'), rate=3, now=0) for _ in range(3)])
+        assert not self.allow(('a', 'info'), rate=3, now=0)
+        assert self.allow(('a', 'info'), rate=3, now=20) # one call back every 20 seconds
+        assert not self.allow(('a', 'info'), rate=3, now=21)
+        assert self.remaining(('b', 'info'), rate=3, now=0) == 3
+        assert not self.allow(('b', 'info'), rate=0)
+        self.allow(('b', 'info'), rate=3, now=0)
+        self.allow(('c', 'info'), rate=3, now=0)
+        assert len(self) == 2 and ('a', 'info') not in self.slots
+        return {'success': True, 'msg': 'limiter test passed'}
@@ -1,21 +1,51 @@
-from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
 
-class ServerMiddleware(BaseHTTPMiddleware):
+class ServerMiddleware:
+    """
+    Pure ASGI middleware that enforces max_bytes while the body arrives (413 on the content-length header
+    or as soon as the count passes max_bytes) and hands the buffered body to the route as request.state.body,
+    so it is read once. Responses go straight through, so streaming is untouched.
+    """
     def __init__(self, app, max_bytes: int):
-        super().__init__(app)
+        self.app = app
         self.max_bytes = max_bytes
 
-    async def dispatch(self, request: Request, call_next):
-        content_length = request.headers.get('content-length')
-        if content_length:
-            if int(content_length) > self.max_bytes:
-                return JSONResponse(status_code=413, content={"error": "Request too large"})
-        
-        body = await request.body()
-        if len(body) > self.max_bytes:
-            return JSONResponse(status_code=413, content={"error": "Request too large"})
-        
-        response = await call_next(request)
-        return response
\ No newline at end of file
+    async def too_large(self, scope, receive, send):
+        response = JSONResponse(status_code=413, content={"error": "Request too large"})
+        await response(scope, receive, send)
+
+    async def bad_length(self, scope, receive, send):
+        response = JSONResponse(status_code=400, content={"error": "Invalid content-length"})
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        for name, value in scope['headers']:
+            if name == b'content-length':
+                if not value.strip().isdigit():
+                    return await self.bad_length(scope, receive, send) # non numeric or negative
+                if int(value) > self.max_bytes:
+                    return await self.too_large(scope, receive, send)
+        chunks, size, more_body = [], 0, True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > self.max_bytes:
+                return await self.too_large(scope, receive, send)
+            chunks.append(chunk)
+            more_body = message.get('more_body', False)
+        body = chunks[0] if len(chunks) == 1 else b''.join(chunks)
+        scope.setdefault('state', {})['body'] = body
+        replayed = False
+        async def replay():
+            # the body once for anything that still reads the request, then the messages of the connection
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            return await receive()
+        await self.app(scope, replay, send)
@@ -1,5 +1,8 @@
 import commune as c
 from typing import *
+from contextlib import contextmanager
+import asyncio
+import json
 import os
 
 # THIS IS WHAT THE INTERNET IS, A BUNCH OF NAMESPACES, AND A BUNCH OF SERVERS, AND A BUNCH OF MODULES.
@@ -10,6 +13,78 @@ class Namespace(c.Module):
 
     # the default
     network : str = 'local'
+    network2state = {} # network -> the namespace file parsed and indexed, invalidated when the file changes
+    max_searches = 1000 # max cached search results per network
+
+    @classmethod
+    def namespace_path(cls, network:str) -> str:
+        return cls.resolve_path(network, extension='json')
+
+    @staticmethod
+    def file_version(path:str):
+        # an atomic rename changes the inode, so this catches writes within the same mtime tick
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    @classmethod
+    def namespace_version(cls, network:str):
+        """
+        the version of the stored namespace (None if there is none), the stored text in the kv storage mode
+        and the version of the json file otherwise
+        """
+        if cls.storage_mode == 'kv':
+            text = cls.kv().raw(cls.kv_key(network))
+            return None if text == None else ('kv', text)
+        return cls.file_version(cls.namespace_path(network))
+
+    @classmethod
+    def set_namespace_state(cls, network:str, namespace:dict, timestamp:int = None, version = None) -> dict:
+        namespace = {k:v for k,v in namespace.items() if 'Error' not in k}
+        if network == 'local':
+            namespace = {k: '0.0.0.0:' + v.split(':')[-1] for k,v in namespace.items() }
+        namespace = dict(sorted(namespace.items(), key=lambda x: x[0]))
+        state = {'version': version, 
+                 'timestamp': timestamp or 0,
+                 'namespace': namespace, 
+                 'address2name': {v:k for k,v in namespace.items()},
+                 'names': list(namespace.keys()), # sorted, for prefix search
+                 'search2namespace': {}}
+        cls.network2state[network] = state
+        return state
+
+    @classmethod
+    def namespace_state(cls, network:str = 'local') -> dict:
+        """
+        Returns the cached namespace of the network, reloading it only if the stored namespace changed
+        """
+        version = cls.namespace_version(network)
+        state = cls.network2state.get(network, None)
+        if state == None or state['version'] != version:
+            data = cls.get(network, {}, full=True) if version != None else {}
+            data = data if isinstance(data, dict) else {}
+            namespace = data['data'] if 'data' in data else data
+            state = cls.set_namespace_state(network, namespace or {}, timestamp=data.get('timestamp', 0), version=version)
+        return state
+
+    @classmethod
+    def search_namespace(cls, search:str, network:str = 'local', prefix_match:bool = False) -> dict:
+        state = cls.namespace_state(network)
+        namespace = state['namespace']
+        if prefix_match:
+            import bisect
+            names = state['names']
+            start = bisect.bisect_left(names, search)
+            end = bisect.bisect_left(names, search + chr(0x10ffff))
+            return {k: namespace[k] for k in names[start:end]}
+        search2namespace = state['search2namespace']
+        if search not in search2namespace:
+            if len(search2namespace) >= cls.max_searches:
+                search2namespace.clear()
+            search2namespace[search] = {k:v for k,v in namespace.items() if search in k}
+        return dict(search2namespace[search])
 
     @classmethod
     def namespace(cls, search=None,
@@ -23,8 +98,16 @@ class Namespace(c.Module):
         if netuid != None:
             network = f'subspace.{netuid}'
 
-        namespace = cls.get(network, {}, max_age=max_age)
-        if 'subspace' in network:
+        if 'subspace' not in network:
+            if network == 'local' and update:
+                cls.build_namespace(network=network)  
+            state = cls.namespace_state(network)
+            if max_age != None and (c.time() - state['timestamp']) > max_age:
+                return {}
+            if search != None:
+                return cls.search_namespace(search, network=network)
+            return dict(state['namespace'])
+        else:
             if '.' in network:
                 network, netuid = network.split('.')
             else: 
@@ -35,43 +118,80 @@ class Namespace(c.Module):
                                                  update=update, 
                                                  netuid=netuid,
                                                  **kwargs)
-        elif network == 'local':
-            if update:
-                namespace = cls.build_namespace(network=network)  
 
-   
         namespace = {k:v for k,v in namespace.items() if 'Error' not in k} 
         if search != None:
             namespace = {k:v for k,v in namespace.items() if search in k}
-        
-        if network == 'local':
-            namespace = {k: '0.0.0.0:' + v.split(':')[-1] for k,v in namespace.items() }
-        
         namespace = dict(sorted(namespace.items(), key=lambda x: x[0]))
 
         return namespace
     
     get_namespace = namespace
 
+    @classmethod
+    @contextmanager
+    def namespace_lock(cls, network:str):
+        """
+        Exclusive lock on the namespace across processes (e.g. servers starting at the same time),
+        a lock file next to the json file in both storage modes
+        """
+        import fcntl
+        path = cls.namespace_path(network) + '.lock'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield path
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @classmethod
+    def write_namespace(cls, network:str, namespace:dict) -> dict:
+        """
+        Writes the namespace through the storage, in the json mode to a temporary file that is renamed 
+        over the old one, so readers never see a partial file (a kv write is atomic already)
+        """
+        address2name = {v: k for k, v in namespace.items()}
+        namespace = {v:k for k,v in address2name.items()}
+        if cls.storage_mode == 'kv':
+            path = cls.kv_key(network)
+            timestamp = cls.put(network, namespace)['timestamp']
+        else:
+            path = cls.namespace_path(network)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            timestamp = c.timestamp()
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'data': namespace, 'encrypted': False, 'timestamp': timestamp}, f)
+            os.replace(tmp_path, path)
+        cls.set_namespace_state(network, namespace, timestamp=timestamp, version=cls.namespace_version(network))
+        return {'k': network, 'path': path, 'timestamp': timestamp}
+
+    @classmethod
+    def update_namespace(cls, network:str = network, add:dict = None, rm:list = None) -> dict:
+        """
+        Applies a batch of registrations (add) and removals (rm) in one locked read-modify-write
+        """
+        with cls.namespace_lock(network):
+            namespace = dict(cls.namespace_state(network)['namespace'])
+            namespace.update(add or {})
+            for name in (rm or []):
+                namespace.pop(name, None)
+            cls.write_namespace(network, namespace)
+        return namespace
+
     @classmethod
     def register_server(cls, name:str, address:str, network=network) -> None:
-        namespace = cls.namespace(network=network)
-        namespace[name] = address
-        cls.put_namespace(network, namespace)
+        cls.update_namespace(network, add={name: address})
         return {'success': True, 'msg': f'Block {name} registered to {network}.'}
     
     
     @classmethod
     def deregister_server(cls, name:str, network=network) -> Dict:
-
-        namespace = cls.namespace(network=network)
-        address2name = {v: k for k, v in namespace.items()}
-        if name in address2name:
-            name = address2name[name]
-        
-        if name in namespace:
-            del namespace[name]
-            cls.put_namespace(network, namespace)
+        state = cls.namespace_state(network)
+        name = state['address2name'].get(name, name)
+        if name in state['namespace']:
+            cls.update_namespace(network, rm=[name])
             return {'status': 'success', 'msg': f'Block {name} deregistered.'}
         else:
             return {'success': False, 'msg': f'Block {name} not found.'}
@@ -82,8 +202,10 @@ class Namespace(c.Module):
     
     @classmethod
     def get_address(cls, name:str, network:str=network, external:bool = True) -> dict:
-        namespace = cls.namespace(network=network)
-        address = namespace.get(name, None)
+        if 'subspace' in str(network):
+            address = cls.namespace(network=network).get(name, None)
+        else:
+            address = cls.namespace_state(network or 'local')['namespace'].get(name, None)
         if external and address != None:
             address = address.replace(c.default_ip, c.ip()) 
         return address
@@ -91,10 +213,9 @@ class Namespace(c.Module):
     
     @classmethod
     def put_namespace(cls, network:str, namespace:dict) -> None:
-        address2name = {v: k for k, v in namespace.items()}
-        namespace = {v:k for k,v in address2name.items()}
         assert isinstance(namespace, dict), 'Namespace must be a dict.'
-        return cls.put(network, namespace)        
+        with cls.namespace_lock(network):
+            return cls.write_namespace(network, namespace)
     
     add_namespace = put_namespace
     
@@ -108,8 +229,7 @@ class Namespace(c.Module):
             return {'success': False, 'msg': f'Namespace {network} not found.'}
     @classmethod
     def name2address(cls, name:str, network:str=network ):
-        namespace = cls.namespace(network=network)
-        address =  namespace.get(name, None)
+        address = cls.get_address(name, network=network, external=False)
         ip = c.ip()
     
         address = address.replace(c.default_ip, ip)
@@ -118,18 +238,15 @@ class Namespace(c.Module):
     
     @classmethod
     def address2name(cls, name:str, network:str=network ):
-        namespace = cls.namespace(network=network)
-        address2name = {v: k for k, v in namespace.items()}
-        return address2name
+        return dict(cls.namespace_state(network)['address2name'])
     
     @classmethod
     def networks(cls) -> dict:
-        return [p.split('/')[-1].split('.')[0] for p in cls.ls()]
+        return [p.split('/')[-1].split('.')[0] for p in cls.ls() if p.endswith('.json')]
     
     @classmethod
     def namespace_exists(cls, network:str) -> bool:
-        path = cls.resolve_path( network, extension='json')
-        return os.path.exists(path)
+        return cls.namespace_version(network) != None
 
     @classmethod
     def modules(cls, network:List=network) -> List[str]:
@@ -157,35 +274,91 @@ class Namespace(c.Module):
         return {'success': True, 'msg': 'Servers checked.'}
     
 
+    @classmethod
+    async def async_probe_port(cls, port:int, ip:str = '0.0.0.0', timeout:float = 1, fn:str = 'server_name', key = None, serializer = None, session = None) -> tuple:
+        """
+        Connects to the port and, if it is open, posts the signed {fn} request to it
+        returns (used, result) where result is None if the port is not a server
+        """
+        import aiohttp
+        sock = await c.async_connect(port, ip=ip, timeout=timeout)
+        if sock == None:
+            return False, None
+        sock.close()
+        close_session = session == None
+        session = session or aiohttp.ClientSession()
+        try:
+            key = c.get_key(key)
+            serializer = serializer or c.module('serializer')()
+            body = key.sign(serializer.serialize({'args': [], 'kwargs': {}, 'timestamp': c.timestamp()}), return_json=True)
+            async with session.post(f'http://{ip}:{port}/{fn}', json=body, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                if response.status != 200:
+                    return True, None
+                result = serializer.deserialize(await response.json(content_type=None))
+            return True, (None if isinstance(result, dict) and 'error' in result else result)
+        except Exception as e:
+            return True, None
+        finally:
+            if close_session:
+                await session.close()
+
+    last_port_scan = {} # the last scan of build_namespace, {port: name or None}
+
+    @classmethod
+    async def async_scan_ports(cls, 
+                               ports:List[int], 
+                               ip:str = '0.0.0.0', 
+                               timeout:float = 2, 
+                               max_concurrency:int = 256, 
+                               incremental:bool = False,
+                               key = None) -> dict:
+        """
+        Returns {port: server_name} of the servers on the ports
+        incremental: only probe the ports that came alive since the last scan and keep the names of the rest
+        """
+        key = c.get_key(key)
+        serializer = c.module('serializer')()
+        port2name = {}
+        if incremental:
+            used_ports = await c.async_used_ports(ports, ip=ip, timeout=timeout, max_concurrency=max_concurrency)
+            port2name = {p: cls.last_port_scan[p] for p in used_ports if cls.last_port_scan.get(p, None) != None}
+            ports = [p for p in used_ports if p not in port2name]
+        import aiohttp
+        semaphore = asyncio.Semaphore(max_concurrency)
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=max_concurrency, force_close=True)) as session:
+            async def probe(port):
+                async with semaphore:
+                    return await cls.async_probe_port(port, ip=ip, timeout=timeout, key=key, serializer=serializer, session=session)
+            results = await asyncio.gather(*[probe(p) for p in ports])
+        for port, (used, name) in zip(ports, results):
+            if used:
+                port2name[port] = name
+        cls.last_port_scan = port2name
+        return port2name
+
     @classmethod
     def build_namespace(cls,
-                        timeout:int = 10,
+                        timeout:int = 2,
                         network:str = 'local', 
+                        port_range:List[int] = None,
+                        max_concurrency:int = 256,
+                        incremental:bool = False,
                         verbose=True)-> dict:
         '''
         The module port is where modules can connect with each othe.
         When a module is served "module.serve())"
         it will register itself with the namespace_local dictionary.
         '''
+        ports = list(range(*c.resolve_port_range(port_range)))
+        port2name = c.gather(cls.async_scan_ports(ports, timeout=timeout, max_concurrency=max_concurrency, incremental=incremental), timeout=None)
         namespace = {}
-        addresses = ['0.0.0.0'+':'+str(p) for p in c.used_ports()]
-        future2address = {}
-        print(addresses)
-        for address in addresses:
-            f = c.submit(c.call, [address+'/server_name'], timeout=timeout)
-            future2address[f] = address
-        futures = list(future2address.keys())
-        try:
-            for f in c.as_completed(futures, timeout=timeout):
-                address = future2address[f]
-                try:
-                    name = f.result()
-                    namespace[name] = address
-                    c.print(f'Updated {name} to {address}', color='green', verbose=verbose)
-                except Exception as e:
-                    c.print(f'Error {e} with {address}', color='red', verbose=verbose)
-        except Exception as e:
-            c.print(f'Timeout error {e}', color='red', verbose=verbose)
+        for port, name in port2name.items():
+            address = f'0.0.0.0:{port}'
+            if isinstance(name, str):
+                namespace[name] = address
+                c.print(f'Updated {name} to {address}', color='green', verbose=verbose)
+            else:
+                c.print(f'Error {name} with {address}', color='red', verbose=verbose)
 
         cls.put_namespace(network, namespace)
         
@@ -318,14 +491,15 @@ class Namespace(c.Module):
     all = network2namespace
     @classmethod
     def server_exists(cls, name:str, network:str = None,  prefix_match:bool=False, **kwargs) -> bool:
-        servers = cls.servers(network=network, **kwargs)
+        network = network or 'local'
+        if 'subspace' in network:
+            servers = cls.servers(network=network, **kwargs)
+            if prefix_match:
+                return any([s for s in servers if s.startswith(name)])
+            return bool(name in servers)
         if prefix_match:
-            server_exists =  any([s for s in servers if s.startswith(name)])
-            
-        else:
-            server_exists =  bool(name in servers)
-
-        return server_exists
+            return len(cls.search_namespace(name, network=network, prefix_match=True)) > 0
+        return bool(name in cls.namespace_state(network)['namespace'])
     
     @classmethod
     def test(cls):
@@ -345,26 +519,48 @@ class Namespace(c.Module):
         assert cls.namespace(network=network) == {'test': 'test'}, f'Namespace not restored. {cls.namespace(network=network)}'
         cls.deregister_server('test', network=network2)
         assert cls.namespace(network2) == {}
+        cls.put(network2, {'test2': 'test2'}) # written behind the back of the cache
+        assert cls.namespace(network=network2) == {'test2': 'test2'}, f'Namespace cache not invalidated. {cls.namespace(network=network2)}'
+        # the incremental scan reuses the names of the last scan, with a port in use that is not a server
+        import socket
+        port = c.free_port()
+        sock = socket.socket()
+        sock.bind(('0.0.0.0', port))
+        sock.listen()
+        try:
+            for _ in range(2):
+                namespace = cls.build_namespace(network=network, port_range=[port, port + 1], incremental=True, verbose=False)
+                assert cls.namespace(network=network) == namespace and port in cls.last_port_scan
+        finally:
+            sock.close()
+        assert callable(cls.port2name)
+        # a server that answers in chunks is still recognized
+        import threading
+        body = json.dumps(c.module('serializer')().serialize('chunked')).encode()
+        half = len(body) // 2
+        response = b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nTransfer-Encoding: chunked\r\n\r\n'
+        response += b''.join([b'%x\r\n' % len(chunk) + chunk + b'\r\n' for chunk in [body[:half], body[half:]]]) + b'0\r\n\r\n'
+        sock = socket.socket()
+        sock.bind(('0.0.0.0', port))
+        sock.listen()
+        def serve():
+            for _ in range(2): # the connect check, then the request
+                conn, _ = sock.accept()
+                if conn.recv(65536):
+                    conn.sendall(response)
+                conn.close()
+        threading.Thread(target=serve, daemon=True).start()
+        try:
+            assert c.gather(cls.async_probe_port(port), timeout=None) == (True, 'chunked')
+        finally:
+            sock.close()
         cls.rm_namespace(network)
         assert cls.namespace_exists(network) == False
         cls.rm_namespace(network2)
         assert cls.namespace_exists(network2) == False
         
         return {'success': True, 'msg': 'Namespace tests passed.'}
-    
-
-    
-    @classmethod
-    def server_exists(cls, name:str, network:str = None,  prefix_match:bool=False, **kwargs) -> bool:
-        servers = cls.servers(network=network, **kwargs)
-        if prefix_match:
-            server_exists =  any([s for s in servers if s.startswith(name)])
-            
-        else:
-            server_exists =  bool(name in servers)
 
-        return server_exists
-    
 
     @classmethod
     def clean(cls, network='local'):
@@ -1,14 +1,24 @@
 import commune as c
 import pandas as pd
 from typing import *
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import threading
+import asyncio
+import queue
+import json
+import os
 import uvicorn
 from .middleware import ServerMiddleware
 from sse_starlette.sse import EventSourceResponse
 
 
 class Server(c.Module):
+    blob_fns = ['info', 'metadata'] # served from a pre-serialized response while the info cache of the module holds
+
     def __init__(
         self,
         module: Union[c.Module, object] = None,
@@ -20,8 +30,18 @@ class Server(c.Module):
         max_request_staleness = 5,
         loop = None,
         max_bytes = 10 * 1024 * 1024,  # 1 MB limit
+        max_workers: int = None, # threads for verifying/deserializing requests and for each sync function
+        batch_bytes: int = 2**16, # bytes of small generator items packed into one stream frame
+        max_frames: int = 16, # frames of a stream waiting to be sent before the generator blocks
+        fn2max_workers: Dict[str, int] = None, # per function override of max_workers
         **kwargs
         ) -> 'Server':
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.fn2max_workers = fn2max_workers or {}
+        self.batch_bytes = batch_bytes
+        self.max_frames = max_frames
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='server')
+        self.fn2executor = {} # each function gets its own pool so slow functions cannot starve the others, callers share it fairly
         if  nest_asyncio:
             c.new_event_loop(nest_asyncio=nest_asyncio)
         self.loop = c.get_event_loop() if loop == None else loop
@@ -39,21 +59,29 @@ class Server(c.Module):
         module.network = network
         self.key  = c.get_key(key or module.name, create_if_not_exists=True)
         module.key = self.key 
+        module.clear_info_cache() # the whitelist, name and address changed
         self.module = module
         self.access_module = c.module('server.access')(module=self.module)
+        self.verifier = c.module('server.verifier')(max_age=max_request_staleness)
+        self.blobs = {} # (fn, wire_format) -> (the info cache of the module, the serialized response)
+        self.blob_fns = [fn for fn in self.blob_fns if getattr(type(module), fn, None) is getattr(c.Module, fn)] # not the overridden ones
+        self.module.info() # fills the info cache before the first request
         self.set_api(max_bytes=max_bytes)
 
     def add_fn(self, name:str, fn: str):
         assert callable(fn), 'fn not callable'
         setattr(self.module, name, fn)
+        self.module.clear_info_cache()
         return {'success':True, 'message':f'Added {name} to {self.name} module'}
 
     def get_input(self, fn:str, input:Dict):
         address = input.get('address', None)
-        assert c.verify(input), f"Data not signed with correct key {input}"
+        assert self.verifier.verify(input), f"Data not signed with correct key {input}"
+        signature = input['signature']
         input = self.serializer.deserialize(input['data']) 
         request_staleness = c.timestamp() - input.get('timestamp', 0) 
         assert  request_staleness < self.max_request_staleness, f"Request is too old, {request_staleness} > MAX_STALENESS ({self.max_request_staleness})  seconds old" 
+        assert self.verifier.check_replay(signature, input.get('timestamp', 0)), f"Request was already received (replay) from {address}"
         
         params = input.pop('params', None)
         if isinstance(params, dict):
@@ -69,32 +97,163 @@ class Server(c.Module):
         self.access_module.forward(fn=fn, input=input)
         return input
     
-    def get_output(self, fn:str, input:Dict):
-        print(self.module, fn)
-
+    def get_output(self, fn:str, input:Dict, wire_format:str = 'json'):
         fn_obj = getattr(self.module, fn)
         if callable(fn_obj):
             output = fn_obj(*input['args'], **input['kwargs'])
         else:
-
             output = fn_obj
-        if c.is_generator(output):
+        return self.process_output(output, wire_format=wire_format)
+
+    def process_output(self, output, wire_format:str = 'json'):
+        if c.is_generator(output) and wire_format == 'msgpack':
+            return StreamingResponse(self.stream_output(output), media_type=self.serializer.stream_content_type)
+        elif c.is_generator(output):
             def generator_wrapper(generator):
                 for item in generator:
                     yield self.serializer.serialize(item)
             return EventSourceResponse(generator_wrapper(output))
+        elif wire_format == 'msgpack':
+            return output # msgpack packs the buffers itself
         else:
             return self.serializer.serialize(output)
     
-    def forward(self, fn, input):
+    async def stream_output(self, generator):
+        """
+        sends the items of a generator as length prefixed frames (see serializer.frame_header). 
+        the generator runs in its own thread and packs the items into one frame until the sender is idle 
+        or the frame has batch_bytes, so slow generators (tokens) send every item right away and fast ones batch.
+        bytes items of batch_bytes or more go out raw without a copy, and the generator blocks once max_frames are queued
+        """
+        loop = asyncio.get_running_loop()
+        frames = queue.Queue(maxsize=self.max_frames)
+        ready = asyncio.Event()
+        stopped = threading.Event()
+
+        def put(frame) -> bool:
+            while not stopped.is_set():
+                try:
+                    frames.put(frame, timeout=1)
+                    loop.call_soon_threadsafe(ready.set)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            packer = self.serializer.packer()
+            items, size = [], 0
+            try:
+                for item in generator:
+                    if isinstance(item, bytes) and len(item) >= self.batch_bytes:
+                        if len(items) > 0 and not put([self.serializer.pack_frame(items)]):
+                            return
+                        items, size = [], 0
+                        if not put(self.serializer.raw_frame(item)):
+                            return
+                        continue
+                    items.append(packer.pack(item))
+                    size += len(items[-1])
+                    if size >= self.batch_bytes or frames.empty():
+                        if not put([self.serializer.pack_frame(items)]):
+                            return
+                        items, size = [], 0
+            except Exception as e:
+                items.append(packer.pack(c.detailed_error(e)))
+            finally:
+                generator.close()
+            if len(items) > 0:
+                put([self.serializer.pack_frame(items)])
+            put(None)
+
+        threading.Thread(target=produce, daemon=True).start()
+        try:
+            while True:
+                try:
+                    chunks = frames.get_nowait()
+                except queue.Empty:
+                    ready.clear()
+                    if frames.empty():
+                        await ready.wait()
+                    continue
+                if chunks == None:
+                    break
+                for chunk in chunks:
+                    yield chunk
+        finally:
+            stopped.set() # the client is gone or the stream ended
+
+    def forward(self, fn, input, wire_format:str = 'json'):
         try:
-            print(input)
             input = self.get_input(fn=fn, input=input)
-            output = self.get_output(fn=fn, input=input)
+            output = self.get_output(fn=fn, input=input, wire_format=wire_format)
         except Exception as e:
             output =  c.detailed_error(e)
         return output
 
+    def get_executor(self, fn:str):
+        if fn not in self.fn2executor:
+            max_workers = self.fn2max_workers.get(fn, self.max_workers)
+            self.fn2executor[fn] = c.module('executor.thread')(max_workers=max_workers, maxsize=0, thread_name_prefix=f'server.{fn}')
+        return self.fn2executor[fn]
+
+    def decode_input(self, fn:str, body:bytes, wire_format:str = 'json') -> dict:
+        if wire_format == 'msgpack':
+            input = self.serializer.from_bytes(body)
+        else:
+            input = json.loads(body)
+        return self.get_input(fn=fn, input=input)
+
+    def encode_output(self, output, wire_format:str = 'json'):
+        output = self.process_output(output, wire_format=wire_format)
+        if wire_format == 'msgpack' and not isinstance(output, Response):
+            output = Response(self.serializer.to_bytes(output), media_type=self.serializer.wire_formats['msgpack'])
+        return output
+
+    def get_blob(self, fn:str, input:dict, wire_format:str = 'json'):
+        """
+        the pre-serialized response of a blob fn called without arguments, None if the info cache of the module changed
+        """
+        if fn not in self.blob_fns or len(input['args']) > 0 or len(input['kwargs']) > 0:
+            return None
+        cache, response = self.blobs.get((fn, wire_format), (None, None))
+        if cache is None or cache is not self.module._info_cache:
+            return None
+        return response
+
+    def set_blob(self, fn:str, input:dict, output, wire_format:str = 'json'):
+        cache = self.module._info_cache
+        if fn not in self.blob_fns or len(input['args']) > 0 or len(input['kwargs']) > 0 or cache is None:
+            return output
+        if not isinstance(output, Response):
+            output = Response(json.dumps(output, separators=(',', ':')), media_type=self.serializer.wire_formats['json'])
+        self.blobs[(fn, wire_format)] = (cache, output)
+        return output
+
+    async def async_forward(self, fn:str, body:bytes, wire_format:str = 'json'):
+        """
+        verification and (de)serialization run in the server pool, coroutine functions are awaited 
+        on the loop and sync functions run in the pool of the function, queued per caller address
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            input = await loop.run_in_executor(self.executor, partial(self.decode_input, fn=fn, body=body, wire_format=wire_format))
+            blob = self.get_blob(fn, input, wire_format=wire_format)
+            if blob != None:
+                return blob
+            fn_obj = getattr(self.module, fn)
+            if asyncio.iscoroutinefunction(fn_obj):
+                output = await fn_obj(*input['args'], **input['kwargs'])
+            elif callable(fn_obj):
+                future = self.get_executor(fn).submit(fn_obj, args=input['args'], kwargs=input['kwargs'], timeout=None, tenant=input['address'])
+                output = await asyncio.wrap_future(future)
+            else:
+                output = fn_obj
+        except Exception as e:
+            return await loop.run_in_executor(self.executor, partial(self.encode_output, c.detailed_error(e), wire_format=wire_format))
+        output = await loop.run_in_executor(self.executor, partial(self.encode_output, output, wire_format=wire_format))
+        return self.set_blob(fn, input, output, wire_format=wire_format)
+
     def set_api(self, 
                 max_bytes=1024 * 1024,
                 allow_origins = ["*"],
@@ -115,8 +274,15 @@ class Server(c.Module):
             )
         
         @self.app.post("/{fn}")
-        def forward(fn:str, input:Dict):
-            return self.forward(fn=fn, input=input)
+        async def forward(fn:str, request: Request):
+            wire_format = self.serializer.wire_format(request.headers.get('content-type'))
+            if wire_format == None:
+                return JSONResponse({'success': False, 'error': f'Unsupported content type, use one of {list(self.serializer.wire_formats.values())}'}, status_code=415)
+            # the middleware already buffered the body
+            body = getattr(request.state, 'body', None)
+            if body == None:
+                body = await request.body()
+            return await self.async_forward(fn=fn, body=body, wire_format=wire_format)
         
         # start the server
         try:
@@ -146,7 +312,8 @@ class Server(c.Module):
               refresh:bool = True, # refreshes the server's key
               remote:bool = True, # runs the server remotely (pm2, ray)
               tag_seperator:str='::',
-              max_workers:int = None,
+              max_workers:int = None, # threads per function and for verifying requests
+              fn2max_workers:dict = None, # per function override of max_workers
               free: bool = False,
               mnemonic = None, # mnemonic for the server
               key = None,
@@ -202,6 +369,7 @@ class Server(c.Module):
                                           port=port, 
                                           network=server_network, 
                                           max_workers=max_workers, 
+                                          fn2max_workers=fn2max_workers,
                                           mnemonic = mnemonic,
                                           free=free, 
                                           key=key)
@@ -47,3 +47,62 @@ class Test(c.Module):
         c.rm_key(key_name)
         return {'success': True, 'msg': 'server test passed'}
 
+
+    @classmethod
+    def test_info_cache(cls):
+        module = c.module('module')()
+        module.key = c.get_key('module::test', create_if_not_exists=True)
+        info = module.info()
+        cache = module._info_cache
+        module.x = 1
+        assert module._info_cache is cache, 'a plain attribute reset the info cache'
+        @c.endpoint()
+        def new_fn(x:int = 1):
+            return x
+        module.add_fn(new_fn)
+        assert module._info_cache is None and 'new_fn' in module.info()['schema']
+        assert 'new_fn' not in info['schema']
+        module.info()['schema'].pop('new_fn') # the caller's copy
+        assert 'new_fn' in module.info()['schema'], 'mutating the info changed the cache'
+        module.key = c.get_key('module::test2', create_if_not_exists=True)
+        assert module.info()['key'] == module.key.ss58_address
+        return {'success': True, 'msg': 'info cache test passed'}
+
+    @classmethod
+    def test_access(cls):
+        module = c.module('module')()
+        module.whitelist = ['info']
+        access = c.module('server.access')(module=module, network='local', stake2rate=1)
+        access.set_rates({'stake': {'staked': 2}})
+        def allowed(address):
+            try:
+                access.forward(fn='info', input={'address': address})
+                return True
+            except AssertionError:
+                return False
+        assert not allowed('unstaked'), 'a caller without stake got through'
+        assert [allowed('staked') for _ in range(3)] == [True, True, False]
+        # a key added after the last sync is a local key right away
+        key = c.module('key').add_key('test.access', refresh=True)
+        assert all([allowed(key['ss58_address']) for _ in range(3)]), 'a new local key was rate limited'
+        c.module('key').rm_key('test.access')
+        return {'success': True, 'msg': 'access test passed'}
+
+    @classmethod
+    def test_middleware(cls, max_bytes:int = 10):
+        import asyncio
+        async def app(scope, receive, send):
+            raise Exception('the request should not reach the app')
+        middleware = c.module('server.middleware')(app, max_bytes=max_bytes)
+        async def status(content_length):
+            messages = []
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            async def send(message):
+                messages.append(message)
+            scope = {'type': 'http', 'method': 'POST', 'path': '/info', 'headers': [(b'content-length', content_length)]}
+            await middleware(scope, receive, send)
+            return messages[0]['status']
+        statuses = [asyncio.run(status(v)) for v in [b'abc', b'-1', str(max_bytes + 1).encode()]]
+        assert statuses == [400, 400, 413], statuses
+        return {'success': True, 'msg': 'middleware test passed'}
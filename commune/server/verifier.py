@@ -0,0 +1,85 @@
+import commune as c
+from typing import *
+from collections import OrderedDict
+import threading
+from scalecodec.utils.ss58 import ss58_decode
+
+Keypair = c.module('key')
+
+
+class Verifier(c.Module):
+    """
+    Verifies signed requests {data, signature, address, crypto_type} for the server.
+    Public keys are decoded once per address and the verified (signature, timestamp) pairs are
+    kept in a bounded LRU, so a replayed request is rejected for as long as it would pass the staleness check.
+    """
+    crypto_type2verify = Keypair.crypto_type2verify # the verifying backends of the keys
+
+    def __init__(self,
+                 max_age: int = 5, # seconds a (signature, timestamp) pair is remembered, use the max_request_staleness of the server
+                 max_signatures: int = 100_000, # max pairs in the LRU
+                 max_addresses: int = 10_000, # max public keys in the cache
+                 default_crypto_type: int = 1 # sr25519
+                 ):
+        self.max_age = max_age
+        self.max_signatures = max_signatures
+        self.max_addresses = max_addresses
+        self.default_crypto_type = default_crypto_type
+        self.signatures = OrderedDict() # (signature, timestamp) -> time it was seen
+        self.address2public_key = {}
+        self.lock = threading.Lock()
+
+    def public_key(self, address:str) -> bytes:
+        public_key = self.address2public_key.get(address, None)
+        if public_key == None:
+            if len(self.address2public_key) >= self.max_addresses:
+                self.address2public_key.clear()
+            public_key = self.address2public_key[address] = bytes.fromhex(ss58_decode(address))
+        return public_key
+
+    def resolve_crypto_type(self, crypto_type=None) -> int:
+        if crypto_type == None:
+            return self.default_crypto_type
+        if isinstance(crypto_type, str):
+            crypto_type = int(crypto_type) if crypto_type.isdigit() else c.module('key').crypto_name2type(crypto_type)
+        return crypto_type
+
+    def verify(self, input:dict) -> bool:
+        """
+        input: {data: str | bytes, signature: str | bytes, address: str, crypto_type: int}
+        """
+        data = input['data']
+        signature = input['signature']
+        if not isinstance(data, (str, bytes)):
+            data = c.python2str(data)
+        if isinstance(data, str):
+            data = bytes.fromhex(data[2:]) if data[:2] == '0x' else data.encode()
+        if isinstance(signature, str):
+            signature = bytes.fromhex(signature[2:] if signature[:2] == '0x' else signature)
+        public_key = self.public_key(input['address'])
+        verify_fn = self.crypto_type2verify[self.resolve_crypto_type(input.get('crypto_type', None))]
+        verified = verify_fn(signature, data, public_key)
+        if not verified:
+            # polkadot-js wraps the data before signing
+            verified = verify_fn(signature, b'<Bytes>' + data + b'</Bytes>', public_key)
+        return verified
+
+    def verify_many(self, inputs:List[dict], max_workers:int = 1) -> List[bool]:
+        return Keypair.batch_map(self.verify, inputs, max_workers=max_workers)
+
+    def check_replay(self, signature:Union[str, bytes], timestamp:int) -> bool:
+        """
+        Remembers the (signature, timestamp) pair and returns False if it was seen within max_age
+        """
+        key = (signature.hex() if isinstance(signature, bytes) else signature, timestamp)
+        now = c.time()
+        with self.lock:
+            # the pairs are in insertion order, so the stale ones are at the front
+            while self.signatures and (now - next(iter(self.signatures.values()))) > self.max_age:
+                self.signatures.popitem(last=False)
+            if key in self.signatures:
+                return False
+            self.signatures[key] = now
+            if len(self.signatures) > self.max_signatures:
+                self.signatures.popitem(last=False)
+        return True
@@ -0,0 +1,89 @@
+import commune as c
+from typing import *
+import numpy as np
+
+
+class Votes(c.Module):
+    """
+    Votes as numpy arrays (keys, uids, weights) from the leaderboard to set_weights.
+    key2uid is a sorted index (keys and their uids), so resolving n keys is one searchsorted
+    """
+
+    @staticmethod
+    def index(key2uid:dict) -> dict:
+        """
+        the sorted index of a key2uid (or name2uid) map
+        """
+        keys = np.array(list(key2uid.keys()), dtype=str)
+        uids = np.array(list(key2uid.values()), dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        return {'keys': keys[order], 'uids': uids[order]}
+
+    @staticmethod
+    def lookup(index:dict, keys) -> np.ndarray:
+        """
+        the uid of each key, -1 if the key is not in the index
+        """
+        keys = np.asarray(keys).astype(str)
+        uids = np.full(len(keys), -1, dtype=np.int64)
+        if len(index['keys']) == 0 or len(keys) == 0:
+            return uids
+        pos = np.searchsorted(index['keys'], keys)
+        pos = np.minimum(pos, len(index['keys']) - 1)
+        found = index['keys'][pos] == keys
+        uids[found] = index['uids'][pos[found]]
+        return uids
+
+    @staticmethod
+    def dedup(uids:np.ndarray, weights:np.ndarray) -> np.ndarray:
+        """
+        the positions of one vote per uid, the highest weight wins
+        """
+        order = np.lexsort((-weights, uids))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = uids[order][1:] != uids[order][:-1]
+        return order[first]
+
+    @staticmethod
+    def quantize(weights:np.ndarray, vector_length:int = 2**16 - 1) -> np.ndarray:
+        """
+        normalizes the weights to sum to vector_length (u16)
+        """
+        weights = np.clip(np.nan_to_num(np.asarray(weights, dtype=np.float64)), 0, None)
+        total = weights.sum()
+        if total == 0:
+            return np.zeros(len(weights), dtype=np.uint16)
+        return np.clip(weights / total * vector_length, 0, vector_length).astype(np.uint16)
+
+    @classmethod
+    def calculate(cls,
+                  keys,
+                  weights,
+                  index:dict,
+                  top_k:int = None, # only the top_k weights vote
+                  min_weight:float = 0,
+                  vector_length:int = 2**16 - 1) -> dict:
+        """
+        the votes (uids, u16 weights, keys) of the keys in the index with weights >= min_weight
+        """
+        keys = np.asarray(keys).astype(str)
+        weights = np.asarray(weights, dtype=np.float64)
+        uids = cls.lookup(index, keys)
+        valid = (uids >= 0) & np.isfinite(weights) & (weights >= min_weight)
+        keys, uids, weights = keys[valid], uids[valid], weights[valid]
+        keep = cls.dedup(uids, weights)
+        if top_k != None and top_k < len(keep):
+            keep = keep[np.argpartition(-weights[keep], top_k - 1)[:top_k]]
+        keys, uids, weights = keys[keep], uids[keep], weights[keep]
+        return {'keys': keys, 'uids': uids, 'weights': cls.quantize(weights, vector_length=vector_length)}
+
+    @classmethod
+    def test(cls):
+        index = cls.index({'a': 0, 'c': 2, 'b': 1, 'd': 3})
+        assert cls.lookup(index, ['b', 'x', 'd']).tolist() == [1, -1, 3]
+        votes = cls.calculate(keys=['a', 'b', 'b', 'x', 'd'], weights=[1, 2, 3, 4, -1], index=index)
+        assert votes['uids'].tolist() == [0, 1] and votes['keys'].tolist() == ['a', 'b']
+        assert votes['weights'].tolist() == [16383, 49151], votes # 1/4 and 3/4 of 2**16 - 1
+        votes = cls.calculate(keys=['a', 'b', 'c'], weights=[1, 3, 2], index=index, top_k=2)
+        assert sorted(votes['uids'].tolist()) == [1, 2]
+        return {'success': True, 'msg': 'votes test passed'}
@@ -1,7 +1,9 @@
 import commune as c
 from typing import *
+import numpy as np
 import json
 import typer
+from .votes import Votes
 
 class SubspaceWallet:
 
@@ -1160,21 +1162,40 @@ class SubspaceWallet:
         response = self.compose_call('register', params=params, key=key, wait_for_inclusion=wait_for_inclusion, wait_for_finalization=wait_for_finalization, nonce=nonce)
         return response
     
-    def resolve_uids(self, uids: Union['torch.LongTensor', list], netuid: int = 0, update=False) -> None:
-        name2uid = None
-        key2uid = None
-        for i, uid in enumerate(uids):
-            if isinstance(uid, str):
-                if name2uid == None:
-                    name2uid = self.name2uid(netuid=netuid, update=update)
-                if uid in name2uid:
-                    uids[i] = name2uid[uid]
-                else:
-                    if key2uid == None:
-                        key2uid = self.key2uid(netuid=netuid, update=update)
-                    if uid in key2uid:
-                        uids[i] = key2uid[uid]
-        return uids
+    def key_index(self, netuid: int = 0, update=False, max_age=1000) -> dict:
+        """
+        the keys of the subnet as a sorted index to their uids (see subspace.votes), 
+        kept in memory for max_age seconds
+        """
+        netuid = self.resolve_netuid(netuid)
+        if not hasattr(self, 'netuid2key_index'):
+            self.netuid2key_index = {}
+        timestamp, index = self.netuid2key_index.get(netuid, (0, None))
+        if update or index == None or c.time() - timestamp > max_age:
+            index = Votes.index(self.key2uid(netuid=netuid, update=update, max_age=max_age))
+            self.netuid2key_index[netuid] = (c.time(), index)
+        return index
+
+    def resolve_uids(self, uids: Union['torch.LongTensor', list], netuid: int = 0, update=False) -> np.ndarray:
+        """
+        the uids of a list of uids, keys and names, as an array (-1 for the ones that are not in the subnet)
+        """
+        # an object array so the ints of a mixed list do not become strings
+        uids = uids if isinstance(uids, np.ndarray) else np.array(list(uids), dtype=object)
+        if np.issubdtype(uids.dtype, np.integer):
+            return uids.astype(np.int64)
+        is_str = np.array([isinstance(uid, str) for uid in uids.tolist()], dtype=bool)
+        resolved = np.full(len(uids), -1, dtype=np.int64)
+        resolved[~is_str] = uids[~is_str].astype(np.int64)
+        if is_str.any():
+            names = uids[is_str].astype(str)
+            str_uids = Votes.lookup(self.key_index(netuid=netuid, update=update), names)
+            missing = str_uids < 0
+            if missing.any():
+                name_index = Votes.index(self.name2uid(netuid=netuid))
+                str_uids[missing] = Votes.lookup(name_index, names[missing])
+            resolved[is_str] = str_uids
+        return resolved
 
     def set_weights(
         self,
@@ -1188,24 +1209,23 @@ class SubspaceWallet:
         nonce=None,
         **kwargs
     ) -> bool:
-        import torch
         netuid = self.resolve_netuid(netuid)
         key = self.resolve_key(key)
 
         # ENSURE THE UIDS ARE VALID UIDS, CONVERTING THE NAMES AND KEYS ASSOCIATED WITH THEM
-        uids = self.resolve_uids(modules or uids, netuid=netuid, update=update)
-        weights = weights or  [1] * len(uids)
+        uids = self.resolve_uids(modules if modules != None else uids, netuid=netuid, update=update)
+        weights = np.ones(len(uids)) if weights is None else np.asarray(weights, dtype=np.float64)
         
         # CHECK WEIGHTS LENGHTS
         assert len(uids) == len(weights), f"Length of uids {len(uids)} must be equal to length of weights {len(weights)}"
+        assert (uids >= 0).all(), f"Could not resolve the uids of {np.flatnonzero(uids < 0).tolist()}"
         
-        # NORMALIZE WEIGHTS
-        weights = torch.tensor(weights)
-        weights = (weights / weights.sum()) * vector_length # normalize the weights between 0 and 1
-        weights = torch.clamp(weights, 0, vector_length)  # min_value and max_value are between 0 and 1
+        # ONE VOTE PER UID, NORMALIZED BETWEEN 0 AND vector_length
+        keep = Votes.dedup(uids, weights)
+        uids, weights = uids[keep], Votes.quantize(weights[keep], vector_length=vector_length)
         
-        params = {'uids': list(map(int, uids)),
-                  'weights': list(map(int, weights.tolist())), 
+        params = {'uids': uids.tolist(),
+                  'weights': weights.tolist(), 
                   'netuid': netuid}
         
         return self.compose_call('set_weights',params = params , key=key, nonce=nonce, **kwargs)
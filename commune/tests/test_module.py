@@ -12,3 +12,56 @@ def test_validator():
     c.module('vali').test()
 def test_subspace():
     assert c.module('subspace').test()
+def test_module_index(tmp_path, monkeypatch):
+    # a temporary index, the one in the cache path is shared by the processes of the user
+    monkeypatch.setattr(c.Module, 'module_index_path', classmethod(lambda cls: str(tmp_path / 'module_index.json')))
+    monkeypatch.setattr(c.Module, 'module_index_state', None)
+    object_path = c.simple2objectpath('server')
+    assert c.index_lookup('server') == object_path
+    c.module_index()['server']['mtime'] = 0 # as if server.py changed since it was indexed
+    assert c.index_lookup('server') == None
+    assert c.simple2objectpath('server') == object_path and c.index_lookup('server') == object_path
+def test_tree_changes(tmp_path, monkeypatch):
+    import os
+    monkeypatch.setenv('PWD', str(tmp_path)) # the simple paths of a tree outside of the library are relative to it
+    monkeypatch.setattr(c.Module, 'tree_state_path', classmethod(lambda cls, tree_path: str(tmp_path / 'tree_state.json')))
+    tree_path = str(tmp_path / 'tree')
+    os.makedirs(tree_path + '/a')
+    c.put_text(tree_path + '/a/a.py', 'class A: pass')
+    first = c.update_tree(tree_path)
+    version = first['version']
+    assert c.update_tree(tree_path)['scanned'] == 0
+    c.put_text(tree_path + '/a/b.py', 'class B: pass')
+    update = c.update_tree(tree_path)
+    assert update['scanned'] == 1 and len(update['changes']) == 1 and update['version'] == version + 1
+    feed = c.tree_changes(since=version, tree_path=tree_path)
+    assert feed['complete'] and [list(ch['added']) for ch in feed['changes'][0]['changes']] == [[c.path2simple(tree_path + '/a/b.py')]]
+    os.remove(tree_path + '/a/b.py')
+    assert c.update_tree(tree_path)['changes'][0]['removed'] == [c.path2simple(tree_path + '/a/b.py')]
+    assert c.tree_hash(tree_path) == first['hash'] # the same modules as before b.py
+    c.tree_states.pop(tree_path)
+def test_tree_venv(tmp_path, monkeypatch):
+    import os
+    monkeypatch.setenv('PWD', str(tmp_path))
+    monkeypatch.setattr(c.Module, 'tree_state_path', classmethod(lambda cls, tree_path: str(tmp_path / 'tree_state.json')))
+    tree_path = str(tmp_path / 'tree')
+    os.makedirs(tree_path + '/env')
+    os.makedirs(tree_path + '/venv/lib')
+    c.put_text(tree_path + '/env/env.py', 'class Env: pass')
+    c.put_text(tree_path + '/venv/pyvenv.cfg', 'home = /usr/bin')
+    c.put_text(tree_path + '/venv/lib/site.py', 'class Site: pass')
+    tree = c.build_tree(tree_path, verbose=False)
+    assert list(tree.values()) == [tree_path + '/env/env.py'], tree # the env package stays, the virtualenv does not
+    c.tree_states.pop(tree_path)
+def test_routes():
+    c.clear_routes()
+    c.ticket()
+    instance = c.route_instance('ticket')
+    c.ticket()
+    assert c.route_instance('ticket') is instance and len(c.route_instances()) == 1
+    assert c.route_target('ticket', 'ticket')[1] == 'self'
+    assert c.route_stats('ticket')['ticket.ticket']['calls'] == 2
+    assert c.route_instance('ticket', x=1) is not instance and c.route_instance('ticket', x=1) is c.route_instance('ticket', x=1)
+    assert len(c.route_instances()) == 2 # one per init kwargs
+    other = c.submit(c.route_instance, args=['ticket']).result()
+    assert other is not instance and len(c.route_instances()) == 2 # each thread has its own pool
@@ -0,0 +1,135 @@
+import commune as c
+import multiprocessing
+import asyncio
+import socket
+import numpy as np
+import os
+
+class Bench(c.Module):
+    """
+    Benchmarks for the vali
+    """
+
+    @staticmethod
+    def standins(n:int, delay:float, queue):
+        """
+        n stand-in servers in one process, one port each, that answer every call with their info after delay seconds
+        """
+        from aiohttp import web
+        async def serve():
+            ports = []
+            for i in range(n):
+                sock = socket.socket()
+                sock.bind(('127.0.0.1', 0))
+                port = sock.getsockname()[1]
+                info = {'name': f'standin::{i}', 'address': f'127.0.0.1:{port}', 'key': f'standin{i}', 'w': 0}
+                async def handler(request, info=info):
+                    await request.read()
+                    await asyncio.sleep(delay)
+                    return web.json_response(info)
+                app = web.Application()
+                app.router.add_post('/{fn}/', handler)
+                runner = web.AppRunner(app, access_log=None)
+                await runner.setup()
+                await web.SockSite(runner, sock, backlog=1024).start()
+                ports.append(port)
+            queue.put(ports)
+            await asyncio.Event().wait()
+        asyncio.run(serve())
+
+    def epoch(self,
+              n:int = 1000,
+              delay:float = 0.05, # seconds each stand-in takes to answer
+              epochs:int = 2,
+              evaluators = ['thread', 'async']):
+        """
+        modules evaluated per second by Vali.epoch against n local stand-in servers, with the thread evaluator 
+        (a blocking eval per executor thread) vs the async evaluator (one event loop)
+        """
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=self.standins, args=(n, delay, queue), daemon=True)
+        process.start()
+        try:
+            ports = queue.get(timeout=120)
+            namespace = {f'standin::{i}': f'127.0.0.1:{port}' for i, port in enumerate(ports)}
+            results = []
+            for evaluator in evaluators:
+                storage_path = self.resolve_path(f'bench_{evaluator}')
+                vali = c.module('vali')(network='local',
+                                        run_loop=False,
+                                        update=True, # evaluate every module each epoch
+                                        evaluator=evaluator,
+                                        storage_path=storage_path,
+                                        max_network_staleness=1e9, # keep the stand-ins as the namespace
+                                        verbose=False)
+                vali.namespace = vali.name2address = namespace
+                vali.address2name = {v: k for k, v in namespace.items()}
+                vali.n = n
+                for epoch in range(epochs):
+                    t0 = c.time()
+                    scores = vali.epoch(df=False)
+                    seconds = c.time() - t0
+                    results.append({'evaluator': evaluator,
+                                    'epoch': epoch,
+                                    'n': n,
+                                    'evaluated': len(scores),
+                                    'seconds': round(seconds, 3),
+                                    'modules_per_sec': round(len(scores) / seconds, 1)})
+                vali.refresh_leaderboard()
+                if os.path.exists(storage_path + '.json'):
+                    os.remove(storage_path + '.json')
+        finally:
+            process.kill()
+        c.print(c.df(results))
+        return results
+
+    @staticmethod
+    def loop_votes(leaderboard:list, uid2key:dict, vector_length:int = 2**16 - 1) -> dict:
+        # the votes as they were computed before, a python loop over the leaderboard rows
+        key2uid = {v: k for k, v in uid2key.items()}
+        votes = {'keys' : [], 'weights' : [], 'uids': []}
+        for info in leaderboard:
+            if 'key' in info and info['w'] >= 0:
+                if info['key'] in key2uid:
+                    votes['keys'] += [info['key']]
+                    votes['weights'] += [info['w']]
+                    votes['uids'] += [key2uid.get(info['key'], -1)]
+        total = sum(votes['weights'])
+        votes['weights'] = [int(min(max(w / total * vector_length, 0), vector_length)) for w in votes['weights']]
+        return votes
+
+    def votes(self, ns = [1000, 10_000, 100_000], repeats:int = 3):
+        """
+        seconds to compute the votes of n modules from the score table: 
+        leaderboard rows + a loop over key2uid (loop) vs arrays + the sorted key index (numpy)
+        """
+        Votes = c.module('subspace.votes')
+        results = []
+        for n in ns:
+            keys = ['5' + os.urandom(24).hex()[:47] for i in range(n)]
+            uid2key = dict(enumerate(keys))
+            table = c.module('vali.table')()
+            now = c.time()
+            table.put_many([{'name': f'm{i}', 'key': k, 'w': float(np.random.rand()), 'timestamp': now} for i, k in enumerate(keys)])
+            t0 = c.time()
+            index = Votes.index({k: uid for uid, k in uid2key.items()}) # built once per max_network_staleness
+            index_seconds = round(c.time() - t0, 4)
+            for mode in ['loop', 'numpy']:
+                t0 = c.time()
+                for _ in range(repeats):
+                    if mode == 'loop':
+                        leaderboard = table.top(keys=['name', 'w', 'staleness', 'latency', 'key'], ascending=True)
+                        votes = self.loop_votes(leaderboard, uid2key)
+                    else:
+                        leaderboard = table.arrays(keys=['key', 'w'])
+                        votes = Votes.calculate(keys=leaderboard['key'], weights=leaderboard['w'], index=index)
+                assert len(votes['uids']) == n
+                results.append({'mode': mode, 
+                                'n': n, 
+                                'seconds': round((c.time() - t0) / repeats, 4), 
+                                'index_seconds': index_seconds if mode == 'numpy' else None})
+        c.print(c.df(results))
+        return results
+
+    def forward(self):
+        return {'epoch': self.epoch(), 'votes': self.votes()}
@@ -0,0 +1,156 @@
+import commune as c
+from typing import *
+import threading
+import heapq
+import math
+
+
+class EvalScheduler(c.Module):
+    """
+    When each module of a validator is due for its next eval, as a min-heap of (due, seq, name).
+    Every eval moves the module to now + interval, where the interval starts at min_interval and grows
+    towards max_interval the more stable its score is (running mean/variance of w),
+    the higher its latency and the more errors in a row it had.
+    """
+
+    def __init__(self,
+                 min_interval:float = 60, # seconds between evals of a volatile module
+                 max_interval:float = 600, # seconds between evals of a stable module
+                 timeout:float = 10, # the eval timeout, latencies are relative to it
+                 decay:float = 0.3, # weight of the latest score in the running mean/variance
+                 warmup:int = 3, # evals at min_interval before the interval adapts
+                 lease:float = 60): # seconds before a dispatched module that never reported is due again
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.timeout = timeout
+        self.decay = decay
+        self.warmup = warmup
+        self.lease = lease
+        self.lock = threading.Lock()
+        self.heap = []
+        self.modules = {} # name -> {'due', 'seq', 'mean', 'var', 'latency', 'evals', 'errors', 'interval'}
+        self.counter = 0
+        self.dispatched = 0 # modules returned by due
+        self.skipped = 0 # modules that were not due when due was called
+
+    def __len__(self):
+        return len(self.modules)
+
+    def push(self, name:str, due:float):
+        # the old entry of the module stays in the heap and is skipped as its seq is stale
+        self.counter += 1
+        state = self.modules[name]
+        state['due'], state['seq'] = due, self.counter
+        heapq.heappush(self.heap, (due, self.counter, name))
+
+    def sync(self, names:List[str], name2timestamp:Callable = None):
+        """
+        adds the new names (due after their last eval, from name2timestamp) and drops the ones not in names
+        """
+        names = set(names)
+        with self.lock:
+            for name in [n for n in self.modules if n not in names]:
+                del self.modules[name]
+            for name in names:
+                if name not in self.modules:
+                    self.modules[name] = {'mean': 0.0, 'var': 0.0, 'latency': 0.0, 'evals': 0, 'errors': 0, 'interval': self.min_interval}
+                    last = name2timestamp(name) if name2timestamp != None else 0
+                    self.push(name, (last or 0) + self.min_interval)
+            # rebuild once the stale entries outnumber the live ones
+            if len(self.heap) > 2 * len(self.modules) + 64:
+                self.heap = [(s['due'], s['seq'], n) for n, s in self.modules.items()]
+                heapq.heapify(self.heap)
+
+    def due(self, n:int = None, now:float = None) -> List[str]:
+        """
+        pops the modules that are due, the most overdue first, each is leased until it reports with update
+        """
+        now = c.time() if now == None else now
+        names = []
+        with self.lock:
+            while len(self.heap) > 0 and (n == None or len(names) < n):
+                due, seq, name = self.heap[0]
+                state = self.modules.get(name, None)
+                if state == None or state['seq'] != seq:
+                    heapq.heappop(self.heap)
+                    continue
+                if due > now:
+                    break
+                heapq.heappop(self.heap)
+                self.push(name, now + max(self.min_interval, self.lease))
+                names.append(name)
+            self.dispatched += len(names)
+            self.skipped += len(self.modules) - len(names)
+        return names
+
+    def interval(self, state:dict) -> float:
+        if state['errors'] > 0:
+            return min(self.min_interval * 2 ** state['errors'], self.max_interval)
+        if state['evals'] < self.warmup:
+            return self.min_interval
+        # coefficient of variation of w, a zero weight module with a steady score counts as stable
+        cv = math.sqrt(state['var']) / (abs(state['mean']) + 1e-6)
+        stability = 1 / (1 + cv) ** 2
+        interval = self.min_interval + (self.max_interval - self.min_interval) * stability
+        interval *= 1 + state['latency'] / max(self.timeout, 1e-6)
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def update(self, name:str, w:float = None, latency:float = None, error:bool = False, now:float = None) -> float:
+        """
+        records the eval of a module and reschedules it, returns the seconds until it is due again
+        """
+        now = c.time() if now == None else now
+        with self.lock:
+            state = self.modules.get(name, None)
+            if state == None:
+                return None
+            if error:
+                state['errors'] += 1
+            else:
+                state['errors'] = 0
+                w = float(w or 0)
+                if state['evals'] == 0:
+                    state['mean'] = w
+                else:
+                    delta = w - state['mean']
+                    state['mean'] += self.decay * delta
+                    state['var'] = (1 - self.decay) * (state['var'] + self.decay * delta ** 2)
+                state['latency'] = float(latency or 0)
+                state['evals'] += 1
+            state['interval'] = self.interval(state)
+            self.push(name, now + state['interval'])
+            return state['interval']
+
+    def stats(self) -> dict:
+        now = c.time()
+        with self.lock:
+            states = list(self.modules.values())
+            intervals = [s['interval'] for s in states]
+            return {
+                'modules': len(states),
+                'due': sum([s['due'] <= now for s in states]),
+                'next_due': round(min([s['due'] for s in states]) - now, 3) if len(states) > 0 else None,
+                'mean_interval': round(sum(intervals) / len(intervals), 3) if len(intervals) > 0 else None,
+                'erroring': sum([s['errors'] > 0 for s in states]),
+                'dispatched': self.dispatched,
+                'skipped': self.skipped,
+            }
+
+    @classmethod
+    def test(cls):
+        self = cls(min_interval=10, max_interval=100, warmup=1)
+        self.sync(['a', 'b', 'c'], name2timestamp=lambda name: {'c': 1000}.get(name, 0))
+        assert sorted(self.due(now=100)) == ['a', 'b'] # c was evaluated at 1000
+        assert self.due(now=100) == [] # leased until they report
+        for i in range(10):
+            self.update('a', w=1, now=100) # a steady score
+            self.update('b', w=i % 2, now=100) # a volatile score
+        assert self.modules['a']['interval'] > 2 * self.modules['b']['interval'], self.modules
+        self.update('c', error=True, now=1000)
+        self.update('c', error=True, now=1000)
+        assert self.modules['c']['interval'] == 40
+        assert self.due(now=150) == ['b']
+        assert self.due(now=1041) == ['a', 'b', 'c'] # b never reported, so its lease ran out
+        self.sync(['a'])
+        assert self.due(now=1e9) == ['a'] and len(self) == 1
+        return {'success': True, 'msg': 'eval scheduler test passed'}
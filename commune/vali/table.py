@@ -0,0 +1,239 @@
+import commune as c
+from typing import *
+import numpy as np
+import threading
+import json
+import os
+
+
+class ScoreTable(c.Module):
+    """
+    In memory score table of a validator, one row per module name.
+    w, latency and timestamp are numpy columns so the leaderboard is a partial sort over arrays,
+    the full info of each row is kept for the next eval, and the table is written to one json file.
+    """
+    float_columns = ['w', 'latency', 'timestamp']
+    str_columns = ['name', 'address', 'key']
+
+    def __init__(self, path:str = None, capacity:int = 1024, flush_interval:float = 10):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+        self.clear(capacity=capacity)
+        self.last_flush = c.time()
+        if path != None:
+            self.load()
+
+    def clear(self, capacity:int = 1024):
+        with self.lock:
+            self.name2row = {}
+            self.free = [] # rows of removed modules, reused before growing
+            self.size = 0 # rows in use or free
+            self.cursor = 0 # where the next incremental expire starts
+            self.valid = np.zeros(capacity, dtype=bool)
+            self.columns = {k: np.full(capacity, np.nan) for k in self.float_columns}
+            self.columns.update({k: np.empty(capacity, dtype=object) for k in self.str_columns})
+            self.infos = [None] * capacity
+            self.dirty = True
+
+    def __len__(self):
+        return len(self.name2row)
+
+    def grow(self):
+        capacity = len(self.valid) * 2
+        self.valid = np.concatenate([self.valid, np.zeros(capacity - len(self.valid), dtype=bool)])
+        for k, v in self.columns.items():
+            fill = np.full(capacity - len(v), np.nan) if k in self.float_columns else np.empty(capacity - len(v), dtype=object)
+            self.columns[k] = np.concatenate([v, fill])
+        self.infos += [None] * (capacity - len(self.infos))
+
+    def put(self, info:dict) -> int:
+        """
+        upserts the info of a module (by name), returns its row
+        """
+        name = info['name']
+        with self.lock:
+            row = self.name2row.get(name, None)
+            if row == None:
+                if len(self.free) > 0:
+                    row = self.free.pop()
+                else:
+                    if self.size == len(self.valid):
+                        self.grow()
+                    row = self.size
+                    self.size += 1
+                self.name2row[name] = row
+                self.valid[row] = True
+            for k in self.float_columns:
+                v = info.get(k, None)
+                self.columns[k][row] = np.nan if v == None else float(v)
+            for k in self.str_columns:
+                self.columns[k][row] = info.get(k, None)
+            self.infos[row] = info
+            self.dirty = True
+        return row
+
+    def put_many(self, infos:List[dict]) -> List[int]:
+        with self.lock:
+            return [self.put(info) for info in infos]
+
+    def get(self, name:str, default:Any = None) -> dict:
+        row = self.name2row.get(name, None)
+        if row == None:
+            return default
+        return dict(self.infos[row])
+
+    def rm(self, name:str) -> bool:
+        with self.lock:
+            row = self.name2row.pop(name, None)
+            if row == None:
+                return False
+            self.valid[row] = False
+            self.infos[row] = None
+            self.free.append(row)
+            self.dirty = True
+        return True
+
+    def expire(self, max_age:float, n:int = 1024) -> List[str]:
+        """
+        removes the rows older than max_age among the next n rows, so each call costs at most n rows
+        """
+        with self.lock:
+            if self.size == 0:
+                return []
+            rows = (self.cursor + np.arange(min(n, self.size))) % self.size
+            self.cursor = int((self.cursor + len(rows)) % self.size)
+            stale = rows[self.valid[rows] & (c.time() - self.columns['timestamp'][rows] > max_age)]
+            names = [self.columns['name'][row] for row in stale]
+            for name in names:
+                self.rm(name)
+        return names
+
+    def row(self, row:int, keys:List[str], now:float) -> dict:
+        info = self.infos[row]
+        item = {}
+        for k in keys:
+            if k == 'staleness':
+                item[k] = now - self.columns['timestamp'][row]
+            elif k in self.columns:
+                v = self.columns[k][row]
+                item[k] = None if (k in self.float_columns and np.isnan(v)) else v
+            else:
+                item[k] = info.get(k, None)
+        return item
+
+    def top(self,
+            keys:List[str] = ['name', 'w', 'staleness', 'latency', 'address'],
+            by:str = 'w',
+            ascending:bool = False,
+            n:int = None,
+            page:int = None,
+            max_age:float = None,
+            min_w:float = None,
+            names:List[str] = None) -> List[dict]:
+        """
+        the rows sorted by a column, only the first (page + 1) * n rows are sorted
+        """
+        now = c.time()
+        with self.lock:
+            rows = self.select(now=now, max_age=max_age, min_w=min_w, names=names)
+            if by == 'staleness':
+                values = now - self.columns['timestamp'][rows]
+            elif by in self.float_columns:
+                values = self.columns[by][rows]
+            else:
+                values = None
+            if values is None:
+                # not a numeric column, sort the infos
+                rows = sorted(rows, key=lambda r: str(self.infos[r].get(by, '')), reverse=not ascending)
+            else:
+                values = values if ascending else -values
+                k = None if n == None else n * ((page or 0) + 1)
+                if k != None and k < len(rows):
+                    top_k = np.argpartition(values, k - 1)[:k]
+                    rows, values = rows[top_k], values[top_k]
+                rows = rows[np.argsort(values, kind='stable')]
+            if n != None:
+                page = page or 0
+                rows = rows[page*n:(page+1)*n]
+            return [self.row(r, keys, now) for r in rows]
+
+    def select(self, now:float, max_age:float = None, min_w:float = None, names:List[str] = None) -> np.ndarray:
+        # the rows in use, of the names if given, evaluated within max_age and with w > min_w
+        if names != None:
+            rows = np.array([self.name2row[name] for name in names if name in self.name2row], dtype=int)
+        else:
+            rows = np.flatnonzero(self.valid[:self.size])
+        if max_age != None:
+            rows = rows[now - self.columns['timestamp'][rows] <= max_age]
+        if min_w != None:
+            rows = rows[self.columns['w'][rows] > min_w]
+        return rows
+
+    def arrays(self, keys:List[str] = ['key', 'w'], max_age:float = None, min_w:float = None, names:List[str] = None) -> Dict[str, np.ndarray]:
+        """
+        the columns of the selected rows as arrays (no sort, no dicts per row)
+        """
+        now = c.time()
+        with self.lock:
+            rows = self.select(now=now, max_age=max_age, min_w=min_w, names=names)
+            return {k: now - self.columns['timestamp'][rows] if k == 'staleness' else self.columns[k][rows].copy() for k in keys}
+
+    def flush(self, force:bool = False) -> bool:
+        """
+        writes the table to path (atomically) if it changed and flush_interval passed since the last write
+        """
+        if self.path == None or not self.dirty or (not force and c.time() - self.last_flush < self.flush_interval):
+            return False
+        with self.lock:
+            infos = [info for info in self.infos[:self.size] if info != None]
+            self.dirty = False
+            self.last_flush = c.time()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'timestamp': self.last_flush, 'infos': infos}, f, default=str)
+        os.replace(tmp_path, self.path)
+        return True
+
+    def load(self) -> int:
+        """
+        loads the table from path, falls back to the module files next to it (one json per module)
+        """
+        infos = []
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                infos = json.load(f)['infos']
+        else:
+            legacy_dir = self.path[:-len('.json')] if self.path.endswith('.json') else self.path
+            if os.path.isdir(legacy_dir):
+                for f in os.listdir(legacy_dir):
+                    if f.endswith('.json'):
+                        info = self.get_json(os.path.join(legacy_dir, f), None)
+                        if isinstance(info, dict):
+                            if 'data' in info and 'encrypted' in info:
+                                info = info['data'] # saved with put
+                            info['name'] = info.get('name', f[:-len('.json')])
+                            infos.append(info)
+        self.put_many([info for info in infos if isinstance(info, dict) and 'name' in info])
+        self.dirty = False
+        return len(infos)
+
+    @classmethod
+    def test(cls, n:int = 1000):
+        path = c.resolve_path('~/.commune/vali/test_table.json')
+        if os.path.exists(path):
+            os.remove(path)
+        self = cls(path=path)
+        now = c.time()
+        self.put_many([{'name': f'm{i}', 'w': i / n, 'timestamp': now, 'latency': 1} for i in range(n)])
+        self.put({'name': 'old', 'w': 2, 'timestamp': now - 100})
+        assert [r['name'] for r in self.top(n=3)] == ['old', f'm{n-1}', f'm{n-2}']
+        assert [r['name'] for r in self.top(n=2, page=1, max_age=10)] == [f'm{n-3}', f'm{n-4}']
+        assert [r['name'] for r in self.top(n=2, ascending=True)] == ['m0', 'm1']
+        assert self.arrays(keys=['name', 'w'], min_w=1)['name'].tolist() == ['old']
+        assert self.expire(max_age=10) == ['old'] and len(self) == n
+        assert self.flush(force=True)
+        assert len(cls(path=path)) == n and cls(path=path).get('m1')['w'] == 1 / n
+        os.remove(path)
+        return {'success': True, 'msg': 'score table test passed'}
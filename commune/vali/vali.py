@@ -1,9 +1,12 @@
 
 import commune as c
 import os
+import asyncio
 import pandas as pd
 from typing import *
 
+Votes = c.module('subspace.votes')
+
 class Vali(c.Module):
 
     whitelist = ['eval_module', 'score_module', 'eval', 'leaderboard']
@@ -29,6 +32,14 @@ class Vali(c.Module):
             if isinstance(score_fn, str):
                 score_fn = c.get_fn(score_fn)
         self.score = getattr(self, score_fn)
+        # the async evaluator awaits async score functions, the default score has an async twin (async_score), 
+        # and any other score function runs on the executor
+        if asyncio.iscoroutinefunction(self.score):
+            self.async_score_fn = self.score
+        elif getattr(self.score, '__func__', None) is Vali.score:
+            self.async_score_fn = self.async_score
+        else:
+            self.async_score_fn = None
         return {'success': True, 'msg': 'Set score function', 'score_fn': self.score.__name__}
 
     def init_state(self):
@@ -74,13 +85,23 @@ class Vali(c.Module):
         self.config = config
         if update:
             self.config.max_staleness = 0
+            self.config.max_eval_interval = 0
 
         self.init_state()
+        # one executor for the life of the vali, reused across epochs
+        self.executor = c.module('executor.thread')(max_workers=self.config.threads_per_worker,  maxsize=self.config.max_size)
         self.set_score_fn(score_fn)
         self.set_network(network=self.config.network, 
                      search=config.search,  
                      netuid=config.netuid, 
                      max_age = config.max_network_staleness)
+        # the scores of the modules, flushed to one file next to the storage path
+        self.table = c.module('vali.table')(path=self.storage_path() + '.json', flush_interval=self.config.flush_interval)
+        # when each module is due, between max_staleness (volatile scores) and max_eval_interval (stable scores)
+        self.scheduler = c.module('vali.scheduler')(min_interval=self.config.max_staleness, 
+                                                    max_interval=self.config.max_eval_interval, 
+                                                    timeout=self.config.timeout,
+                                                    lease=2 * self.config.timeout)
         # start the run loop
         if self.config.run_loop:
             c.thread(self.run_loop)
@@ -105,6 +126,8 @@ class Vali(c.Module):
             'success_staleness': self.success_staleness,
             'staleness_count': self.staleness_count,
             'epochs': self.epochs,
+            'table_size': len(self.table),
+            'scheduler': self.scheduler.stats(),
             'executor_status': self.executor.status()
             
 
@@ -146,6 +169,7 @@ class Vali(c.Module):
         c.print(run_info)
         c.print(buffer+f'Epoch {self.epochs} with {self.n} modules', color='yellow'+buffer)
         c.print(self.leaderboard())
+        self.table.flush()
 
     def run_loop(self):
         """
@@ -218,20 +242,20 @@ class Vali(c.Module):
             for future in c.as_completed(self.futures, timeout=self.config.timeout):
                 self.futures.remove(future) 
                 result = future.result()
-                emoji =  '🟢' if result['w'] > 0 else '🔴'
-
-                if c.is_error(result):
-                    msg = ' '.join([f'{k}={result[k]}' for k in result.keys()])
-                    msg =  f'ERROR({msg})'
-                else:
-                    result = {k: result[k] for k in self.config.result_keys}
-                    msg = ' '.join([f'{k}={result[k]}' for k in result])
-                    msg = f'SUCCESS({msg})'
                 break
         except Exception as e:
-            emoji = '🔴'
             result = c.detailed_error(e)
-            msg = f'Error({result})'
+        return self.print_result(result)
+
+    def print_result(self, result:dict) -> dict:
+        emoji =  '🟢' if result.get('w', 0) > 0 else '🔴'
+        if c.is_error(result):
+            msg = ' '.join([f'{k}={result[k]}' for k in result.keys()])
+            msg =  f'ERROR({msg})'
+        else:
+            result = {k: result[k] for k in self.config.result_keys if k in result}
+            msg = ' '.join([f'{k}={result[k]}' for k in result])
+            msg = f'SUCCESS({msg})'
         c.print(emoji + msg + emoji, 
                 color='cyan', 
                 verbose=self.config.verbose)
@@ -252,14 +276,14 @@ class Vali(c.Module):
         return self.epoch()
 
     def epoch(self,  df=True,  **kwargs):
-    
+        if self.config.evaluator == 'async':
+            return c.get_event_loop().run_until_complete(self.async_epoch(df=df, **kwargs))
         try:
             self.epochs += 1
             self.sync_network(**kwargs)
-            module_addresses = c.shuffle(list(self.namespace.values()))
-            c.print(f'Epoch {self.epochs} with {len(module_addresses)} modules', color='yellow')
+            module_addresses = self.due_modules()
+            c.print(f'Epoch {self.epochs} with {len(module_addresses)}/{self.n} modules due', color='yellow')
             batch_size = min(self.config.batch_size, len(module_addresses)//4)
-            self.executor = c.module('executor.thread')(max_workers=self.config.threads_per_worker,  maxsize=self.config.max_size)
             
             self.sync(network=self.config.network)
 
@@ -271,7 +295,7 @@ class Vali(c.Module):
 
             for module_address in module_addresses:
                 if not self.executor.is_full:
-                    future = self.executor.submit(self.eval, kwargs={'module': module_address},timeout=timeout)
+                    future = self.executor.submit(self.eval, kwargs={'module': module_address}, timeout=timeout, tenant=module_address)
                     self.futures.append(future)
                 if len(self.futures) >= batch_size:
                     result = self.generate_finished_result()
@@ -285,6 +309,52 @@ class Vali(c.Module):
         except Exception as e:
             c.print(c.detailed_error(e), color='red')
 
+        return self.epoch_results(results, df=df)
+
+    async def async_epoch(self, df=True, **kwargs):
+        """
+        evaluates every module of the network from one event loop, at most max_concurrency at a time
+        and max_module_concurrency per module, the scores go into the table as each eval finishes
+        """
+        results = []
+        try:
+            self.epochs += 1
+            self.sync_network(**kwargs)
+            module_addresses = self.due_modules()
+            self.current_epoch = self.epochs
+            c.print(f'Starting epoch {self.current_epoch} with {len(module_addresses)}/{self.n} modules due', color='yellow')
+            client = c.module('client')
+            semaphore = asyncio.Semaphore(self.config.max_concurrency)
+            module2semaphore = {}
+            async def eval_module(module_address):
+                if module_address not in module2semaphore:
+                    module2semaphore[module_address] = asyncio.Semaphore(self.config.max_module_concurrency)
+                async with semaphore, module2semaphore[module_address]:
+                    try:
+                        return await asyncio.wait_for(self.async_eval(module_address, client=client), timeout=self.config.timeout)
+                    except Exception as e:
+                        return self.eval_error(e, module=module_address)
+            for future in asyncio.as_completed([eval_module(m) for m in module_addresses]):
+                result = await future
+                results.append(self.print_result(result))
+        except Exception as e:
+            c.print(c.detailed_error(e), color='red')
+        finally:
+            # the eval session lives for one epoch
+            await c.module('client').async_close_sessions(**self.eval_session_kwargs)
+        return self.epoch_results(results, df=df)
+
+    def due_modules(self) -> List[str]:
+        """
+        The addresses of the modules that are due for an eval, the most overdue first
+        """
+        self.scheduler.sync(list(self.namespace.keys()), name2timestamp=lambda name: self.table.get(name, {}).get('timestamp', 0))
+        names = self.scheduler.due()
+        self.staleness_count += self.n - len(names) # the modules that were evaluated too recently
+        return [self.namespace[name] for name in names]
+
+    def epoch_results(self, results, df=True):
+        self.table.flush()
         results = [r for r in results if not c.is_error(r)]
         if df:
             if len(results) > 0 and 'w' in results[0]:
@@ -368,6 +438,12 @@ class Vali(c.Module):
         info = module.info()
         assert isinstance(info, dict) and not c.is_error(info), f'Info must be a dictionary, got {info}'
         return {'w': 1}
+
+    async def async_score(self, module: 'c.Module'):
+        # the default score for the async evaluator
+        info = await module.info(return_future=True)
+        assert isinstance(info, dict) and not c.is_error(info), f'Info must be a dictionary, got {info}'
+        return {'w': 1}
     
     def next_module(self):
         return c.choice(list(self.namespace.keys()))
@@ -398,6 +474,35 @@ class Vali(c.Module):
 
 
 
+    def eval_info(self, module:str) -> Tuple[str, dict]:
+        """
+        The address of the module and its info from the score table (the scheduler decides when it is due)
+        """
+        # RESOLVE THE NAME OF THE ADDRESS IF IT IS NOT A NAME
+        address = self.resolve_module_address(module)
+        name = self.address2name.get(address, module)
+        info = self.table.get(name, {})
+        info['staleness'] = c.time() -  info.get('timestamp', 0)
+        info['name'] = name # the row of the module in the score table
+        return address, info
+
+    def start_eval(self, info:dict) -> dict:
+        info['timestamp'] = c.timestamp() # the timestamp
+        info['w'] = info.get('w', 0) # the weight from the module
+        info['past_w'] = info['w'] # for calculating alpha
+        self.last_sent = c.time()
+        self.requests += 1
+        return info
+
+    def eval_error(self, e:Exception, module:str, info:dict = None) -> dict:
+        response = c.detailed_error(e)
+        response['w'] = 0
+        response['name'] = (info or {}).get('name', self.address2name.get(module, module))
+        self.scheduler.update(response['name'], error=True)
+        self.errors += 1
+        self.last_error  = c.time() # the last time an error occured
+        return response
+
     def eval(self,  module:str, **kwargs):
         """
         The following evaluates a module sver
@@ -405,42 +510,61 @@ class Vali(c.Module):
         self.sync()
         info = {}
         try:
-            info = {}
-            # RESOLVE THE NAME OF THE ADDRESS IF IT IS NOT A NAME
-            address = self.resolve_module_address(module)
-            path = self.get_module_path(module)
+            address, info = self.eval_info(module)
+            name = info['name']
             module = c.connect(address, key=self.key)
-            info = self.get_json(path, {})
-            last_timestamp = info.get('timestamp', 0)
-            info['staleness'] = c.time() -  last_timestamp
-            if info['staleness'] < self.config.max_staleness:
-                self.staleness_count += 1
-                raise Exception({'module': info['name'], 
-                    'msg': 'Too New', 
-                    'staleness': info['staleness'], 
-                    'max_staleness': self.config.max_staleness,
-                    'timeleft': self.config.max_staleness - info['staleness'], 
-                    })
             # is the info valid
             if not self.check_info(info):
                 info = module.info(timeout=self.config.timeout_info)
-            info['timestamp'] = c.timestamp() # the timestamp
-            info['w'] = info.get('w', 0) # the weight from the module
-            info['past_w'] = info['w'] # for calculating alpha
-            info['path'] = path # path of saving the module
-            self.last_sent = c.time()
-            self.requests += 1
+            info['name'] = name
+            info = self.start_eval(info)
             response = self.score(module, **kwargs)
             response = self.process_response(response=response, info=info)
         except Exception as e:
-            response = c.detailed_error(e)
-            response['w'] = 0
-            response['name'] = info.get('name', module)
-            self.errors += 1
-            self.last_error  = c.time() # the last time an error occured
+            response = self.eval_error(e, module=module, info=info)
 
         return response
 
+    async def async_eval(self, module:str, client=None, **kwargs):
+        """
+        eval on the event loop of the caller, the module is an async client on the session of the validator
+        """
+        info = {}
+        try:
+            address, info = self.eval_info(module)
+            name = info['name']
+            client = client or c.module('client')
+            if self.async_score_fn == None:
+                # a sync score function blocks on its calls, so it runs on the executor with its own client
+                if not self.check_info(info):
+                    info = await asyncio.wrap_future(self.executor.submit(self.module_info_fn, kwargs={'address': address}, timeout=self.config.timeout))
+                info['name'] = name
+                info = self.start_eval(info)
+                future = self.executor.submit(self.score_address, kwargs={'address': address, **kwargs}, timeout=self.config.timeout, tenant=address)
+                response = await asyncio.wrap_future(future)
+            else:
+                module = client(module=address, key=self.key, loop=asyncio.get_running_loop(), session_kwargs=self.eval_session_kwargs).virtual()
+                if not self.check_info(info):
+                    info = await module.info(return_future=True, timeout=self.config.timeout_info)
+                    assert isinstance(info, dict) and not c.is_error(info), f'Info must be a dictionary, got {info}'
+                info['name'] = name
+                info = self.start_eval(info)
+                response = await self.async_score_fn(module, **kwargs)
+            response = self.process_response(response=response, info=info)
+        except Exception as e:
+            response = self.eval_error(e, module=module, info=info)
+        return response
+
+    @property
+    def eval_session_kwargs(self) -> dict:
+        # the evals share a session of their own on the loop, sized for the evals in flight
+        return {'limit': self.config.max_concurrency, 'limit_per_host': self.config.max_module_concurrency}
+
+    def module_info_fn(self, address:str):
+        return c.connect(address, key=self.key).info(timeout=self.config.timeout_info)
+
+    def score_address(self, address:str, **kwargs):
+        return self.score(c.connect(address, key=self.key), **kwargs)
 
     def check_response(self, response): 
         if type(response) in [int, float, bool]:
@@ -467,7 +591,10 @@ class Vali(c.Module):
         info['history'] = info.get('history', []) + [{'w': info['w'], 'timestamp': info['timestamp']}]
         #  have a minimum weight to save storage of stale modules
         if info['w'] > self.config.min_leaderboard_weight:
-            self.put_json(info['path'], info)
+            self.table.put(info)
+        else:
+            self.table.rm(info['name'])
+        self.scheduler.update(info['name'], w=info['w'], latency=info['latency'])
         self.successes += 1
         self.last_success = c.time()
         info['staleness'] = c.round(c.time() - info.get('timestamp', 0), 3)
@@ -511,17 +638,22 @@ class Vali(c.Module):
         }
     
     def calculate_votes(self, **kwargs):
-        leaderboard =  self.leaderboard(keys=['name', 'w', 'staleness','latency', 'key'],   to_dict=True)
-        assert len(leaderboard) > 0
-        votes = {'keys' : [],'weights' : [],'uids': [], 'timestamp' : c.time()  }
-        key2uid = self.subspace.key2uid(**kwargs) if hasattr(self, 'subspace') else {}
-        for info in leaderboard:
-            ## valid modules have a weight greater than 0 and a valid ss58_address
-            if 'key' in info and info['w'] >= 0:
-                if info['key'] in key2uid:
-                    votes['keys'] += [info['key']]
-                    votes['weights'] += [info['w']]
-                    votes['uids'] += [key2uid.get(info['key'], -1)]
+        names = [name for name in self.table.name2row if self.filter_module(name)] if self.config.search else None
+        leaderboard = self.table.arrays(keys=['key', 'w'], 
+                                        max_age=self.config.max_leaderboard_age, 
+                                        min_w=self.config.min_leaderboard_weight, 
+                                        names=names)
+        assert len(leaderboard['w']) > 0
+        if hasattr(self, 'subspace'):
+            key_index = self.subspace.key_index(netuid=self.config.netuid, max_age=self.config.max_network_staleness, **kwargs)
+        else:
+            key_index = Votes.index({})
+        ## valid modules have a weight greater than 0 and a key in the subnet
+        votes = Votes.calculate(keys=leaderboard['key'], 
+                                weights=leaderboard['w'], 
+                                index=key_index, 
+                                top_k=self.config.max_votes)
+        votes = {'keys': votes['keys'].tolist(), 'weights': votes['weights'].tolist(), 'uids': votes['uids'].tolist(), 'timestamp': c.time()}
         assert len(votes['uids']) == len(votes['weights']), f'Length of uids and weights must be the same, got {len(votes["uids"])} uids and {len(votes["weights"])} weights'
 
         return votes
@@ -562,39 +694,21 @@ class Vali(c.Module):
                     **kwargs
                     ):
         max_age = max_age or self.config.max_leaderboard_age
-        paths = self.module_paths()
-        df = []
-        # chunk the jobs into batches
-        for path in paths:
-            r = self.get(path, {},  max_age=max_age)
-            if isinstance(r, dict) and 'key' and  r.get('w', 0) > self.config.min_leaderboard_weight  :
-                r['staleness'] = c.time() - r.get('timestamp', 0)
-                if not self.filter_module(r['name']):
-                    continue
-                df += [{k: r.get(k, None) for k in keys}]
-            else :
-                # removing the path as it is not a valid module and is too old
-                self.rm(path)
-
-        df = c.df(df) 
-        
-        if len(df) == 0:
-            return c.df(df)
-        if isinstance(by, str):
-            by = [by]
-        df = df.sort_values(by=by, ascending=ascending)
-
-        if n != None:
-            if page != None:
-                df = df[page*n:(page+1)*n]
-            else:
-                df = df[:n]
-
-        # if to_dict is true, we return the dataframe as a list of dictionaries
+        # stale rows are dropped a chunk at a time and filtered out of the query
+        self.table.expire(max_age)
+        names = [name for name in self.table.name2row if self.filter_module(name)] if self.config.search else None
+        df = self.table.top(keys=keys, 
+                            by=by[0] if isinstance(by, list) else by, 
+                            ascending=ascending, 
+                            n=n, 
+                            page=page, 
+                            max_age=max_age, 
+                            min_w=self.config.min_leaderboard_weight, 
+                            names=names)
+        # if to_dict is true, we return the rows as a list of dictionaries
         if to_dict:
-            return df.to_dict(orient='records')
-
-        return df
+            return df
+        return c.df(df)
 
 
     
@@ -607,13 +721,14 @@ class Vali(c.Module):
     def refresh_leaderboard(self):
         storage_path = self.storage_path()
         r = self.rm(storage_path)
+        self.table.clear()
+        self.table.flush(force=True)
         df = self.leaderboard()
         assert len(df) == 0, f'Leaderboard not removed {df}'
         return {'success': True, 'msg': 'Leaderboard removed', 'path': storage_path}
     
     def save_module_info(self, k:str, v:dict,):
-        path = self.storage_path() + f'/{k}'
-        self.put(path, v)
+        self.table.put({**v, 'name': k})
     
 
     def __del__(self):